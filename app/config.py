@@ -8,6 +8,21 @@ load_dotenv()  # Load variables from .env
 GOOGLE_API_KEY = os.environ.get("GOOGLE_API_KEY")
 MODEL_NAME = "gemini-2.0-flash"
  
+# LLM backend: "gemini" (live), "record" (live, saving responses), "replay" (saved responses only)
+# or "stub" (rule-based, offline). Replay misses fail unless LLM_REPLAY_FALLBACK=stub.
+LLM_BACKEND = os.environ.get("LLM_BACKEND", "gemini").lower()
+LLM_REPLAY_PATH = os.environ.get("LLM_REPLAY_PATH", "llm_recordings.json")
+LLM_REPLAY_FALLBACK = os.environ.get("LLM_REPLAY_FALLBACK", "").lower()
+# Simulated model latency of the stub backend (e.g. 800 for load tests)
+LLM_STUB_LATENCY_MS = float(os.environ.get("LLM_STUB_LATENCY_MS", "0"))
+ 
+# Shared LLM gateway limits (see utils/llm_gateway.py)
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", "8"))
+LLM_MAX_CONCURRENCY_PER_USER = int(os.environ.get("LLM_MAX_CONCURRENCY_PER_USER", "2"))
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", "3"))
+LLM_BACKOFF_BASE = float(os.environ.get("LLM_BACKOFF_BASE", "0.5"))  # seconds
+LLM_BACKOFF_MAX = float(os.environ.get("LLM_BACKOFF_MAX", "8"))      # seconds
+ 
 # MySQL config for production dashboard (shared main database)
 MYSQL_USER = os.environ.get("MYSQL_USER")
 MYSQL_PASSWORD = os.environ.get("MYSQL_PASSWORD")
@@ -17,9 +32,87 @@ MYSQL_DATABASE = os.environ.get("MYSQL_DATABASE")  # This is our main database (
 # Main DATABASE_URI for user authentication and global tables
 DATABASE_URI = os.environ.get("DATABASE_URI")
  
+# SQLAlchemy URL of a user's dynamic database; "{database}" is replaced by its name.
+# Defaults to a database per user on MYSQL_HOST; e.g. "sqlite:///./dynamic_dbs/{database}.sqlite" for local runs.
+DYNAMIC_DATABASE_URL = os.environ.get(
+    "DYNAMIC_DATABASE_URL", f"mysql+mysqlconnector://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}/{{database}}"
+)
+# Create a new user's dynamic database in the background right after signup
+DYNAMIC_DB_PREPROVISION = os.environ.get("DYNAMIC_DB_PREPROVISION", "true").lower() in ("1", "true", "yes")
+ 
+# Engine used by /execute_query for uploaded files: "duckdb" runs in-process on the
+# session DataFrames, "mysql" queries the copy saved in the user's dynamic database.
+FILE_QUERY_ENGINE = os.environ.get("FILE_QUERY_ENGINE", "duckdb").lower()
+ 
+# duckdb execution: size of the shared query pool and threads per connection (0 = duckdb default)
+DUCKDB_QUERY_WORKERS = int(os.environ.get("DUCKDB_QUERY_WORKERS", "4"))
+DUCKDB_THREADS = int(os.environ.get("DUCKDB_THREADS", "0"))
+ 
+# Upper bound on rows fetched for a chart before server-side reduction (max_points) is applied
+CHART_MAX_SOURCE_ROWS = int(os.environ.get("CHART_MAX_SOURCE_ROWS", "1000000"))
+ 
+# Tokenization for query optimization hints: "fast" (regex, no spaCy), "tokenizer"
+# (spaCy tokenizer only) or "rich" (full spaCy pipeline)
+QUERY_HINTS_MODE = os.environ.get("QUERY_HINTS_MODE", "fast").lower()
+ 
+# Number of most frequent values tracked per categorical column in the table profile store
+PROFILE_TOP_K = int(os.environ.get("PROFILE_TOP_K", "50"))
+ 
+# Largest join result /join_tables will produce; bigger joins are refused or sampled
+JOIN_MAX_ROWS = int(os.environ.get("JOIN_MAX_ROWS", "1000000"))
+ 
+# Worker pools for blocking work in async endpoints (see utils/executors.py). Tasks beyond
+# workers + queue are rejected with 503. CPU_POOL_WORKERS=0 runs CPU work on threads.
+CPU_POOL_WORKERS = int(os.environ.get("CPU_POOL_WORKERS", str(max((os.cpu_count() or 2) - 1, 1))))
+CPU_POOL_QUEUE = int(os.environ.get("CPU_POOL_QUEUE", "16"))
+IO_POOL_WORKERS = int(os.environ.get("IO_POOL_WORKERS", "16"))
+IO_POOL_QUEUE = int(os.environ.get("IO_POOL_QUEUE", "64"))
+ 
+# Most natural language commands accepted by one /modify_data/batch request
+MODIFY_BATCH_MAX_COMMANDS = int(os.environ.get("MODIFY_BATCH_MAX_COMMANDS", "100"))
+ 
+# Rows per record batch when results are streamed as Arrow IPC (Accept: application/vnd.apache.arrow.stream)
+ARROW_BATCH_ROWS = int(os.environ.get("ARROW_BATCH_ROWS", "65536"))
+ 
+# Server-side cache of query/chart results keyed by request and table versions (0 disables).
+# Results with more rows than RESULT_CACHE_MAX_ROWS are not kept; entries expire after RESULT_CACHE_TTL seconds.
+RESULT_CACHE_SIZE = int(os.environ.get("RESULT_CACHE_SIZE", "256"))
+RESULT_CACHE_TTL = int(os.environ.get("RESULT_CACHE_TTL", "300"))
+RESULT_CACHE_MAX_ROWS = int(os.environ.get("RESULT_CACHE_MAX_ROWS", "10000"))
+ 
+# Where session state (tables, source, chat history) lives: "memory" (single worker) or
+# "sqlite" (SQLite + Parquet files under STATE_DIR, shared by all workers on the host)
+STATE_BACKEND = os.environ.get("STATE_BACKEND", "memory").lower()
+STATE_DIR = os.environ.get("STATE_DIR", os.path.join(os.getcwd(), ".session_state"))
+STATE_SESSION_TTL = int(os.environ.get("STATE_SESSION_TTL", "3600"))
+ 
+# Resident size (MB) allowed for the uploaded/loaded tables of all sessions in one worker.
+# Beyond it the least recently used tables are spilled to Parquet under SPILL_DIR
+# (default: a per-process temp directory). 0 disables spilling.
+MEMORY_BUDGET_MB = int(os.environ.get("MEMORY_BUDGET_MB", "2048"))
+SPILL_DIR = os.environ.get("SPILL_DIR", "")
+ 
+# How single-value (1x1) query results are phrased: "template" renders the sentence
+# locally, "rich" asks the LLM. ANSWER_LOCALE controls number formatting (e.g. en_US, en_IN, de_DE).
+ANSWER_MODE = os.environ.get("ANSWER_MODE", "template").lower()
+ANSWER_LOCALE = os.environ.get("ANSWER_LOCALE", "en_US")
+ 
+# Serve per-stage latency histograms and counters on GET /metrics (Prometheus text format)
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+ 
+# Preload lazily created clients and models in a background thread after startup
+WARMUP_ENABLED = os.environ.get("WARMUP_ENABLED", "true").lower() in ("1", "true", "yes")
+ 
 # JWT and authentication config
 SECRET_KEY = os.environ.get("SECRET_KEY", "your_default_secret_key")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.environ.get("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
  
+# Authenticated users are cached per worker for USER_CACHE_TTL seconds (0 disables the cache).
+USER_CACHE_TTL = int(os.environ.get("USER_CACHE_TTL", "60"))
+USER_CACHE_SIZE = int(os.environ.get("USER_CACHE_SIZE", "10000"))
+# Trust the user claims (id, username, email, dynamic_db) in the token instead of looking the
+# user up; deleted users then stay valid until their token expires.
+AUTH_TRUST_TOKEN_CLAIMS = os.environ.get("AUTH_TRUST_TOKEN_CLAIMS", "false").lower() in ("1", "true", "yes")
+ 
  
\ No newline at end of file
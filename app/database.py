@@ -1,16 +1,30 @@
 # app/database.py
+import threading
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from app.config import DATABASE_URI
  
-# Create the engine for the main (central) database.
-engine = create_engine(DATABASE_URI)
+_engine = None
+_engine_lock = threading.Lock()
  
-# Create a sessionmaker bound to this engine.
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Sessionmaker for the main database; it is bound to the engine on first use.
+SessionLocal = sessionmaker(autocommit=False, autoflush=False)
+ 
+def get_engine():
+    """
+    Create the engine for the main (central) database on first use, so importing
+    the app does not load the MySQL driver or fail on a misconfigured DATABASE_URI.
+    """
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = create_engine(DATABASE_URI)
+            SessionLocal.configure(bind=_engine)
+        return _engine
  
 # Dependency function that yields a session.
 def get_db():
+    get_engine()
     db = SessionLocal()
     try:
         yield db
@@ -1,10 +1,22 @@
 # app/main.py
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 from app.routes import auth,upload, db, query, join, modify,chart
+from app.config import METRICS_ENABLED, WARMUP_ENABLED
+from app.utils.warmup import start_background_warm_up
+from app.utils.state_store import SessionStateMiddleware
+from app.utils.executors import ExecutorBusyError, shutdown_executors
+from app.utils.provisioning import provisioning
+from app.utils.memory_governor import get_governor
+from app.utils.llm_gateway import get_llm
+from app.utils.metrics import PROMETHEUS_CONTENT_TYPE, registry, render_metrics
  
 app = FastAPI(title="AI Data Analysis Chatbot API")
  
+# Bind `state` to the caller's user and session for every request (see utils/state_store.py)
+app.add_middleware(SessionStateMiddleware)
+ 
 # Allow CORS for the React frontend (adjust allowed origins as needed)
 app.add_middleware(
     CORSMiddleware,
@@ -25,8 +37,35 @@ app.include_router(chart.router, prefix="/chart", tags=["Chart"])
  
  
  
+@app.on_event("startup")
+def schedule_warm_up():
+    # Heavy modules and clients load lazily; preload them in the background so the
+    # worker accepts traffic immediately and the first requests do not pay for it.
+    if WARMUP_ENABLED:
+        start_background_warm_up()
+ 
+@app.on_event("shutdown")
+def stop_executors():
+    shutdown_executors()
+    provisioning.dispose()
+ 
+@app.exception_handler(ExecutorBusyError)
+async def executor_busy_handler(request: Request, exc: ExecutorBusyError):
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "5"})
+ 
 @app.get("/")
 def root():
     return {"message": "Welcome to the AI Data Analysis Chatbot API"}
  
+# Point-in-time values, read when /metrics is scraped
+registry.gauge("app_tables_resident_bytes", "Bytes of session tables held in memory.", lambda: get_governor().stats()["resident_bytes"])
+registry.gauge("app_tables_spilled", "Session tables currently spilled to Parquet.", lambda: get_governor().stats()["spilled_tables"])
+registry.gauge("app_llm_in_flight", "LLM calls in progress.", lambda: get_llm().stats()["in_flight"])
+ 
+if METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False)
+    def metrics():
+        # Per-worker values: scrape every worker (or run one worker per scrape target).
+        return PlainTextResponse(render_metrics(), media_type=PROMETHEUS_CONTENT_TYPE)
+ 
  
\ No newline at end of file
@@ -1,15 +1,16 @@
 import logging
 from datetime import datetime, timedelta
-from fastapi import APIRouter, Depends, HTTPException, status, Response
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status, Response
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from pydantic import BaseModel, EmailStr
 from sqlalchemy.orm import Session
-from sqlalchemy import create_engine, text
-from app.config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES, MYSQL_USER, MYSQL_PASSWORD, MYSQL_HOST, DATABASE_URI
-from app.database import SessionLocal
+from app.config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES, AUTH_TRUST_TOKEN_CLAIMS, DYNAMIC_DB_PREPROVISION
+from app.database import get_db
 from app.models import User
+from app.utils.user_cache import user_cache
+from app.utils.provisioning import provisioning
  
 router = APIRouter()
 logger = logging.getLogger("auth")
@@ -28,13 +29,6 @@ class Token(BaseModel):
     access_token: str
     token_type: str
  
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
- 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
  
@@ -57,20 +51,15 @@ def get_user_by_username(db: Session, username: str):
 def get_user_by_email(db: Session, email: str):
     return db.query(User).filter(User.email == email).first()
  
-def create_dynamic_database_for_user(user: User) -> str:
-    """
-    Create a dynamic database based on the username.
-    For example, if username is "deepak", the database name will be "deepak_db".
-    """
-    db_name = f"{user.username.strip().lower()}_db"
-    engine = create_engine(f"mysql+mysqlconnector://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}")
-    with engine.connect() as connection:
-        connection.execute(text(f"CREATE DATABASE IF NOT EXISTS {db_name};"))
-    logger.info(f"Dynamic database '{db_name}' created for user '{user.username}'.")
-    return db_name
+def user_claims(user: User) -> dict:
+    """Token claims identifying a user; dynamic_db is only included once it is set (it never changes after that)."""
+    claims = {"sub": user.username, "user_id": user.id, "email": user.email}
+    if user.dynamic_db:
+        claims["dynamic_db"] = user.dynamic_db
+    return claims
  
 @router.post("/signup", response_model=Token)
-def signup(user: UserCreate, db: Session = Depends(get_db)):
+def signup(user: UserCreate, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
     if get_user_by_email(db, user.email):
         raise HTTPException(status_code=400, detail="Email already registered")
     if get_user_by_username(db, user.username):
@@ -82,13 +71,16 @@ def signup(user: UserCreate, db: Session = Depends(get_db)):
     db.add(new_user)
     db.commit()
     db.refresh(new_user)
+    if DYNAMIC_DB_PREPROVISION:
+        # Created after the response is sent, so the first save does not wait for the DDL.
+        background_tasks.add_task(provisioning.preprovision, new_user.id)
    
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": new_user.username, "user_id": new_user.id},
+        data=user_claims(new_user),
         expires_delta=access_token_expires,
     )
-    logger.info(f"User '{new_user.username}' signed up successfully. No dynamic database created yet.")
+    logger.info(f"User '{new_user.username}' signed up successfully.")
     return {"access_token": access_token, "token_type": "bearer"}
  
 @router.post("/login", response_model=Token)
@@ -107,7 +99,7 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depend
 
     access_token = create_access_token(
 
-        data={"sub": user.username, "user_id": user.id},
+        data=user_claims(user),
 
         expires_delta=access_token_expires,
 
@@ -131,9 +123,16 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
             raise credentials_exception
     except JWTError:
         raise credentials_exception
+    # Hot path: no central DB round-trip for users seen in the last USER_CACHE_TTL seconds.
+    user = user_cache.get(user_id)
+    if user is not None and user.username == username:
+        return user
+    if AUTH_TRUST_TOKEN_CLAIMS and payload.get("email") and payload.get("dynamic_db"):
+        return User(id=user_id, username=username, email=payload["email"], dynamic_db=payload["dynamic_db"], hashed_password="")
     user = get_user_by_username(db, username)
     if user is None:
         raise credentials_exception
+    user_cache.put(user)
     return user
  
 @router.post("/logout")
@@ -1,16 +1,30 @@
 # app/routes/chart.py
 
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request
 
 from pydantic import BaseModel
 
 from app.state import state  # state is a dict
 
-from app.utils.sql_helpers import enhance_user_query, generate_sql_query, execute_sql_query
+from app.utils.sql_helpers import enhance_user_query, generate_sql_query, execute_sql_query, validate_and_repair_sql, get_connection_dialect, paginate_sql
 
-from app.utils.llm_helpers import GoogleGenerativeAI
+from app.utils.sql_validation import SQLValidationError
 
-from app.config import MODEL_NAME, GOOGLE_API_KEY
+from app.utils.duckdb_engine import execute_duckdb_query
+
+from app.utils.memory_governor import table_schemas
+
+from app.utils.serialization import FastJSONResponse, arrow_stream_response, json_ready_frame, wants_arrow
+
+from app.utils.metrics import RESULT_ROWS, span, trace
+
+from app.utils.result_cache import data_source, etag_matches, etag_nonce, get_result_cache, make_etag, not_modified, request_key, table_versions, with_etag
+
+from app.utils.chart_reduction import reduce_chart_data, REDUCTION_MODES, AGGREGATIONS
+
+from app.utils.llm_gateway import get_llm
+
+from app.config import CHART_MAX_SOURCE_ROWS
 
 import sqlalchemy
 
@@ -18,7 +32,7 @@ import pandas as pd
 
 import logging
 
-import duckdb
+from typing import Optional
  
 router = APIRouter()
 
@@ -31,10 +45,18 @@ class ChartQuery(BaseModel):
     query: str
 
     chart_type: str = "bar"  # Frontend will decide final chart style (bar, line, pie, etc.)
+
+    # Point budget for server-side reduction; when set, pagination is replaced by reduction.
+
+    max_points: Optional[int] = None
+
+    reduction: str = "auto"  # auto, lttb, top_n, time_bucket or none
+
+    aggregation: Optional[str] = None  # sum, mean, min, max or count (defaults depend on the mode)
  
-# Initialize the LLM instance for query processing
+# Shared LLM gateway for query processing
 
-llm = GoogleGenerativeAI(model=MODEL_NAME, api_key=GOOGLE_API_KEY)
+llm = get_llm()
  
 @router.post("/chart")
 
@@ -42,17 +64,91 @@ def generate_chart(
 
     chart_query: ChartQuery,
 
+    request: Request,
+
     page: int = Query(1, ge=1),
 
     page_size: int = Query(100, ge=1, le=1000)
 
 ):
 
+    with trace("chart"):
+
+        as_arrow = wants_arrow(request)
+
+        # Results are cached per request, data source and table versions; the ETag comes from the SQL and those.
+
+        versions = table_versions(state)
+
+        settings = (chart_query.chart_type, chart_query.max_points, chart_query.reduction, chart_query.aggregation, page, page_size, as_arrow)
+
+        cache = get_result_cache()
+
+        cache_key = request_key("chart", data_source(state), versions, chart_query.query, settings)
+
+        cached = cache.get(cache_key)
+
+        if cached is None:
+
+            sql_query, result = build_chart(chart_query, page, page_size, as_arrow=as_arrow)
+
+            rows = len(result[0]) if as_arrow else len(result["labels"])
+
+            etag = make_etag("chart", sql_query, data_source(state), versions, settings, etag_nonce(state))
+
+            cached = {"etag": etag, "result": result}
+
+            cache.put(cache_key, cached, versions, rows=rows)
+
+        etag, result = cached["etag"], cached["result"]
+
+        if etag_matches(request, etag):
+
+            return not_modified(etag)
+
+        RESULT_ROWS.observe(len(result[0]) if as_arrow else len(result["labels"]), endpoint="chart")
+
+        with span("chart.serialize"):
+
+            if as_arrow:
+
+                result_df, metadata = result
+
+                return with_etag(arrow_stream_response(result_df, metadata=metadata), etag)
+
+            return with_etag(FastJSONResponse(result), etag)
+ 
+def build_chart(chart_query: ChartQuery, page: int, page_size: int, as_arrow: bool = False) -> tuple:
+
+    """
+
+    Generate, run and shape the chart query. Returns (sql_query, chart payload), or
+
+    (sql_query, (result DataFrame, metadata)) for Arrow clients.
+
+    """
+
     # Ensure that table data is available
 
     if not state["table_names"]:
 
         raise HTTPException(status_code=400, detail="No tables available for charting.")
+
+    # Schemas only: tables spilled by the memory governor stay on disk (duckdb reads them there).
+
+    tables = table_schemas(state["table_names"])
+
+    if chart_query.max_points is not None and chart_query.max_points < 3:
+
+        raise HTTPException(status_code=400, detail="max_points must be at least 3.")
+
+    if chart_query.reduction not in REDUCTION_MODES:
+
+        raise HTTPException(status_code=400, detail=f"Unknown reduction mode. Use one of: {', '.join(REDUCTION_MODES)}.")
+
+    if chart_query.aggregation is not None and chart_query.aggregation not in AGGREGATIONS:
+
+        raise HTTPException(status_code=400, detail=f"Unknown aggregation. Use one of: {', '.join(AGGREGATIONS)}.")
  
     # Determine the data source; if not explicitly set, default to "file"
 
@@ -78,41 +174,65 @@ def generate_chart(
 
     schema_info = "\n".join(
 
-        [f"Table: {name}, Columns: {', '.join(df.columns)}" for name, df in state["table_names"]]
+        [f"Table: {name}, Columns: {', '.join(df.columns)}" for name, df in tables]
 
     )
  
     # Enhance the user query (map friendly names to actual table/column names)
 
-    enhanced_query = enhance_user_query(chart_query.query, state["table_names"])
+    with span("chart.enhance"):
+
+        enhanced_query = enhance_user_query(chart_query.query, tables)
+
+    dialect = get_connection_dialect(connection) or None
 
-    dialect = None  # Optionally set dialect if needed
+    # File-based tables run on duckdb, so validation transpiles the SQL to duckdb syntax.
+
+    validation_dialect = dialect if source == "personal" else "duckdb"
  
     try:
 
         # Generate SQL query using the LLM helper
 
-        sql_query, _ = generate_sql_query(enhanced_query, schema_info, [], llm, state["table_names"], dialect=dialect)
+        with span("chart.generate_sql"):
+
+            sql_query, _ = generate_sql_query(enhanced_query, schema_info, [], llm, tables, dialect=dialect)
 
         logger.info(f"Generated SQL for chart: {sql_query}")
+
+        with span("chart.validate"):
+
+            sql_query = validate_and_repair_sql(sql_query, chart_query.query, schema_info, llm, tables, dialect=validation_dialect)
  
+        # Only the requested page is fetched; one extra row tells us whether more pages exist.
+
+        # With a point budget the whole result (up to CHART_MAX_SOURCE_ROWS) is reduced instead.
+
+        if chart_query.max_points is not None:
+
+            page, page_size = 1, CHART_MAX_SOURCE_ROWS
+
+        offset = (page - 1) * page_size
+
         # Execute the SQL query based on data source
 
-        if source == "personal":
+        with span("chart.execute"):
+
+            if source == "personal":
 
-            result_df = execute_sql_query(sql_query, chart_query.query, connection)
+                result_df = execute_sql_query(paginate_sql(sql_query, page_size + 1, offset, dialect=dialect), chart_query.query, connection)
 
-        else:
+            else:
 
-            # Use duckdb to execute the SQL on the uploaded DataFrames
+                # Use duckdb to execute the SQL on the uploaded DataFrames
 
-            con = duckdb.connect(database=':memory:')
+                result_df = execute_duckdb_query(sql_query, tables, limit=page_size + 1, offset=offset)
 
-            for table_name, df in state["table_names"]:
+    except SQLValidationError as e:
 
-                con.register(table_name, df)
+        logger.error(f"Generated SQL for chart failed validation: {e.errors}")
 
-            result_df = con.execute(sql_query).df()
+        raise HTTPException(status_code=400, detail=f"Generated SQL failed validation: {'; '.join(e.errors)}")
 
     except Exception as e:
 
@@ -123,6 +243,10 @@ def generate_chart(
     if result_df.empty:
 
         raise HTTPException(status_code=400, detail="Query returned no data for charting.")
+
+    has_more = len(result_df) > page_size
+
+    result_df = result_df.head(page_size)
  
     # Auto-infer chart data: assume first column is the dimension (labels) and the rest are measures.
 
@@ -132,19 +256,59 @@ def generate_chart(
 
         raise HTTPException(status_code=400, detail="Query returned insufficient columns for charting.")
 
-    labels = result_df.iloc[:, 0].tolist()
+    reduction = None
+
+    if chart_query.max_points is not None:
+
+        try:
+
+            with span("chart.reduce"):
+
+                result_df, reduction = reduce_chart_data(
 
-    measure_cols = cols[1:]
+                    result_df, chart_query.chart_type, chart_query.max_points,
+
+                    mode=chart_query.reduction, aggregation=chart_query.aggregation
+
+                )
+
+        except ValueError as e:
+
+            raise HTTPException(status_code=400, detail=str(e))
+
+        reduction["source_truncated"] = has_more
+
+    # Arrow clients get the (reduced) result table itself; the chart settings travel in the schema metadata.
+
+    if as_arrow:
+
+        metadata = {"chart_type": chart_query.chart_type, "multi_value": len(cols) > 2, "page": page, "page_size": page_size, "has_more": has_more}
+
+        if reduction is not None:
+
+            metadata["reduction"] = reduction
+
+        return sql_query, (result_df, metadata)
+
+    # NaN/NaT become None and numpy values plain Python, one vectorized pass per column.
+
+    with span("chart.to_json_ready"):
+
+        ready = json_ready_frame(result_df)
+
+    labels = ready.iloc[:, 0].tolist()
+
+    measure_cols = list(ready.columns[1:])
 
     if len(measure_cols) == 1:
 
-        data = result_df[measure_cols[0]].tolist()
+        data = ready.iloc[:, 1].tolist()
 
         multi_value = False
 
     else:
 
-        data = {col: result_df[col].tolist() for col in measure_cols}
+        data = {col: ready[col].tolist() for col in measure_cols}
 
         multi_value = True
  
@@ -158,10 +322,20 @@ def generate_chart(
 
         "data": data,
 
-        "multi_value": multi_value  # True if multiple measures exist (enable multi-bar charts)
+        "multi_value": multi_value,  # True if multiple measures exist (enable multi-bar charts)
+
+        "page": page,
+
+        "page_size": page_size,
+
+        "has_more": has_more
 
     }
 
-    return response
+    if reduction is not None:
+
+        response["reduction"] = reduction  # Describes how the series was downsampled or bucketed
+
+    return sql_query, response
 
  
\ No newline at end of file
@@ -1,13 +1,17 @@
 # app/routes/db.py
-from fastapi import APIRouter, HTTPException, Body
+from fastapi import APIRouter, HTTPException, Body, Query, Request
 from pydantic import BaseModel
 from typing import List
 from app.utils.db_helpers import connect_personal_db, list_tables, disconnect_database
+from app.utils.profiling import refresh_table_profiles
 from app.state import state
 from fastapi.encoders import jsonable_encoder
 import logging
 import pandas as pd
-import math
+from app.utils.serialization import FastJSONResponse, arrow_stream_response, frame_to_records, wants_arrow
+from app.utils.memory_governor import as_frame, table_schemas
+from app.utils.metrics import DB_SECONDS, span
+from app.utils.result_cache import etag_matches, make_etag, not_modified, table_versions, bump_table_versions, with_etag
  
 router = APIRouter()
 logger = logging.getLogger("db")
@@ -21,22 +25,6 @@ class DBConnectionParams(BaseModel):
     password: str
     database: str
  
-def clean_nan(obj):
-    """
-    Recursively traverse lists and dictionaries, replacing any float('nan') with None.
-    """
-    if isinstance(obj, list):
-        return [clean_nan(item) for item in obj]
-    elif isinstance(obj, dict):
-        return {key: clean_nan(value) for key, value in obj.items()}
-    elif isinstance(obj, float):
-        if math.isnan(obj):
-            return None
-        else:
-            return obj
-    else:
-        return obj
- 
 @router.post("/connect_db")
 def connect_db(params: DBConnectionParams):
     engine = connect_personal_db(
@@ -50,7 +38,20 @@ def connect_db(params: DBConnectionParams):
     if engine is None:
         raise HTTPException(status_code=500, detail="Database connection failed.")
     state["personal_engine"] = engine
-    tables = list_tables(engine)
+    # Identifies the database for cache keys and ETags. The password stays in this
+    # worker's engine only: personal_db is persisted with the session (STATE_BACKEND=sqlite).
+    state["personal_db"] = {
+        "db_type": params.db_type,
+        "host": params.host,
+        "user": params.user,
+        "database": params.database,
+        "port": params.port,
+    }
+    state["source"] = "personal"
+    # Results computed on the previous source must not be served for this one.
+    bump_table_versions(state)
+    with span("db.list_tables"):
+        tables = list_tables(engine)
     logger.info(f"Connected. Available tables: {tables}")
     return jsonable_encoder({"status": "connected", "tables": tables})
  
@@ -66,7 +67,8 @@ def load_tables(table_names: List[str] = Body(...)):
     for table in table_names:
         try:
             query = f"SELECT * FROM `{table}`;"
-            df = pd.read_sql_query(query, engine)
+            with span("db.load_table"), DB_SECONDS.time(engine=engine.dialect.name):
+                df = pd.read_sql_query(query, engine)
             loaded_tables.append((table, df))
             logger.info(f"Fetched table '{table}' with shape: {df.shape}")
            
@@ -75,9 +77,8 @@ def load_tables(table_names: List[str] = Body(...)):
                 logger.warning(f"Table {table} is empty.")
                 previews[table] = "No data available (table is empty)."
             else:
-                # Convert preview to list of dictionaries and clean NaN values.
-                preview_data = df.head(10).to_dict(orient="records")
-                preview_data = clean_nan(preview_data)
+                # Convert preview to list of dictionaries with NaN values as None.
+                preview_data = frame_to_records(df.head(10))
                 previews[table] = preview_data if preview_data else "No preview data available."
             logger.info(f"Preview for '{table}': {previews[table]}")
         except Exception as e:
@@ -86,6 +87,9 @@ def load_tables(table_names: List[str] = Body(...)):
    
     # Optionally store loaded_tables in state
     state["table_names"] = loaded_tables
+    bump_table_versions(state)
+    with span("db.profile"):
+        refresh_table_profiles(state["table_names"], state["table_profiles"])
  
     response = {
         "status": "tables loaded",
@@ -95,6 +99,26 @@ def load_tables(table_names: List[str] = Body(...)):
     logger.info(f"Final Response: {response}")
     return jsonable_encoder(response)
  
+@router.get("/table_preview")
+def table_preview(request: Request, table_name: str = Query(...), rows: int = Query(10, ge=1, le=10000)):
+    """
+    First rows of one loaded table. With "Accept: application/vnd.apache.arrow.stream"
+    they are sent as an Arrow IPC stream; /load_tables previews several tables in one
+    response and therefore stays JSON.
+    """
+    tables = dict(table_schemas(state.get("table_names", [])))
+    if table_name not in tables:
+        raise HTTPException(status_code=404, detail="Table not found")
+    as_arrow = wants_arrow(request)
+    # Checked before the table is touched: an unchanged preview costs a 304 and nothing else.
+    etag = make_etag("preview", table_name, table_versions(state)[table_name], rows, as_arrow)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    df = as_frame(tables[table_name]).head(rows)
+    if as_arrow:
+        return with_etag(arrow_stream_response(df, metadata={"table_name": table_name}), etag)
+    return with_etag(FastJSONResponse({"table_name": table_name, "preview": frame_to_records(df)}), etag)
+ 
 @router.post("/disconnect")
 def disconnect():
     disconnect_database()
@@ -1,12 +1,26 @@
 # app/routes/join.py
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
+import logging
+from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Query
+from pydantic import BaseModel, Field
 from app.state import state
-from app.utils.sql_helpers import execute_sql_query
-import sqlalchemy
-import pandas as pd
+from app.config import JOIN_MAX_ROWS
+from app.utils.sql_helpers import execute_sql_query, paginate_sql, get_connection_dialect
+from app.utils.join_engine import (
+    JoinSizeError,
+    build_join_sql,
+    estimate_join_size,
+    hash_join,
+    normalize_join_type,
+    resolve_columns,
+)
+from app.utils.join_sketches import refresh_join_sketches, suggest_join_keys
+from app.utils.memory_governor import as_frame, table_schemas
+from app.utils.serialization import FastJSONResponse, RESULT_FORMATS, serialize_frame
 
 router = APIRouter()
+logger = logging.getLogger("join")
+logger.setLevel(logging.INFO)
 
 class JoinRequest(BaseModel):
     table1: str
@@ -14,21 +28,94 @@ class JoinRequest(BaseModel):
     join_column1: str
     join_column2: str
     join_type: str  # e.g., "INNER JOIN", "LEFT JOIN", etc.
+    columns: Optional[List[str]] = None  # "table.column" or unambiguous column names; None selects all
+    page: int = Field(1, ge=1)
+    page_size: int = Field(1000, ge=1, le=10000)
+    on_oversize: str = "refuse"  # "refuse" or "sample" when the join exceeds JOIN_MAX_ROWS
+    result_format: str = "records"  # "records" or "columnar" ({columns, data})
 
 @router.post("/join_tables")
 def join_tables(request: JoinRequest):
-    tables = dict(state.get("table_names", []))
+    tables = dict(table_schemas(state.get("table_names", [])))
     if request.table1 not in tables or request.table2 not in tables:
         raise HTTPException(status_code=400, detail="Selected tables not available.")
-    sql_query = f"""
-    SELECT * FROM `{request.table1}`
-    {request.join_type} `{request.table2}`
-    ON `{request.table1}`.`{request.join_column1}` = `{request.table2}`.`{request.join_column2}`;
-    """
+    if request.on_oversize not in ("refuse", "sample"):
+        raise HTTPException(status_code=400, detail="on_oversize must be 'refuse' or 'sample'.")
+    if request.result_format not in RESULT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown result_format. Use one of: {', '.join(RESULT_FORMATS)}.")
+    # Only the two joined tables are loaded if the memory governor spilled them.
+    df1, df2 = as_frame(tables[request.table1]), as_frame(tables[request.table2])
+    offset = (request.page - 1) * request.page_size
     connection = state.get("personal_engine")
     try:
-        result_df = execute_sql_query(sql_query, "", connection)
+        how = normalize_join_type(request.join_type)
+        if request.join_column1 not in df1.columns or request.join_column2 not in df2.columns:
+            raise ValueError("Join columns not found in the selected tables.")
+        selected, _, _ = resolve_columns(request.columns, request.table1, df1, request.table2, df2)
+        # The loaded frames give the exact output size before anything is executed.
+        estimate = estimate_join_size(df1[request.join_column1], df2[request.join_column2], how)
+        oversize = estimate["estimated_rows"] > JOIN_MAX_ROWS
+        if oversize and request.on_oversize == "refuse":
+            raise JoinSizeError(estimate["estimated_rows"], JOIN_MAX_ROWS)
+        dialect = get_connection_dialect(connection) if connection is not None else "duckdb"
+        sql_query = build_join_sql(
+            request.table1, request.table2, request.join_column1, request.join_column2,
+            request.join_type, selected, dialect=dialect
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        if connection is not None and not oversize:
+            # Personal databases run the projected join themselves; only one page is fetched.
+            result_df = execute_sql_query(paginate_sql(sql_query, request.page_size + 1, offset, dialect=dialect), "", connection)
+            has_more = len(result_df) > request.page_size
+            result_df = result_df.head(request.page_size)
+            metadata = dict(estimate, join_type=how, sampled=False, total_rows=estimate["estimated_rows"],
+                            returned_rows=len(result_df), offset=offset, has_more=has_more)
+        else:
+            # Uploaded files (and sampled joins) are joined in memory.
+            result_df, metadata = hash_join(
+                request.table1, df1, request.table2, df2,
+                request.join_column1, request.join_column2, request.join_type,
+                columns=request.columns, limit=request.page_size, offset=offset,
+                max_rows=JOIN_MAX_ROWS, sample=request.on_oversize == "sample",
+            )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error performing join: {e}")
-    result = result_df.to_dict(orient="records") if not result_df.empty else []
-    return {"join_sql": sql_query, "result": result}
+    result = serialize_frame(result_df, request.result_format)
+    return FastJSONResponse({
+        "join_sql": sql_query,
+        "result": result,
+        "page": request.page,
+        "page_size": request.page_size,
+        **metadata,
+    })
+
+@router.get("/join_advisor")
+def join_advisor(
+    table1: Optional[str] = None,
+    table2: Optional[str] = None,
+    min_containment: float = Query(0.5, ge=0.0, le=1.0),
+    top: int = Query(10, ge=1, le=100)
+):
+    """
+    Suggest join key pairs across the loaded tables (or between table1 and table2)
+    with their predicted INNER JOIN size, without executing any join.
+    Sketches are built once per table and reused until the table changes.
+    """
+    table_names = state.get("table_names", [])
+    available = [name for name, _ in table_schemas(table_names)]
+    tables = [t for t in (table1, table2) if t]
+    missing = [t for t in tables if t not in available]
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Tables {missing} are not loaded.")
+    if len(available) < 2:
+        raise HTTPException(status_code=400, detail="At least two tables are needed to suggest joins.")
+    refresh_join_sketches(table_names, state["join_sketches"])
+    suggestions = suggest_join_keys(state["join_sketches"], tables=tables, min_containment=min_containment, top=top)
+    for suggestion in suggestions:
+        suggestion["exceeds_join_limit"] = suggestion["predicted_inner_rows"] > JOIN_MAX_ROWS
+    return {"suggestions": suggestions, "join_max_rows": JOIN_MAX_ROWS}
@@ -1,10 +1,18 @@
 # app/routes/modify.py
+import re
+from typing import List
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from app.state import state
-from app.utils.llm_helpers import translate_natural_language_to_sql, GoogleGenerativeAI
-from app.utils.sql_helpers import execute_sql_query
+from app.config import MODIFY_BATCH_MAX_COMMANDS
+from app.utils.llm_helpers import translate_natural_language_to_sql, translate_commands_to_sql_batch
+from app.utils.llm_gateway import get_llm
+from app.utils.sql_helpers import execute_sql_query, execute_statements_in_transaction, get_connection_dialect
+from app.utils.sql_validation import validate_sql_query
 from app.utils.db_helpers import refresh_tables
+from app.utils.profiling import refresh_table_profiles
+from app.utils.memory_governor import table_schemas
+from app.utils.result_cache import bump_table_versions
 import sqlalchemy
 
 router = APIRouter()
@@ -12,16 +20,18 @@ router = APIRouter()
 class ModificationRequest(BaseModel):
     command: str
 
-# Initialize LLM instance
-from app.config import GOOGLE_API_KEY
-llm = GoogleGenerativeAI(model="gemini-pro", api_key=GOOGLE_API_KEY)
+class BatchModificationRequest(BaseModel):
+    commands: List[str]
+
+# Shared LLM gateway (same model and limits as the other routes)
+llm = get_llm()
 
 
 @router.post("/modify_data")
 def modify_data(request: ModificationRequest):
     if not state.get("table_names"):
         raise HTTPException(status_code=400, detail="No tables available.")
-    schema_info = "\n".join([f"Table: {name}, Columns: {', '.join(df.columns)}" for name, df in state["table_names"]])
+    schema_info = "\n".join([f"Table: {name}, Columns: {', '.join(df.columns)}" for name, df in table_schemas(state["table_names"])])
     sql_query = translate_natural_language_to_sql(request.command, schema_info, llm)
     connection = state.get("personal_engine")
     try:
@@ -35,7 +45,71 @@ def modify_data(request: ModificationRequest):
         else:
             with connection.begin():
                 connection.execute(sqlalchemy.text(sql_query))
+        previous_frames = dict(table_schemas(state["table_names"]))
         refresh_tables(connection, state["table_names"], state["original_table_names"])
+        bump_table_versions(state)
+        # Apply only the changed rows to the column profiles instead of re-profiling every table.
+        refresh_table_profiles(state["table_names"], state["table_profiles"], previous_frames=previous_frames)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error executing modification: {e}")
     return {"status": "modification executed", "sql_query": sql_query}
+
+
+@router.post("/modify_data/batch")
+def modify_data_batch(request: BatchModificationRequest):
+    """
+    Apply a list of modification commands atomically: one LLM call translates all of
+    them, the statements run in a single transaction (rolled back if any fails) and
+    the tables and profiles are refreshed once at the end.
+    """
+    if not state.get("table_names"):
+        raise HTTPException(status_code=400, detail="No tables available.")
+    connection = state.get("personal_engine")
+    if connection is None:
+        raise HTTPException(status_code=400, detail="Batch modifications need a connected database.")
+    commands = [command.strip() for command in request.commands if command.strip()]
+    if not commands:
+        raise HTTPException(status_code=400, detail="No commands given.")
+    if len(commands) > MODIFY_BATCH_MAX_COMMANDS:
+        raise HTTPException(status_code=400, detail=f"At most {MODIFY_BATCH_MAX_COMMANDS} commands are allowed per batch.")
+
+    schema_info = "\n".join([f"Table: {name}, Columns: {', '.join(df.columns)}" for name, df in table_schemas(state["table_names"])])
+    try:
+        statements = translate_commands_to_sql_batch(commands, schema_info, llm)
+    except ValueError as e:
+        raise HTTPException(status_code=502, detail=f"Could not translate the commands: {e}")
+
+    # Check every statement before anything runs, so a bad one cannot leave half a batch applied.
+    dialect = get_connection_dialect(connection) or None
+    problems = []
+    for index, sql_query in enumerate(statements):
+        if not re.match(r"\s*(INSERT|UPDATE|DELETE)\b", sql_query, flags=re.IGNORECASE):
+            problems.append(f"Command {index + 1}: only INSERT, UPDATE and DELETE are allowed (SQL: {sql_query})")
+            continue
+        validated, errors = validate_sql_query(sql_query, table_schemas(state["table_names"]), dialect=dialect, read_only=False)
+        if errors or validated is None:
+            problems.append(f"Command {index + 1}: {'; '.join(errors)} (SQL: {sql_query})")
+        else:
+            statements[index] = validated
+    if problems:
+        raise HTTPException(status_code=400, detail={"message": "Batch not executed.", "errors": problems})
+
+    try:
+        rowcounts = execute_statements_in_transaction(statements, connection)
+    except ValueError as e:
+        raise HTTPException(status_code=500, detail=f"Error executing modification: {e}")
+    try:
+        previous_frames = dict(table_schemas(state["table_names"]))
+        refresh_tables(connection, state["table_names"], state["original_table_names"])
+        bump_table_versions(state)
+        refresh_table_profiles(state["table_names"], state["table_profiles"], previous_frames=previous_frames)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Batch committed, but refreshing the tables failed: {e}")
+    return {
+        "status": "batch executed",
+        "statements": [
+            {"command": command, "sql_query": sql_query, "rows_affected": rowcount}
+            for command, sql_query, rowcount in zip(commands, statements, rowcounts)
+        ],
+        "total_rows_affected": sum(count for count in rowcounts if count > 0),
+    }
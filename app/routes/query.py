@@ -1,16 +1,19 @@
 # app/routes/query.py
 import re
+import logging
 import sqlalchemy
-from sqlalchemy import text
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from app.routes.auth import get_current_user, create_dynamic_database_for_user
+from app.routes.auth import get_current_user
+from app.utils.provisioning import provisioning
 from app.models import User
 from app.utils.llm_helpers import (
     classify_user_query_llm,
-    get_special_prompt,
-    GoogleGenerativeAI
+    get_special_prompt
 )
+from app.utils.llm_gateway import get_llm, llm_user, LLMGateway
 # Locally define generate_dynamic_response since it's not imported.
 def generate_dynamic_response(user_query: str, column_name: str, value) -> str:
     prompt = f"""You are an expert data analysis assistant.
@@ -23,19 +26,46 @@ For example, if the query was "Total admission of Bhopal district", your answer
     dynamic_response = llm(prompt)
     return dynamic_response.strip()
  
-from app.utils.sql_helpers import enhance_user_query, generate_sql_query, execute_sql_query
-from app.utils.data_processing import generate_detailed_overview_in_memory
-from app.config import MODEL_NAME, GOOGLE_API_KEY, DATABASE_URI, MYSQL_USER, MYSQL_PASSWORD, MYSQL_HOST
+from app.utils.sql_helpers import (
+    enhance_user_query,
+    generate_sql_query,
+    execute_sql_query,
+    validate_and_repair_sql,
+    get_connection_dialect
+)
+from app.utils.sql_validation import SQLValidationError
+from app.utils.duckdb_engine import execute_duckdb_query
+from app.utils.profiling import generate_profile_overview
+from app.utils.memory_governor import table_schemas
+from app.utils.answer_templates import is_templatable, render_single_value_answer
+from app.utils.metrics import RESULT_ROWS, span, trace
+from app.utils.result_cache import data_source, etag_matches, etag_nonce, get_result_cache, make_etag, not_modified, request_key, table_versions, with_etag
+from app.utils.serialization import (
+    FastJSONResponse,
+    RESULT_FORMATS,
+    arrow_stream_response,
+    dumps,
+    frame_to_arrow,
+    is_arrow_table,
+    serialize_frame,
+    wants_arrow
+)
+from app.config import FILE_QUERY_ENGINE, ANSWER_MODE, ANSWER_LOCALE
 from app.state import state
 from app.database import get_db  # Dependency to get a DB session
  
 router = APIRouter()
+logger = logging.getLogger("query")
+logger.setLevel(logging.INFO)
  
 class UserQuery(BaseModel):
     query: str
+    dry_run: bool = False  # Validate and return the SQL without executing it.
+    rich_answer: bool = False  # Phrase single-value results with the LLM instead of a template.
+    result_format: str = "records"  # "records" or "columnar" ({columns, data}) for tabular results.
  
-# Initialize the LLM instance.
-llm = GoogleGenerativeAI(model=MODEL_NAME, api_key=GOOGLE_API_KEY)
+# Shared LLM gateway (one client, rate limited and coalesced across all routes).
+llm = get_llm()
  
 def is_advanced_sql_query(query: str) -> bool:
     """
@@ -66,7 +96,7 @@ def is_advanced_sql_query(query: str) -> bool:
     return False
  
  
-def dynamic_classify_query(user_query: str, llm: GoogleGenerativeAI) -> str:
+def dynamic_classify_query(user_query: str, llm: LLMGateway) -> str:
     """
     Dynamically classify the user's query by asking the LLM to decide if the query
     should be executed as SQL (direct data retrieval) or treated as a summary/analysis.
@@ -87,28 +117,129 @@ Consider that queries requesting aggregates or metrics (such as totals, averages
     return classification
  
  
+def classify_query(user_query: str) -> str:
+    """Use advanced SQL detection first; if not detected, use the dynamic classifier."""
+    if is_advanced_sql_query(user_query):
+        return "SQL"
+    classification = dynamic_classify_query(user_query, llm)
+    if classification not in ["SQL", "SUMMARY", "ANALYSIS"]:
+        classification = "SQL"
+    return classification
+ 
+ 
+def build_summary_prompt(user_query: str, overview: str) -> str:
+    special_instructions = get_special_prompt("SUMMARY")
+    return f"""
+User asked for a summary: "{user_query}"
+ 
+Data Overview:
+{overview}
+ 
+Follow these instructions when summarizing:
+{special_instructions}
+"""
+ 
+ 
+def build_analysis_prompt(user_query: str, overview: str) -> str:
+    return f"""
+You are an AI data analyst. The user asked: "{user_query}"
+ 
+Data Overview:
+{overview}
+ 
+Provide insights, trends, and actionable recommendations.
+"""
+ 
+ 
 @router.post("/execute_query")
 def execute_user_query(
     user_query: UserQuery,
+    request: Request,
     current_user: User = Depends(get_current_user),
     db: sqlalchemy.orm.Session = Depends(get_db)
 ):
+    """
+    Clients sending "Accept: application/vnd.apache.arrow.stream" get tabular results
+    as an Arrow IPC stream (sql_query and optimizations in the schema metadata);
+    single values, summaries and analyses are always JSON.
+    """
+    with trace("execute_query"):
+        as_arrow = wants_arrow(request)
+        # SQL results are cached per request, data source and table versions, and carry an ETag
+        # derived from the SQL and those, so a dashboard refresh on unchanged data is a 304.
+        versions = table_versions(state)
+        cache = get_result_cache()
+        cache_key = request_key(
+            "query", current_user.id, data_source(state), versions, as_arrow,
+            user_query.query, user_query.dry_run, user_query.rich_answer, user_query.result_format,
+        )
+        cached = cache.get(cache_key)
+        if cached is None:
+            with llm_user(current_user.id):
+                response = run_user_query(user_query, current_user, db, as_arrow=as_arrow)
+            if "sql_query" not in response:
+                # Summaries, analyses and early checks are not tied to a SQL result.
+                with span("query.serialize"):
+                    return FastJSONResponse(response)
+            etag = make_etag(
+                "query", response["sql_query"], data_source(state), versions, as_arrow,
+                user_query.dry_run, user_query.rich_answer, user_query.result_format, etag_nonce(state),
+            )
+            cached = {"etag": etag, "response": response}
+            cache.put(cache_key, cached, versions, rows=result_rows(response.get("result")))
+        etag, response = cached["etag"], cached["response"]
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        RESULT_ROWS.observe(result_rows(response.get("result")), endpoint="execute_query")
+        with span("query.serialize"):
+            if is_arrow_table(response.get("result")):
+                return with_etag(arrow_stream_response(
+                    response["result"],
+                    metadata={"sql_query": response["sql_query"], "optimizations": response["optimizations"]},
+                ), etag)
+            # Already JSON-ready, so FastAPI's jsonable_encoder pass is skipped.
+            return with_etag(FastJSONResponse(response), etag)
+ 
+ 
+def result_rows(result) -> int:
+    """Row count of a result in any of the response shapes (0 for text answers)."""
+    if is_arrow_table(result):
+        return result.num_rows
+    if isinstance(result, list):
+        return len(result)
+    if isinstance(result, dict):
+        return len(result.get("data", []))
+    return 0
+ 
+ 
+def prepare_user_query(user_query: UserQuery, current_user: User, db: sqlalchemy.orm.Session) -> tuple:
+    """
+    Checks shared by /execute_query and /execute_query/stream, run before the query
+    is classified so both endpoints answer the same question the same way.
+ 
+    Returns:
+        tuple: (tables, engine or None for duckdb, source, early response dict or None).
+    """
     if not state.get("table_names"):
         raise HTTPException(status_code=400, detail="No tables available. Please upload and save your data first.")
+    if user_query.result_format not in RESULT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown result_format. Use one of: {', '.join(RESULT_FORMATS)}.")
+    # Schemas only: tables spilled by the memory governor stay on disk (duckdb reads them there).
+    tables = table_schemas(state["table_names"])
  
     # Determine which connection to use.
     if state.get("personal_engine"):
         user_engine = state["personal_engine"]
         source = "personal"
+    elif state.get("source", "file") == "file" and FILE_QUERY_ENGINE == "duckdb":
+        # Uploaded tables are already in memory; query them in-process instead of via MySQL.
+        user_engine = None
+        source = "file"
     else:
-        if not current_user.dynamic_db:
-            dynamic_db_name = create_dynamic_database_for_user(current_user)
-            current_user.dynamic_db = dynamic_db_name
-            db.commit()
         try:
-            user_engine = sqlalchemy.create_engine(
-                f"mysql+mysqlconnector://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}/{current_user.dynamic_db}"
-            )
+            # Provisioned once per user; the engine is shared by all requests.
+            with span("query.provision"):
+                user_engine = provisioning.get_user_engine(db, current_user)
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Error creating dynamic database connection: {e}")
         source = "dynamic"
@@ -116,13 +247,12 @@ def execute_user_query(
     # For dynamic DBs, verify that expected tables exist.
     if source == "dynamic":
         try:
-            with user_engine.connect() as connection:
-                result = connection.execute(text("SHOW TABLES;"))
-                available_tables = [t[0] for t in result.fetchall()]
+            with span("query.list_tables"):
+                available_tables = sqlalchemy.inspect(user_engine).get_table_names()
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Error checking available tables: {e}")
  
-        expected_tables = [name for name, _ in state["table_names"]]
+        expected_tables = [name for name, _ in tables]
         missing = [tbl for tbl in expected_tables if tbl not in available_tables]
         if missing:
             raise HTTPException(
@@ -139,46 +269,85 @@ def execute_user_query(
         expected_metrics.append("admission")
     if expected_metrics:
         available_columns = set()
-        for _, df in state["table_names"]:
+        for _, df in tables:
             available_columns.update(col.lower() for col in df.columns)
         for metric in expected_metrics:
             if not any(metric in col for col in available_columns):
-                return {
+                early_response = {
                     "result": f"Requested metric '{metric}' not found in available columns. Please check your query or available data."
                 }
+                return tables, user_engine, source, early_response
     # -----------------------------------------------------
+    return tables, user_engine, source, None
  
-    # Use advanced SQL detection first; if not detected, use the dynamic classifier.
-    if is_advanced_sql_query(user_query.query):
-        classification = "SQL"
-    else:
-        classification = dynamic_classify_query(user_query.query, llm)
-        if classification not in ["SQL", "SUMMARY", "ANALYSIS"]:
-            classification = "SQL"
+ 
+def run_user_query(user_query: UserQuery, current_user: User, db: sqlalchemy.orm.Session, classification: str = None, as_arrow: bool = False, prepared: tuple = None):
+    """
+    Body of /execute_query. The streaming endpoint passes the classification and the
+    prepare_user_query result it already computed so neither is done twice. With
+    as_arrow, tabular results are returned as a pyarrow.Table (straight from duckdb
+    for uploaded files).
+    """
+    tables, user_engine, source, early_response = prepared or prepare_user_query(user_query, current_user, db)
+    if early_response is not None:
+        return early_response
+ 
+    if classification is None:
+        with span("query.classify"):
+            classification = classify_query(user_query.query)
  
     if classification == "SQL":
         schema_info = "\n".join(
-            [f"Table: {name}, Columns: {', '.join(df.columns)}" for name, df in state["table_names"]]
-        )
-        enhanced_query = enhance_user_query(user_query.query, state["table_names"])
-        dialect = None  # Optionally detect dialect.
-        sql_query, optimizations = generate_sql_query(
-            enhanced_query, schema_info, [], llm, state["table_names"], dialect=dialect
+            [f"Table: {name}, Columns: {', '.join(df.columns)}" for name, df in tables]
         )
+        with span("query.enhance"):
+            enhanced_query = enhance_user_query(user_query.query, tables)
+        dialect = "duckdb" if source == "file" else (get_connection_dialect(user_engine) or None)
+        with span("query.generate_sql"):
+            sql_query, optimizations = generate_sql_query(
+                enhanced_query, schema_info, [], llm, tables, dialect=dialect
+            )
        
         # For ranking queries: if no ORDER BY or LIMIT is present, re-generate with additional instruction.
         if re.search(r'\btop\s+\d+', user_query.query.lower()):
             sql_lower = sql_query.lower()
             if "order by" not in sql_lower and "limit" not in sql_lower:
                 additional_instruction = "Ensure the query returns only the top results using ORDER BY and LIMIT."
-                sql_query, optimizations = generate_sql_query(
-                    enhanced_query + " " + additional_instruction,
-                    schema_info, [], llm, state["table_names"], dialect=dialect
+                with span("query.regenerate_sql"):
+                    sql_query, optimizations = generate_sql_query(
+                        enhanced_query + " " + additional_instruction,
+                        schema_info, [], llm, tables, dialect=dialect
+                    )
+ 
+        # Validate locally (one LLM repair at most) so broken SQL never reaches the database.
+        try:
+            with span("query.validate"):
+                sql_query = validate_and_repair_sql(
+                    sql_query, user_query.query, schema_info, llm, tables, dialect=dialect
                 )
+        except SQLValidationError as e:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Generated SQL failed validation: {'; '.join(e.errors)} (SQL: {e.sql_query})"
+            )
+        if user_query.dry_run:
+            return {"sql_query": sql_query, "optimizations": optimizations, "dry_run": True}
+ 
         try:
-            result_df = execute_sql_query(sql_query, user_query.query, user_engine)
+            with span("query.execute"):
+                if source == "file":
+                    result_df = execute_duckdb_query(sql_query, tables, arrow=as_arrow)
+                else:
+                    result_df = execute_sql_query(sql_query, user_query.query, user_engine)
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Error executing SQL: {e}")
+ 
+        if as_arrow:
+            result_table = result_df if is_arrow_table(result_df) else frame_to_arrow(result_df)
+            if result_table.num_rows > 0 and result_table.shape != (1, 1):
+                return {"sql_query": sql_query, "optimizations": optimizations, "result": result_table}
+            # Empty and single-value results are answered in JSON as usual.
+            result_df = result_table.to_pandas()
        
         if result_df.empty:
             return {
@@ -190,38 +359,103 @@ def execute_user_query(
         if result_df.shape == (1, 1):
             column_name = list(result_df.columns)[0]
             value = result_df.iloc[0, 0]
-            result_response = generate_dynamic_response(user_query.query, column_name, value)
+            with span("query.answer"):
+                result_response = None
+                # Missing and infinite values are left to the LLM, which can explain them.
+                if not (user_query.rich_answer or ANSWER_MODE == "rich") and is_templatable(value):
+                    # Phrased locally: saves a full LLM round-trip on the most common query type.
+                    result_response = render_single_value_answer(
+                        user_query.query, sql_query, column_name, value, locale=ANSWER_LOCALE, dialect=dialect
+                    )
+                if result_response is None:
+                    result_response = generate_dynamic_response(user_query.query, column_name, value)
         else:
-            result_response = result_df.to_dict(orient="records")
+            with span("query.to_records"):
+                result_response = serialize_frame(result_df, user_query.result_format)
        
         return {"sql_query": sql_query, "optimizations": optimizations, "result": result_response}
    
     elif classification == "SUMMARY":
-        overview = generate_detailed_overview_in_memory(state["table_names"])
-        special_instructions = get_special_prompt("SUMMARY")
-        prompt = f"""
-User asked for a summary: "{user_query.query}"
- 
-Data Overview:
-{overview}
- 
-Follow these instructions when summarizing:
-{special_instructions}
-"""
-        summary_response = llm(prompt)
+        with span("query.overview"):
+            overview = generate_profile_overview(state["table_names"], state["table_profiles"])
+        with span("query.summary"):
+            summary_response = llm(build_summary_prompt(user_query.query, overview))
         return {"summary": summary_response}
    
     else:  # ANALYSIS
-        overview = generate_detailed_overview_in_memory(state["table_names"])
-        prompt = f"""
-You are an AI data analyst. The user asked: "{user_query.query}"
+        with span("query.overview"):
+            overview = generate_profile_overview(state["table_names"], state["table_profiles"])
+        with span("query.analysis"):
+            analysis_response = llm(build_analysis_prompt(user_query.query, overview))
+        return {"analysis": analysis_response}
  
-Data Overview:
-{overview}
  
-Provide insights, trends, and actionable recommendations.
-"""
-        analysis_response = llm(prompt)
-        return {"analysis": analysis_response}
+def format_sse(event: str, data) -> str:
+    """Encode one Server-Sent Events message."""
+    return f"event: {event}\ndata: {dumps(data).decode('utf-8')}\n\n"
+ 
+ 
+async def stream_llm_events(prompt: str, request: Request, classification: str, user_id=None):
+    """
+    Forward LLM tokens as SSE "token" events while they are generated.
+    Generation stops as soon as the client goes away: either the disconnect check
+    below notices it, or Starlette cancels this generator and the finally block
+    closes the model stream, which aborts the upstream request.
+    """
+    stream = llm.astream(prompt, user_id=user_id)
+    try:
+        async for chunk in stream:
+            if await request.is_disconnected():
+                logger.info(f"Client disconnected; stopped {classification} generation.")
+                return
+            yield format_sse("token", {"text": chunk})
+        yield format_sse("done", {"classification": classification})
+    except Exception as e:
+        logger.error(f"Error streaming {classification} response: {e}")
+        yield format_sse("error", {"detail": str(e)})
+    finally:
+        await stream.aclose()
+ 
+ 
+@router.post("/execute_query/stream")
+async def stream_user_query(
+    user_query: UserQuery,
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    db: sqlalchemy.orm.Session = Depends(get_db)
+):
+    """
+    Streaming variant of /execute_query (text/event-stream).
+    SUMMARY and ANALYSIS answers arrive as "token" events followed by "done";
+    SQL queries are answered with a single "result" event holding the usual JSON body.
+    """
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    prepared = await run_in_threadpool(prepare_user_query, user_query, current_user, db)
+    result = prepared[3]
+    if result is None:
+        with llm_user(current_user.id), span("query.classify"):
+            classification = await run_in_threadpool(classify_query, user_query.query)
+    else:
+        classification = "SQL"
+ 
+    if classification == "SQL":
+        if result is None:
+            with llm_user(current_user.id):
+                result = await run_in_threadpool(run_user_query, user_query, current_user, db, classification, prepared=prepared)
+        async def single_result():
+            yield format_sse("result", result)
+            yield format_sse("done", {"classification": classification})
+        return StreamingResponse(single_result(), media_type="text/event-stream", headers=headers)
+ 
+    overview = await run_in_threadpool(generate_profile_overview, state["table_names"], state["table_profiles"])
+    if classification == "SUMMARY":
+        prompt = build_summary_prompt(user_query.query, overview)
+    else:
+        prompt = build_analysis_prompt(user_query.query, overview)
+    return StreamingResponse(
+        stream_llm_events(prompt, request, classification, user_id=current_user.id),
+        media_type="text/event-stream",
+        headers=headers
+    )
  
  
\ No newline at end of file
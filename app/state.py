@@ -1,5 +1,16 @@
 # app/state.py
+import contextlib
+import contextvars
 import threading
+from app.utils.memory_governor import TableList
+ 
+# Keys holding live objects (engines, connections, duckdb sessions) that only make
+# sense inside the process that created them; state backends never persist them.
+TRANSIENT_KEYS = {"personal_engine", "mysql_connection", "duckdb_session"}
+# Derived caches that are rebuilt on demand from the tables.
+CACHE_KEYS = {"table_profiles", "join_sketches"}
+# Lists of (table_name, DataFrame) tuples; stored as TableLists so frames can be spilled.
+TABLE_KEYS = ("table_names", "original_table_names")
  
 class GlobalState(dict):
     """
@@ -10,6 +21,11 @@ class GlobalState(dict):
         self._lock = threading.Lock()
         super().__init__(*args, **kwargs)
  
+    def __setitem__(self, key, value):
+        if key in TABLE_KEYS and not isinstance(value, TableList):
+            value = TableList(value)
+        super().__setitem__(key, value)
+ 
     def safe_clear(self):
         """
         Clears the state values in a thread-safe manner.
@@ -20,15 +36,75 @@ class GlobalState(dict):
             self["original_table_names"].clear()
             self["personal_engine"] = None
             self["mysql_connection"] = None
+            self["personal_db"] = None
+            self["source"] = "file"
+            self["table_profiles"].clear()
+            self["join_sketches"].clear()
+            self["table_versions"].clear()
             self["chat_history"].clear()
  
-# Instantiate the global state with default keys and values.
-state = GlobalState({
-    "table_names": [],           # List of tuples: (table_name, DataFrame)
-    "original_table_names": [],  # List of tuples: (table_name, original DataFrame)
-    "personal_engine": None,     # SQLAlchemy engine for personal DB
-    "mysql_connection": None,    # MySQL connector connection if used
-    "chat_history": []           # (Optional) Chat history if needed
-})
+def new_state() -> GlobalState:
+    """A fresh state with the default keys and values."""
+    return GlobalState({
+        "table_names": TableList(),           # List of tuples: (table_name, DataFrame)
+        "original_table_names": TableList(),  # List of tuples: (table_name, original DataFrame)
+        "personal_engine": None,     # SQLAlchemy engine for personal DB
+        "mysql_connection": None,    # MySQL connector connection if used
+        "personal_db": None,         # Connection parameters of the personal DB, without the password
+        "source": "file",            # "file" for uploaded data, "personal" for a connected DB
+        "table_profiles": {},        # table_name -> column statistics profile (see utils/profiling.py)
+        "join_sketches": {},         # table_name -> per-column join key sketches (see utils/join_sketches.py)
+        "table_versions": {},        # table_name -> data version, for ETags and the result cache (see utils/result_cache.py)
+        "chat_history": []           # (Optional) Chat history if needed
+    })
+ 
+# State of the session the current request belongs to (set by SessionStateMiddleware).
+_session_state = contextvars.ContextVar("session_state", default=None)
+# Used outside of requests (startup, scripts, background threads without a session).
+_default_state = new_state()
+ 
+@contextlib.contextmanager
+def use_state(session_state: GlobalState):
+    """Make `state` refer to session_state inside this block."""
+    token = _session_state.set(session_state)
+    try:
+        yield session_state
+    finally:
+        _session_state.reset(token)
+ 
+class StateProxy:
+    """
+    Module-level `state` object: forwards every access to the current session's
+    GlobalState, so code can keep using state["table_names"] while each user and
+    session gets its own tables.
+    """
+    def _target(self) -> GlobalState:
+        current = _session_state.get()
+        return current if current is not None else _default_state
+ 
+    def __getitem__(self, key):
+        return self._target()[key]
+ 
+    def __setitem__(self, key, value):
+        self._target()[key] = value
+ 
+    def __delitem__(self, key):
+        del self._target()[key]
+ 
+    def __contains__(self, key):
+        return key in self._target()
+ 
+    def __iter__(self):
+        return iter(self._target())
+ 
+    def __len__(self):
+        return len(self._target())
+ 
+    def __getattr__(self, name):
+        # get, setdefault, pop, keys, items, update, safe_clear, ...
+        return getattr(self._target(), name)
+ 
+    def __repr__(self):
+        return f"StateProxy({self._target()!r})"
  
- 
\ No newline at end of file
+state = StateProxy()
@@ -0,0 +1,213 @@
+# app/utils/answer_templates.py
+import datetime
+import math
+import numbers
+import re
+from decimal import Decimal, ROUND_HALF_UP
+from app.utils.sql_validation import to_sqlglot_dialect
+
+# Aggregate function -> phrase used in the answer.
+AGGREGATE_PHRASES = {
+    "SUM": "total",
+    "AVG": "average",
+    "COUNT": "number of",
+    "MAX": "highest",
+    "MIN": "lowest",
+    "MEDIAN": "median",
+}
+
+# Column name prefixes/suffixes that reveal the aggregate when the SQL does not
+# (e.g. "total_sales", "avg_price", "order_count").
+NAME_HINTS = [
+    (r"^(sum|total)_", "SUM"),
+    (r"^(avg|average|mean)_", "AVG"),
+    (r"^(count|num|number_of)_", "COUNT"),
+    (r"^(max|maximum|highest)_", "MAX"),
+    (r"^(min|minimum|lowest)_", "MIN"),
+    (r"_(sum|total)$", "SUM"),
+    (r"_(avg|average|mean)$", "AVG"),
+    (r"_count$", "COUNT"),
+    (r"^(count|cnt)$", "COUNT"),
+]
+
+# Words that start a filter phrase in the question ("... in 2023", "... of Bhopal district").
+FILTER_PREPOSITIONS = r"in|for|of|from|during|where|with|at|on|between|since|after|before|across|under|over"
+
+# Significant digits kept for numbers too small for the usual two decimals.
+SMALL_VALUE_DIGITS = 3
+
+# decimal separator, group separator, group sizes (first group, then repeating)
+LOCALE_FORMATS = {
+    "en_US": (".", ",", (3, 3)),
+    "en_GB": (".", ",", (3, 3)),
+    "en_IN": (".", ",", (3, 2)),
+    "hi_IN": (".", ",", (3, 2)),
+    "de_DE": (",", ".", (3, 3)),
+    "es_ES": (",", ".", (3, 3)),
+    "it_IT": (",", ".", (3, 3)),
+    "fr_FR": (",", " ", (3, 3)),
+    "pt_BR": (",", ".", (3, 3)),
+    "ru_RU": (",", " ", (3, 3)),
+    "de_CH": (".", "'", (3, 3)),
+}
+
+
+def _group_digits(digits: str, separator: str, sizes: tuple) -> str:
+    first, rest = sizes
+    if len(digits) <= first:
+        return digits
+    groups = [digits[-first:]]
+    digits = digits[:-first]
+    while digits:
+        groups.append(digits[-rest:])
+        digits = digits[:-rest]
+    return separator.join(reversed(groups))
+
+
+def format_number(value, locale: str = "en_US", decimals: int = 2) -> str:
+    """
+    Format a number with the grouping and decimal separators of `locale`
+    (e.g. 1234567.5 -> "1,234,567.5" for en_US, "12,34,567.5" for en_IN,
+    "1.234.567,5" for de_DE). Trailing zeros of the fraction are dropped.
+    Magnitudes below 0.1 keep three significant digits (0.001234 -> "0.00123")
+    instead of rounding to "0". Unknown locales fall back to the language's
+    default, then to en_US.
+    """
+    fmt = LOCALE_FORMATS.get(locale) or next(
+        (f for name, f in LOCALE_FORMATS.items() if name.split("_")[0] == locale.split("_")[0]),
+        LOCALE_FORMATS["en_US"],
+    )
+    decimal_sep, group_sep, sizes = fmt
+    if isinstance(value, numbers.Integral):
+        quantized = Decimal(int(value))
+    else:
+        magnitude = abs(float(value))
+        if 0 < magnitude < 10 ** (1 - decimals):
+            decimals = SMALL_VALUE_DIGITS - 1 - math.floor(math.log10(magnitude))
+        quantized = Decimal(str(float(value))).quantize(Decimal(1).scaleb(-decimals), rounding=ROUND_HALF_UP)
+    sign = "-" if quantized < 0 else ""
+    integer_part, _, fraction = f"{abs(quantized):f}".partition(".")
+    fraction = fraction.rstrip("0")
+    text = sign + _group_digits(integer_part, group_sep, sizes)
+    return f"{text}{decimal_sep}{fraction}" if fraction else text
+
+
+def is_templatable(value) -> bool:
+    """
+    Whether render_single_value_answer can phrase value. Missing scalars (None, NaN,
+    NaT, pd.NA) and infinities are not: they have no sensible formatted number.
+    """
+    if value is None or type(value).__name__ in ("NAType", "NaTType"):
+        return False
+    if isinstance(value, Decimal):
+        return value.is_finite()
+    if isinstance(value, numbers.Real) and not isinstance(value, numbers.Integral):
+        return math.isfinite(value)
+    return True
+
+
+def format_value(value, locale: str = "en_US") -> str:
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return "not available"
+    if isinstance(value, bool):
+        return "yes" if value else "no"
+    if isinstance(value, (numbers.Number, Decimal)):
+        return format_number(value, locale)
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        # pandas Timestamps are datetimes; drop a midnight time component.
+        if isinstance(value, datetime.datetime) and value.time() == datetime.time(0):
+            return value.strftime("%Y-%m-%d")
+        return value.isoformat(sep=" ") if isinstance(value, datetime.datetime) else value.isoformat()
+    text = str(value)
+    return "not available" if text in ("NaT", "nan", "None") else text
+
+
+def humanize(name: str) -> str:
+    return re.sub(r"\s+", " ", re.sub(r"[_\W]+", " ", name)).strip().lower()
+
+
+def detect_aggregate(sql_query: str, column_name: str, dialect: str = None) -> tuple:
+    """
+    Return (aggregate function or None, measured column or None) for the single
+    result column, read from the SQL projection and, failing that, from the column name.
+
+    Only a bare aggregate counts (aliased, cast or rounded: ROUND(AVG(x), 2)). A
+    compound expression such as SUM(a) / SUM(b) returns ("EXPRESSION", None): it is
+    not the total of anything, so render_single_value_answer leaves it to the LLM.
+    """
+    try:
+        import sqlglot
+        from sqlglot import exp
+        tree = sqlglot.parse_one(sql_query, read=to_sqlglot_dialect(dialect))
+        select = tree if isinstance(tree, exp.Select) else tree.find(exp.Select)
+        projection = select.expressions[0] if select is not None and select.expressions else None
+        while isinstance(projection, (exp.Alias, exp.Paren, exp.Cast, exp.Round)):
+            projection = projection.this
+        if isinstance(projection, exp.AggFunc):
+            func = projection.key.upper()
+            if isinstance(projection, exp.Count) and projection.find(exp.Distinct):
+                func = "COUNT_DISTINCT"
+            column = projection.find(exp.Column)
+            return func, column.name if column is not None else None
+        if projection is not None and projection.find(exp.AggFunc) is not None:
+            return "EXPRESSION", None
+    except Exception:
+        pass
+    lowered = column_name.lower()
+    for pattern, func in NAME_HINTS:
+        if re.search(pattern, lowered):
+            return func, re.sub(pattern, "", lowered)
+    return None, None
+
+
+def extract_filter_phrase(user_query: str, measure: str = None) -> str:
+    """
+    The part of the question that restricts the result, e.g. "of Bhopal district" in
+    "Total admission of Bhopal district". Looks after the measure's mention first,
+    then for the first prepositional phrase.
+    """
+    question = user_query.strip().rstrip("?.! ")
+    search_from = 0
+    if measure:
+        mention = re.search(re.escape(measure).replace(r"\ ", r"[\s_]+"), question, flags=re.IGNORECASE)
+        if mention:
+            search_from = mention.end()
+    match = re.search(rf"\b({FILTER_PREPOSITIONS})\b\s+\S.*$", question[search_from:], flags=re.IGNORECASE)
+    if match is None and search_from:
+        match = re.search(rf"\b({FILTER_PREPOSITIONS})\b\s+\S.*$", question, flags=re.IGNORECASE)
+    if match is None:
+        return ""
+    phrase = match.group(0)
+    return phrase[0].lower() + phrase[1:]
+
+
+def render_single_value_answer(user_query: str, sql_query: str, column_name: str, value, locale: str = "en_US", dialect: str = None) -> str:
+    """
+    Turn a 1x1 query result into a sentence without an LLM call, e.g.
+    "The total admission of Bhopal district is 12,345." Returns None when the
+    result is a compound expression the template cannot name.
+    """
+    func, measured = detect_aggregate(sql_query, column_name, dialect)
+    if func == "EXPRESSION":
+        return None
+    measure = humanize(measured or column_name)
+    filter_phrase = extract_filter_phrase(user_query, measure)
+    formatted = format_value(value, locale)
+    suffix = f" {filter_phrase}" if filter_phrase else ""
+
+    if func in ("COUNT", "COUNT_DISTINCT"):
+        noun = "distinct " if func == "COUNT_DISTINCT" else ""
+        if measured:
+            subject = f"number of {noun}{measure}"
+        else:
+            # COUNT(*): the subject is in the question ("How many orders ..."), not in the SQL.
+            subject = f"number of {noun}records"
+            asked = re.search(r"\bhow many\s+([\w ]+?)(?:\s+(?:are|were|is|was|do|did|have|has)\b|\s*$)",
+                              user_query.strip().rstrip("?.! "), flags=re.IGNORECASE)
+            if asked:
+                subject = f"number of {noun}{asked.group(1).lower()}"
+                suffix = f" {extract_filter_phrase(user_query, asked.group(1))}".rstrip()
+        return f"The {subject}{suffix} is {formatted}."
+    phrase = AGGREGATE_PHRASES.get(func)
+    subject = f"{phrase} {measure}" if phrase else measure
+    return f"The {subject}{suffix} is {formatted}."
@@ -0,0 +1,203 @@
+# app/utils/chart_reduction.py
+import numpy as np
+import pandas as pd
+
+REDUCTION_MODES = ["auto", "lttb", "top_n", "time_bucket", "none"]
+AGGREGATIONS = ["sum", "mean", "min", "max", "count"]
+
+# Candidate time buckets from finest to coarsest; the first one that fits the point budget wins.
+# The timedelta is only used to estimate the number of buckets for calendar frequencies.
+TIME_BUCKETS = [
+    ("1s", pd.Timedelta(seconds=1)),
+    ("1min", pd.Timedelta(minutes=1)),
+    ("5min", pd.Timedelta(minutes=5)),
+    ("15min", pd.Timedelta(minutes=15)),
+    ("30min", pd.Timedelta(minutes=30)),
+    ("1h", pd.Timedelta(hours=1)),
+    ("6h", pd.Timedelta(hours=6)),
+    ("12h", pd.Timedelta(hours=12)),
+    ("1D", pd.Timedelta(days=1)),
+    ("7D", pd.Timedelta(days=7)),
+    ("MS", pd.Timedelta(days=31)),
+    ("QS", pd.Timedelta(days=92)),
+    ("YS", pd.Timedelta(days=366)),
+]
+
+LINE_CHARTS = {"line", "area", "scatter"}
+CATEGORY_CHARTS = {"bar", "pie", "doughnut", "donut", "column"}
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+
+    Returns the indices of the points to keep: the first and last point plus, for each
+    bucket in between, the point forming the largest triangle with the previously kept
+    point and the average of the next bucket. This keeps the visual shape of the series.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = x.astype("float64")
+    y = np.nan_to_num(y.astype("float64"))
+    bucket_size = (n - 2) / (threshold - 2)
+    indices = np.empty(threshold, dtype="int64")
+    indices[0] = 0
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * bucket_size) + 1
+        end = int((i + 1) * bucket_size) + 1
+        next_start = end
+        next_end = min(int((i + 2) * bucket_size) + 1, n)
+        if next_start >= next_end:
+            avg_x, avg_y = x[n - 1], y[n - 1]
+        else:
+            avg_x = x[next_start:next_end].mean()
+            avg_y = y[next_start:next_end].mean()
+        areas = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(areas))
+        indices[i + 1] = a
+    indices[-1] = n - 1
+    return indices
+
+
+def top_n_with_other(df: pd.DataFrame, label_col: str, measure_cols: list, max_points: int, aggregation: str = "sum", other_label: str = "Other") -> tuple:
+    """
+    Keep the largest max_points - 1 categories (ranked by the first measure) and fold
+    the rest into a single "Other" bucket. Duplicate labels are aggregated first.
+    """
+    grouped = df.groupby(label_col, sort=False, dropna=False)[measure_cols].agg(aggregation).reset_index()
+    if len(grouped) <= max_points:
+        return grouped, 0
+    keep = max(max_points - 1, 1)
+    order = grouped[measure_cols[0]].abs().sort_values(ascending=False, kind="stable").index
+    top = grouped.loc[order[:keep]]
+    rest = grouped.loc[order[keep:]]
+    other_values = rest[measure_cols].agg("sum" if aggregation == "count" else aggregation)
+    other_row = pd.DataFrame([[other_label] + other_values.tolist()], columns=[label_col] + measure_cols)
+    return pd.concat([top, other_row], ignore_index=True), len(rest)
+
+
+def as_datetime(series: pd.Series):
+    """Return the series as datetimes if it holds dates (or date strings), otherwise None."""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series
+    if series.dtype != object:
+        return None
+    sample = series.dropna().head(20)
+    if sample.empty or pd.to_datetime(sample, errors="coerce").isna().any():
+        return None
+    converted = pd.to_datetime(series, errors="coerce")
+    return converted if converted.notna().any() else None
+
+
+def time_bucket(df: pd.DataFrame, date_col: str, measure_cols: list, max_points: int, aggregation: str = "mean") -> tuple:
+    """
+    Resample a time series into the finest calendar bucket that fits max_points.
+    Empty buckets are dropped so gaps in the data do not show up as zeros.
+    """
+    span = df[date_col].max() - df[date_col].min()
+    freq = TIME_BUCKETS[-1][0]
+    for candidate, width in TIME_BUCKETS:
+        if span / width < max_points:
+            freq = candidate
+            break
+    grouped = df.groupby(pd.Grouper(key=date_col, freq=freq))[measure_cols]
+    if aggregation == "sum":
+        bucketed = grouped.sum(min_count=1)
+    else:
+        bucketed = grouped.agg(aggregation)
+    bucketed = bucketed.dropna(how="all").reset_index()
+    # Calendar buckets are estimates; never exceed the budget.
+    if len(bucketed) > max_points:
+        keep = lttb_indices(np.arange(len(bucketed)), bucketed[measure_cols[0]].to_numpy(), max_points)
+        bucketed = bucketed.iloc[keep].reset_index(drop=True)
+    return bucketed, freq
+
+
+def numeric_measures(df: pd.DataFrame, measure_cols: list) -> pd.DataFrame:
+    """
+    Convert object measure columns (e.g. DECIMAL values from MySQL) to numbers.
+    Raises ValueError for a measure that is not numeric, since it cannot be
+    aggregated or downsampled.
+    """
+    converted = {}
+    for col in measure_cols:
+        if pd.api.types.is_numeric_dtype(df[col]):
+            continue
+        try:
+            converted[col] = pd.to_numeric(df[col])
+        except (ValueError, TypeError):
+            raise ValueError(f"Column '{col}' is not numeric; only numeric measures can be reduced.")
+    return df.assign(**converted) if converted else df
+
+
+def reduce_chart_data(result_df: pd.DataFrame, chart_type: str, max_points: int, mode: str = "auto", aggregation: str = None) -> tuple:
+    """
+    Reduce a chart query result to at most max_points rows.
+
+    The first column is the dimension and the remaining columns are measures, as in
+    generate_chart. Modes:
+      - "lttb": Largest-Triangle-Three-Buckets downsampling (line charts).
+      - "top_n": top categories plus an "Other" bucket (bar and pie charts).
+      - "time_bucket": resample a date dimension into calendar buckets.
+      - "auto": pick one of the above from the chart type and the dimension's dtype.
+
+    Returns:
+        tuple: (reduced DataFrame, metadata dict describing what was reduced).
+    """
+    original_points = len(result_df)
+    label_col = result_df.columns[0]
+    measure_cols = list(result_df.columns[1:])
+    chart_type = (chart_type or "").lower()
+    metadata = {
+        "mode": "none",
+        "max_points": max_points,
+        "original_points": original_points,
+        "returned_points": original_points,
+        "reduced": False,
+    }
+    if mode == "none" or original_points <= max_points:
+        return result_df, metadata
+    result_df = numeric_measures(result_df, measure_cols)
+
+    dates = as_datetime(result_df[label_col])
+    if mode == "auto":
+        if dates is not None and chart_type not in {"pie", "doughnut", "donut"}:
+            mode = "time_bucket"
+        elif chart_type in LINE_CHARTS:
+            mode = "lttb"
+        else:
+            mode = "top_n"
+
+    if mode == "time_bucket":
+        if dates is None:
+            raise ValueError(f"Column '{label_col}' is not a date column; time bucketing is not possible.")
+        aggregation = aggregation or ("sum" if chart_type in CATEGORY_CHARTS else "mean")
+        frame = result_df.copy()
+        frame[label_col] = dates
+        reduced, freq = time_bucket(frame.dropna(subset=[label_col]), label_col, measure_cols, max_points, aggregation)
+        metadata.update({"bucket": freq, "aggregation": aggregation})
+    elif mode == "top_n":
+        aggregation = aggregation or "sum"
+        reduced, other_count = top_n_with_other(result_df, label_col, measure_cols, max_points, aggregation)
+        metadata.update({"aggregation": aggregation, "other_categories": other_count})
+    elif mode == "lttb":
+        x = result_df[label_col]
+        if dates is not None:
+            x_values = dates.astype("int64").to_numpy()
+        elif pd.api.types.is_numeric_dtype(x):
+            x_values = x.to_numpy()
+        else:
+            x_values = np.arange(original_points)
+        keep = lttb_indices(x_values, result_df[measure_cols[0]].to_numpy(), max_points)
+        reduced = result_df.iloc[keep].reset_index(drop=True)
+        metadata["selected_by"] = measure_cols[0]
+    else:
+        raise ValueError(f"Unknown reduction mode '{mode}'. Use one of: {', '.join(REDUCTION_MODES)}.")
+
+    metadata.update({"mode": mode, "returned_points": len(reduced), "reduced": True})
+    return reduced, metadata
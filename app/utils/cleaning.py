@@ -1,10 +1,19 @@
 # app/utils/cleaning.py
 import re
+import functools
 import pandas as pd
-import spacy
 
-# Load spaCy model globally for NLP tasks
-NLP_MODEL = spacy.load("en_core_web_sm")
+@functools.lru_cache(maxsize=1)
+def get_nlp_model():
+    """Load the spaCy model on first use; importing spaCy and en_core_web_sm takes seconds."""
+    import spacy
+    return spacy.load("en_core_web_sm")
+
+def __getattr__(name):
+    # Keep `from app.utils.cleaning import NLP_MODEL` working without loading spaCy at import time.
+    if name == "NLP_MODEL":
+        return get_nlp_model()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def validate_data(df: pd.DataFrame, file_name: str) -> list:
     messages = []
@@ -54,12 +63,13 @@ def validate_data(df: pd.DataFrame, file_name: str) -> list:
                 col_errors.append("inconsistent date formats")
         if "phone" in col_lower:
             phone_pattern = re.compile(r"^\+?\d[\d\s\-]{7,}\d$")
-            invalid = df[col].astype(str).apply(lambda x: not bool(phone_pattern.match(x.strip())))
+            # map(str): pandas 3 keeps missing values as NaN in astype(str).
+            invalid = df[col].map(str).apply(lambda x: not bool(phone_pattern.match(x.strip())))
             if invalid.sum() > 0:
                 col_errors.append("inconsistent phone number format")
         if "email" in col_lower:
             email_pattern = re.compile(r"[^@]+@[^@]+\.[^@]+")
-            invalid = df[col].astype(str).apply(lambda x: not bool(email_pattern.fullmatch(x.strip())))
+            invalid = df[col].map(str).apply(lambda x: not bool(email_pattern.fullmatch(x.strip())))
             if invalid.sum() > 0:
                 col_errors.append("possible invalid email addresses")
         if "country" in col_lower:
@@ -133,6 +143,10 @@ def rename_case_conflict_columns(df: pd.DataFrame) -> pd.DataFrame:
     df.columns = new_columns
     return df
 
+def clean_table(df: pd.DataFrame) -> pd.DataFrame:
+    """clean_data followed by rename_case_conflict_columns, as one CPU pool task."""
+    return rename_case_conflict_columns(clean_data(df.copy()))
+
 def comprehensive_data_cleaning(df: pd.DataFrame, file_name: str, llm) -> tuple[pd.DataFrame, str]:
     # Rename columns to avoid case conflicts.
     df = rename_case_conflict_columns(df)
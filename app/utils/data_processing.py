@@ -1,7 +1,12 @@
 # app/utils/data_processing.py
+import logging
+from io import BytesIO
 import pandas as pd
 import re
-import math
+from app.utils.serialization import frame_to_records
+
+logger = logging.getLogger("data_processing")
+logger.setLevel(logging.INFO)
 
 def load_data(file) -> pd.DataFrame:
     try:
@@ -12,36 +17,87 @@ def load_data(file) -> pd.DataFrame:
         else:
             return pd.DataFrame()
     except Exception as e:
-        print(f"Error loading file {file.filename}: {e}")
+        logger.error(f"Error loading file {file.filename}: {e}")
         return pd.DataFrame()
 
-def generate_table_name(file_name: str) -> str:
-    return file_name.split('.')[0].replace(" ", "_").lower()
+def read_csv_bytes(content: bytes) -> pd.DataFrame:
+    """Parse an uploaded CSV from its raw bytes (runs in the CPU pool, so it takes no file handle)."""
+    return pd.read_csv(BytesIO(content))
+
+def read_excel_sheets(content: bytes, file_name: str) -> dict:
+    """Parse every non-empty sheet of an uploaded .xlsx file into {sheet name: DataFrame}."""
+    excel_file = pd.ExcelFile(BytesIO(content))
+    sheets = {}
+    for sheet in excel_file.sheet_names:
+        try:
+            df_sheet = pd.read_excel(excel_file, sheet_name=sheet)
+            if not df_sheet.empty:
+                sheets[sheet] = df_sheet
+        except Exception as e:
+            logging.getLogger("upload").error(f"Error reading sheet {sheet} in file {file_name}: {e}")
+    return sheets
 
-def clean_nan(obj):
+def get_common_attributes(sheets: dict) -> set:
     """
-    Recursively traverse lists/dictionaries and replace any NaN float values with None.
+    Dynamically returns the set of column names common to all sheets.
+    All column names are normalized (lowercased and stripped) for case-insensitive comparison.
     """
-    if isinstance(obj, list):
-        return [clean_nan(item) for item in obj]
-    elif isinstance(obj, dict):
-        return {k: clean_nan(v) for k, v in obj.items()}
-    elif isinstance(obj, float):
-        if math.isnan(obj):
-            return None
-        return obj
-    else:
-        return obj
+    common = None
+    for sheet_name, df in sheets.items():
+        cols = set(col.strip().lower() for col in df.columns if col.strip())
+        if common is None:
+            common = cols
+        else:
+            common = common.intersection(cols)
+    return common if common is not None else set()
+
+def are_sheets_related(sheets: dict, threshold: float = 0.5) -> bool:
+    """
+    Checks whether the sheets are related by comparing common columns' data values
+    (runs in the CPU pool: it normalizes every value of the shared columns).
+
+    For each common column (normalized), compute the overlap ratio of distinct values
+    (also normalized) between sheets. If the average overlap ratio for any common column
+    meets or exceeds the threshold, the sheets are considered related.
+    """
+    common_cols = get_common_attributes(sheets)
+    if not common_cols:
+        return False
+
+    for col in common_cols:
+        value_sets = []
+        for df in sheets.values():
+            actual_col = next((c for c in df.columns if c.strip().lower() == col), None)
+            if actual_col:
+                vals = set(df[actual_col].dropna().astype(str).str.lower().str.strip())
+                if vals:
+                    value_sets.append(vals)
+        if len(value_sets) < 2:
+            continue
+        ratios = []
+        ref = value_sets[0]
+        for other in value_sets[1:]:
+            union = ref.union(other)
+            if not union:
+                ratios.append(0)
+            else:
+                ratio = len(ref.intersection(other)) / len(union)
+                ratios.append(ratio)
+        if ratios and (sum(ratios) / len(ratios)) >= threshold:
+            logging.getLogger("upload").info(f"Common column '{col}' has sufficient overlap: {sum(ratios)/len(ratios):.2f}")
+            return True
+    return False
+
+def generate_table_name(file_name: str) -> str:
+    return file_name.split('.')[0].replace(" ", "_").lower()
 
 def get_data_preview(df: pd.DataFrame, max_rows=10, max_columns=10) -> list:
     if df.shape[1] > max_columns:
         preview_df = df.iloc[:max_rows, :max_columns]
     else:
         preview_df = df.head(max_rows)
-    # Convert the DataFrame to a dict and clean any NaN values recursively.
-    preview = preview_df.to_dict(orient="records")
-    preview = clean_nan(preview)
-    return preview
+    # Records with NaN/NaT already replaced by None (see utils/serialization.py).
+    return frame_to_records(preview_df)
 
 def generate_detailed_overview_in_memory(table_names: list) -> str:
     overview_text_parts = []
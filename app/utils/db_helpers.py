@@ -1,15 +1,21 @@
 # app/utils/db_helpers.py
 import os
+import logging
 import pandas as pd
 import sqlalchemy
 from sqlalchemy import text
 from app.config import MYSQL_USER, MYSQL_PASSWORD, MYSQL_HOST, MYSQL_DATABASE
 from app.state import state
+from app.utils.memory_governor import table_schemas
+from app.utils.metrics import DB_SECONDS, span
+
+logger = logging.getLogger("db_helpers")
+logger.setLevel(logging.INFO)
 
 
 def refresh_tables(connection, table_names, original_table_names) -> None:
     if connection is None:
-        print("Cannot refresh tables: connection is None.")
+        logger.warning("Cannot refresh tables: connection is None.")
         return
     if hasattr(connection, "cursor"):
         engine = sqlalchemy.create_engine(
@@ -25,14 +31,15 @@ def refresh_tables(connection, table_names, original_table_names) -> None:
             for tbl in db_tables:
                 tbl_name = tbl[0]
                 try:
-                    df = pd.read_sql_query(f"SELECT * FROM `{tbl_name}`", conn)
+                    with span("db.load_table"), DB_SECONDS.time(engine="mysql"):
+                        df = pd.read_sql_query(f"SELECT * FROM `{tbl_name}`", conn)
                 except Exception as e:
-                    print(f"Error loading table '{tbl_name}': {e}")
+                    logger.error(f"Error loading table '{tbl_name}': {e}")
                     continue
-                if tbl_name not in [tn for tn, _ in table_names]:
+                if tbl_name not in [tn for tn, _ in table_schemas(table_names)]:
                     table_names.append((tbl_name, df))
                 else:
-                    idx = next(i for i, (name, _) in enumerate(table_names) if name == tbl_name)
+                    idx = next(i for i, (name, _) in enumerate(table_schemas(table_names)) if name == tbl_name)
                     table_names[idx] = (tbl_name, df)
     else:
         dialect_name = ""
@@ -45,14 +52,15 @@ def refresh_tables(connection, table_names, original_table_names) -> None:
             for tbl in db_tables:
                 tbl_name = tbl[0]
                 try:
-                    df = pd.read_sql_query(f"SELECT * FROM `{tbl_name}`", connection)
+                    with span("db.load_table"), DB_SECONDS.time(engine=dialect_name):
+                        df = pd.read_sql_query(f"SELECT * FROM `{tbl_name}`", connection)
                 except Exception as e:
-                    print(f"Error loading table '{tbl_name}': {e}")
+                    logger.error(f"Error loading table '{tbl_name}': {e}")
                     continue
-                if tbl_name not in [tn for tn, _ in table_names]:
+                if tbl_name not in [tn for tn, _ in table_schemas(table_names)]:
                     table_names.append((tbl_name, df))
                 else:
-                    idx = next(i for i, (name, _) in enumerate(table_names) if name == tbl_name)
+                    idx = next(i for i, (name, _) in enumerate(table_schemas(table_names)) if name == tbl_name)
                     table_names[idx] = (tbl_name, df)
         else:
             query = text(
@@ -65,14 +73,15 @@ def refresh_tables(connection, table_names, original_table_names) -> None:
             for tbl in db_tables:
                 tbl_name = tbl[0]
                 try:
-                    df = pd.read_sql_query(f"SELECT * FROM `{tbl_name}`", connection)
+                    with span("db.load_table"), DB_SECONDS.time(engine=dialect_name or "vertica"):
+                        df = pd.read_sql_query(f"SELECT * FROM `{tbl_name}`", connection)
                 except Exception as e:
-                    print(f"Error loading table '{tbl_name}': {e}")
+                    logger.error(f"Error loading table '{tbl_name}': {e}")
                     continue
-                if tbl_name not in [tn for tn, _ in table_names]:
+                if tbl_name not in [tn for tn, _ in table_schemas(table_names)]:
                     table_names.append((tbl_name, df))
                 else:
-                    idx = next(i for i, (name, _) in enumerate(table_names) if name == tbl_name)
+                    idx = next(i for i, (name, _) in enumerate(table_schemas(table_names)) if name == tbl_name)
                     table_names[idx] = (tbl_name, df)
 
 
@@ -165,7 +174,7 @@ def list_tables(connection) -> list:
 
         else:
 
-            print("Unsupported connection type for listing tables.")
+            logger.warning("Unsupported connection type for listing tables.")
 
             return []
 
@@ -173,7 +182,7 @@ def list_tables(connection) -> list:
 
     except Exception as e:
 
-        print(f"Error listing tables: {e}")
+        logger.error(f"Error listing tables: {e}")
 
         return []
 
@@ -192,11 +201,11 @@ def get_personal_engine(db_type: str, host: str, user: str, password: str, datab
             port = port or 5432
             engine_url = f"{db_type}://{user}:{password}@{host}:{port}/{database}"
         engine = sqlalchemy.create_engine(engine_url)
-        with engine.connect() as connection:
-            print(f"Connected to {db_type.upper()} database successfully!")
+        with span("db.connect"), engine.connect() as connection:
+            logger.info(f"Connected to {db_type.upper()} database successfully!")
         return engine
     except Exception as e:
-        print(f"Error connecting to {db_type} DB: {e}")
+        logger.error(f"Error connecting to {db_type} DB: {e}")
         return None
 
 def connect_personal_db(db_type: str, host: str, user: str, password: str, database: str, port: int = None):
@@ -212,15 +221,17 @@ def load_tables_from_personal_db(engine, table_list: list) -> tuple:
                 query = f"SELECT * FROM {tbl}"
             else:
                 query = f"SELECT * FROM `{tbl}`"
-            df = pd.read_sql_query(query, con=engine)
+            with span("db.load_table"), DB_SECONDS.time(engine=dialect or "unknown"):
+                df = pd.read_sql_query(query, con=engine)
             df.columns = [col.strip().replace(" ", "_").lower() for col in df.columns]
             original_df = df.copy()
             from app.utils.cleaning import clean_data
-            df = clean_data(df)
+            with span("db.clean_table"):
+                df = clean_data(df)
             loaded_tables.append((tbl, df))
             original_tables.append((tbl, original_df))
         except Exception as e:
-            print(f"Error loading table '{tbl}': {e}")
+            logger.error(f"Error loading table '{tbl}': {e}")
     return loaded_tables, original_tables
 
 def disconnect_database():
@@ -228,16 +239,18 @@ def disconnect_database():
     if state.get("personal_engine"):
         try:
             state["personal_engine"].dispose()
-            print("Personal database disconnected.")
+            logger.info("Personal database disconnected.")
         except Exception as e:
-            print(f"Error disconnecting personal database: {e}")
+            logger.error(f"Error disconnecting personal database: {e}")
         state["personal_engine"] = None
+    state["personal_db"] = None
     if state.get("mysql_connection"):
         try:
             state["mysql_connection"].close()
-            print("MySQL connection disconnected.")
+            logger.info("MySQL connection disconnected.")
         except Exception as e:
-            print(f"Error disconnecting MySQL connection: {e}")
+            logger.error(f"Error disconnecting MySQL connection: {e}")
         state["mysql_connection"] = None
     state["table_names"] = []
-    state["original_table_names"] = []
\ No newline at end of file
+    state["original_table_names"] = []
+    state["source"] = "file"
\ No newline at end of file
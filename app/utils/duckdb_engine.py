@@ -0,0 +1,118 @@
+# app/utils/duckdb_engine.py
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from app.config import DUCKDB_QUERY_WORKERS, DUCKDB_THREADS
+from app.state import state
+from app.utils.memory_governor import TableRef
+from app.utils.metrics import DB_SECONDS
+from app.utils.sql_helpers import paginate_sql
+
+logger = logging.getLogger("duckdb_engine")
+logger.setLevel(logging.INFO)
+
+# Bounded pool shared by all sessions, so a burst of chart/query requests cannot
+# start more concurrent duckdb queries than the process can handle.
+_query_pool = ThreadPoolExecutor(max_workers=DUCKDB_QUERY_WORKERS, thread_name_prefix="duckdb-query")
+_sessions_lock = threading.Lock()
+
+
+def _quote(identifier: str) -> str:
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+class DuckDBSession:
+    """
+    A long-lived in-memory duckdb connection holding one session's tables as views.
+
+    Views are registered once and only re-registered when the DataFrame behind a
+    table name changes, so repeated queries skip all setup work. Tables the memory
+    governor spilled to disk are queried straight from their Parquet file instead
+    of being loaded back into memory.
+    """
+    def __init__(self):
+        import duckdb  # Imported on first use to keep app startup fast.
+        self._con = duckdb.connect(database=":memory:")
+        if DUCKDB_THREADS:
+            self._con.execute(f"SET threads TO {int(DUCKDB_THREADS)}")
+        self._lock = threading.Lock()
+        self._registered = {}  # table_name -> (table, Parquet path or None) currently behind the view
+
+    def _drop(self, name: str) -> None:
+        _, path = self._registered.pop(name)
+        if path is None:
+            self._con.unregister(name)
+        else:
+            self._con.execute(f"DROP VIEW IF EXISTS {_quote(name)}")
+
+    def sync_tables(self, table_names: list) -> None:
+        """Accepts (table_name, DataFrame) pairs or the TableRefs of table_schemas()."""
+        current = dict(table_names)
+        for name in list(self._registered):
+            if name not in current:
+                self._drop(name)
+        for name, table in current.items():
+            path = table.path if isinstance(table, TableRef) and table.spilled else None
+            registered = self._registered.get(name)
+            if registered is not None and registered[0] is table and registered[1] == path:
+                continue
+            if registered is not None:
+                self._drop(name)
+            if path is not None:
+                source = path.replace("'", "''")
+                self._con.execute(f"CREATE VIEW {_quote(name)} AS SELECT * FROM read_parquet('{source}')")
+                logger.info(f"Registered duckdb view for spilled table '{name}' on {path}.")
+            else:
+                df = table.get() if isinstance(table, TableRef) else table
+                self._con.register(name, df)
+                logger.info(f"Registered duckdb view for table '{name}' ({len(df)} rows).")
+            self._registered[name] = (table, path)
+
+    def execute(self, sql_query: str, table_names: list, limit: int = None, offset: int = 0, arrow: bool = False):
+        # A duckdb connection is not safe for concurrent use; queries of one session run one at a time.
+        with self._lock:
+            self.sync_tables(table_names)
+            sql_query = sql_query.strip().rstrip(";")
+            if limit is not None:
+                sql_query = paginate_sql(sql_query, limit, offset, dialect="duckdb").rstrip(";")
+            with DB_SECONDS.time(engine="duckdb"):
+                result = self._con.execute(sql_query)
+                return result.fetch_arrow_table() if arrow else result.df()
+
+    def close(self) -> None:
+        with self._lock:
+            self._con.close()
+            self._registered.clear()
+
+
+def get_duckdb_session(session_state) -> DuckDBSession:
+    """Return the session's duckdb connection, creating it on first use."""
+    with _sessions_lock:
+        session = session_state.get("duckdb_session")
+        if session is None:
+            session = DuckDBSession()
+            session_state["duckdb_session"] = session
+        return session
+
+
+def execute_duckdb_query(sql_query: str, table_names: list, limit: int = None, offset: int = 0, arrow: bool = False):
+    """
+    Run a query in-process with duckdb against the session's DataFrames.
+
+    The frames are exposed as views on the session's persistent connection, so nothing
+    is copied or sent over the network. Use this for uploaded (file-based) tables;
+    personal databases still go through execute_sql_query with their own connection.
+
+    Args:
+        sql_query (str): SQL in duckdb syntax (see validate_sql_query with dialect="duckdb").
+        table_names (list): List of (table_name, DataFrame) tuples to expose to the query;
+            pass table_schemas(...) so spilled tables are read from disk by duckdb.
+        limit (int): Optional page size; LIMIT/OFFSET are pushed into the query.
+        offset (int): Number of rows to skip when limit is given.
+        arrow (bool): Return duckdb's Arrow table as is, skipping the pandas conversion.
+
+    Returns:
+        pd.DataFrame: The query result (a pyarrow.Table when arrow is True).
+    """
+    session = get_duckdb_session(state)
+    return _query_pool.submit(session.execute, sql_query, table_names, limit, offset, arrow).result()
@@ -0,0 +1,111 @@
+# app/utils/executors.py
+import asyncio
+import contextvars
+import functools
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from app.config import CPU_POOL_WORKERS, CPU_POOL_QUEUE, IO_POOL_WORKERS, IO_POOL_QUEUE
+
+logger = logging.getLogger("executors")
+logger.setLevel(logging.INFO)
+
+
+class ExecutorBusyError(RuntimeError):
+    """Raised when a pool already has as many tasks running and queued as it accepts."""
+
+
+class BoundedExecutor:
+    """
+    An executor that accepts at most max_workers + queue_size tasks at a time and
+    rejects the rest immediately, so a burst of uploads fails fast instead of piling
+    up unbounded work (and memory) behind the workers. The pool is created on first use.
+    """
+    def __init__(self, name: str, factory, max_workers: int, queue_size: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.queue_size = queue_size
+        self._factory = factory
+        self._executor = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_workers + queue_size)
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = self._factory(self.max_workers)
+                logger.info(f"Started {self.name} pool with {self.max_workers} workers (queue {self.queue_size}).")
+            return self._executor
+
+    def submit(self, fn, *args, **kwargs):
+        if not self._slots.acquire(blocking=False):
+            raise ExecutorBusyError(f"The {self.name} pool is busy; please retry shortly.")
+        try:
+            future = self._get_executor().submit(fn, *args, **kwargs)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def reset(self) -> None:
+        """Replace a broken pool (e.g. a worker process was killed)."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+
+def _process_pool(max_workers: int) -> ProcessPoolExecutor:
+    # "spawn" avoids forking a process that already runs the server's threads.
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def _thread_pool(prefix: str):
+    return lambda max_workers: ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=prefix)
+
+
+io_pool = BoundedExecutor("io", _thread_pool("io"), IO_POOL_WORKERS, IO_POOL_QUEUE)
+# CPU_POOL_WORKERS=0 runs CPU work on threads instead (e.g. where processes cannot be spawned).
+cpu_pool = (
+    BoundedExecutor("cpu", _process_pool, CPU_POOL_WORKERS, CPU_POOL_QUEUE)
+    if CPU_POOL_WORKERS > 0
+    else BoundedExecutor("cpu", _thread_pool("cpu"), IO_POOL_WORKERS, CPU_POOL_QUEUE)
+)
+
+
+async def run_io(fn, *args, **kwargs):
+    """
+    Run blocking I/O (database calls, LLM calls, to_sql) on the I/O thread pool.
+    The caller's context variables (session state, LLM user) are carried over.
+    """
+    context = contextvars.copy_context()
+    call = functools.partial(context.run, fn, *args, **kwargs)
+    return await asyncio.wrap_future(io_pool.submit(call))
+
+
+async def run_cpu(fn, *args, **kwargs):
+    """
+    Run CPU-heavy pandas work (parsing, validation, cleaning) in the process pool so it
+    neither blocks the event loop nor holds the GIL. fn and its arguments must be
+    picklable: module-level functions taking and returning plain data and DataFrames.
+    """
+    try:
+        return await asyncio.wrap_future(cpu_pool.submit(fn, *args, **kwargs))
+    except BrokenProcessPool:
+        logger.warning("CPU pool broke; restarting it and retrying once.")
+        cpu_pool.reset()
+        return await asyncio.wrap_future(cpu_pool.submit(fn, *args, **kwargs))
+
+
+def shutdown_executors() -> None:
+    cpu_pool.shutdown(wait=False)
+    io_pool.shutdown(wait=False)
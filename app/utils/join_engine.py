@@ -0,0 +1,253 @@
+# app/utils/join_engine.py
+import logging
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger("join_engine")
+logger.setLevel(logging.INFO)
+
+# Accepted join_type spellings -> pandas merge "how".
+JOIN_TYPES = {
+    "INNER": "inner",
+    "INNER JOIN": "inner",
+    "JOIN": "inner",
+    "LEFT": "left",
+    "LEFT JOIN": "left",
+    "LEFT OUTER JOIN": "left",
+    "RIGHT": "right",
+    "RIGHT JOIN": "right",
+    "RIGHT OUTER JOIN": "right",
+    "FULL": "outer",
+    "FULL JOIN": "outer",
+    "FULL OUTER JOIN": "outer",
+    "OUTER": "outer",
+}
+SQL_JOINS = {"inner": "INNER JOIN", "left": "LEFT JOIN", "right": "RIGHT JOIN", "outer": "FULL OUTER JOIN"}
+
+
+class JoinSizeError(ValueError):
+    """Raised when a join would produce more rows than allowed."""
+    def __init__(self, estimated_rows: int, max_rows: int):
+        self.estimated_rows = estimated_rows
+        self.max_rows = max_rows
+        super().__init__(
+            f"The join would return {estimated_rows} rows, more than the limit of {max_rows}. "
+            "Choose a more selective key, filter the tables first or request a sample."
+        )
+
+
+def normalize_join_type(join_type: str) -> str:
+    how = JOIN_TYPES.get(" ".join((join_type or "INNER").upper().split()))
+    if how is None:
+        raise ValueError(f"Unsupported join type '{join_type}'. Use INNER, LEFT, RIGHT or FULL OUTER JOIN.")
+    return how
+
+
+def _key_counts(keys: pd.Series) -> pd.Series:
+    # SQL semantics: NULL keys never match.
+    return keys.value_counts(dropna=True)
+
+
+def match_counts(left_keys: pd.Series, right_keys: pd.Series) -> np.ndarray:
+    """Number of right rows each left row joins with (0 for NULL or unmatched keys)."""
+    counts = left_keys.map(_key_counts(right_keys))
+    return counts.fillna(0).to_numpy(dtype="int64")
+
+
+def estimate_join_size(left_keys: pd.Series, right_keys: pd.Series, how: str) -> dict:
+    """
+    Exact output row count of an equi-join, computed from the key frequencies alone
+    (sum over shared keys of left count x right count) without materializing the join.
+    """
+    left_counts = _key_counts(left_keys)
+    right_counts = _key_counts(right_keys)
+    shared = left_counts.index.intersection(right_counts.index)
+    matched = int((left_counts[shared].astype("int64") * right_counts[shared].astype("int64")).sum())
+    left_unmatched = len(left_keys) - int(left_counts[shared].sum())
+    right_unmatched = len(right_keys) - int(right_counts[shared].sum())
+    rows = matched
+    if how in ("left", "outer"):
+        rows += left_unmatched
+    if how in ("right", "outer"):
+        rows += right_unmatched
+    return {
+        "estimated_rows": rows,
+        "matched_rows": matched,
+        "left_unmatched_rows": left_unmatched,
+        "right_unmatched_rows": right_unmatched,
+    }
+
+
+def resolve_columns(columns: list, table1: str, df1: pd.DataFrame, table2: str, df2: pd.DataFrame) -> tuple:
+    """
+    Split the requested projection into the columns needed from each table.
+    Entries are "table.column" or a bare column name (which must be unambiguous).
+    None or ["*"] selects everything. Returns ([(table, column)], left columns, right columns).
+    """
+    if not columns or columns == ["*"]:
+        selected = [(table1, col) for col in df1.columns] + [(table2, col) for col in df2.columns]
+    else:
+        selected = []
+        for entry in columns:
+            table, _, column = entry.rpartition(".")
+            if table in (table1, table2):
+                frame = df1 if table == table1 else df2
+                if column not in frame.columns:
+                    raise ValueError(f"Column '{column}' not found in table '{table}'.")
+                selected.append((table, column))
+                continue
+            owners = [t for t, frame in ((table1, df1), (table2, df2)) if entry in frame.columns]
+            if not owners:
+                raise ValueError(f"Column '{entry}' not found in '{table1}' or '{table2}'.")
+            if len(owners) > 1:
+                raise ValueError(f"Column '{entry}' exists in both tables; qualify it as '<table>.{entry}'.")
+            selected.append((owners[0], entry))
+    left_cols = [col for table, col in selected if table == table1]
+    right_cols = [col for table, col in selected if table == table2]
+    return selected, left_cols, right_cols
+
+
+def output_names(selected: list) -> list:
+    """Bare column names, qualified as "table.column" only where two selected columns share a name."""
+    bare = [col for _, col in selected]
+    return [col if bare.count(col) == 1 else f"{table}.{col}" for table, col in selected]
+
+
+def _probe_page(left: pd.DataFrame, right: pd.DataFrame, left_on: str, right_on: str, keep_unmatched: bool, start: int, stop: int) -> pd.DataFrame:
+    """
+    Rows [start, stop) of left JOIN right (LEFT JOIN when keep_unmatched), in left order.
+
+    Each left row's output span is known from the key frequencies, so only the slice
+    of left rows that produces the page is hashed and probed against right.
+    """
+    counts = match_counts(left[left_on], right[right_on])
+    if keep_unmatched:
+        counts = np.maximum(counts, 1)
+    ends = np.cumsum(counts)
+    first = int(np.searchsorted(ends, start, side="right"))
+    last = int(np.searchsorted(ends, stop, side="left")) + 1
+    chunk = left.iloc[first:last]
+    skip = start - (int(ends[first - 1]) if first > 0 else 0)
+    # Dropping NULL keys on the build side gives SQL semantics: pandas would match NULL with NULL.
+    joined = chunk.merge(right[right[right_on].notna()], how="left" if keep_unmatched else "inner",
+                         left_on=left_on, right_on=right_on, sort=False)
+    return joined.iloc[skip:skip + (stop - start)].reset_index(drop=True)
+
+
+def hash_join(
+    table1: str,
+    df1: pd.DataFrame,
+    table2: str,
+    df2: pd.DataFrame,
+    join_column1: str,
+    join_column2: str,
+    join_type: str = "INNER JOIN",
+    columns: list = None,
+    limit: int = None,
+    offset: int = 0,
+    max_rows: int = None,
+    sample: bool = False,
+    seed: int = 0,
+) -> tuple:
+    """
+    Join two in-memory tables with a vectorized hash join and return one page of the result.
+
+    Only the projected columns (plus the keys) are carried through the join. The output
+    size is computed from the key frequencies first; if it exceeds max_rows the join is
+    refused with JoinSizeError, or, with sample=True, run on a random sample of the rows
+    that keeps the output near max_rows (and never above it).
+
+    Returns:
+        tuple: (page DataFrame, metadata dict with the row counts and sampling applied).
+    """
+    how = normalize_join_type(join_type)
+    if table1 == table2:
+        raise ValueError("Joining a table with itself is not supported.")
+    if join_column1 not in df1.columns:
+        raise ValueError(f"Join column '{join_column1}' not found in table '{table1}'.")
+    if join_column2 not in df2.columns:
+        raise ValueError(f"Join column '{join_column2}' not found in table '{table2}'.")
+    selected, left_cols, right_cols = resolve_columns(columns, table1, df1, table2, df2)
+
+    estimate = estimate_join_size(df1[join_column1], df2[join_column2], how)
+    metadata = dict(estimate, join_type=how, sampled=False)
+    if max_rows is not None and estimate["estimated_rows"] > max_rows:
+        if not sample:
+            raise JoinSizeError(estimate["estimated_rows"], max_rows)
+        fraction = max_rows / estimate["estimated_rows"]
+        # FULL OUTER JOIN keeps the unmatched rows of both sides, so both are sampled.
+        df1 = df1.sample(frac=fraction, random_state=seed) if how != "right" else df1
+        df2 = df2.sample(frac=fraction, random_state=seed) if how in ("right", "outer") else df2
+        estimate = estimate_join_size(df1[join_column1], df2[join_column2], how)
+        # A random sample can still land slightly above the limit; the excess is cut off.
+        estimate["estimated_rows"] = min(estimate["estimated_rows"], max_rows)
+        metadata.update(sampled=True, sample_fraction=round(fraction, 6), sampled_rows=estimate["estimated_rows"])
+        logger.info(f"Join of '{table1}' and '{table2}' sampled at {fraction:.4%} ({metadata['estimated_rows']} rows estimated).")
+
+    # Projection pushdown: qualify every carried column so names never collide in the merge.
+    left = df1[list(dict.fromkeys(left_cols + [join_column1]))].add_prefix(f"{table1}.")
+    right = df2[list(dict.fromkeys(right_cols + [join_column2]))].add_prefix(f"{table2}.")
+    left_on, right_on = f"{table1}.{join_column1}", f"{table2}.{join_column2}"
+
+    total = estimate["estimated_rows"]
+    start = min(offset, total)
+    stop = total if limit is None else min(start + limit, total)
+    if how == "right":
+        page = _probe_page(right, left, right_on, left_on, True, start, stop)
+    else:
+        left_rows = estimate["matched_rows"] + (estimate["left_unmatched_rows"] if how != "inner" else 0)
+        parts = []
+        if start < left_rows:
+            parts.append(_probe_page(left, right, left_on, right_on, how != "inner", start, min(stop, left_rows)))
+        if how == "outer" and stop > left_rows:
+            # FULL OUTER JOIN: the right rows without a partner follow the LEFT JOIN part.
+            unmatched = right[match_counts(right[right_on], left[left_on]) == 0]
+            parts.append(unmatched.iloc[max(start - left_rows, 0):stop - left_rows])
+        page = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame()
+
+    page = page.reindex(columns=[f"{table}.{col}" for table, col in selected])
+    page.columns = output_names(selected)
+    metadata.update(total_rows=total, returned_rows=len(page), offset=offset, has_more=stop < total)
+    return page, metadata
+
+
+def quote_identifier(name: str, dialect: str = None) -> str:
+    if (dialect or "mysql") in ("mysql", "mariadb"):
+        return "`" + name.replace("`", "``") + "`"
+    return '"' + name.replace('"', '""') + '"'
+
+
+def build_join_sql(
+    table1: str,
+    table2: str,
+    join_column1: str,
+    join_column2: str,
+    join_type: str,
+    selected: list,
+    dialect: str = None,
+) -> str:
+    """
+    The projected join as SQL for a database connection, quoted for its dialect.
+    Duplicate output names are aliased like the in-memory result. The rows are ordered
+    by the join keys and then the projected columns, so that pages cut by paginate_sql
+    are stable across requests.
+    """
+    how = normalize_join_type(join_type)
+    if how == "outer" and (dialect or "mysql") in ("mysql", "mariadb"):
+        raise ValueError("MySQL does not support FULL OUTER JOIN; use LEFT or RIGHT JOIN.")
+
+    def q(name):
+        return quote_identifier(name, dialect)
+
+    projection = ", ".join(
+        f"{q(table)}.{q(col)}" + (f" AS {q(name)}" if name != col else "")
+        for (table, col), name in zip(selected, output_names(selected))
+    )
+    order_by = ", ".join(
+        f"{q(table)}.{q(col)}"
+        for table, col in dict.fromkeys([(table1, join_column1), (table2, join_column2)] + list(selected))
+    )
+    return (
+        f"SELECT {projection} FROM {q(table1)} {SQL_JOINS[how]} {q(table2)} "
+        f"ON {q(table1)}.{q(join_column1)} = {q(table2)}.{q(join_column2)} ORDER BY {order_by};"
+    )
@@ -0,0 +1,237 @@
+# app/utils/join_sketches.py
+import itertools
+import weakref
+import numpy as np
+import pandas as pd
+from app.utils.memory_governor import as_frame, table_schemas
+
+# HyperLogLog precision: 2**12 registers, ~1.6% standard error on distinct counts.
+HLL_PRECISION = 12
+# Size of the bottom-k MinHash sample of distinct values kept per column.
+MINHASH_SIZE = 256
+# Uniqueness (distinct / non-null rows) from which a column is treated as a key.
+KEY_UNIQUENESS = 0.95
+
+_HASH_BITS = 64
+_MAX_HASH = 2 ** _HASH_BITS
+
+
+def hash_values(series: pd.Series) -> np.ndarray:
+    """
+    64-bit hashes of the non-null values, normalized so that values which compare
+    equal in a join hash equally across tables (1 == 1.0, " x" == "x").
+    """
+    values = series.dropna()
+    if pd.api.types.is_bool_dtype(values):
+        values = values.astype("int64")
+    if pd.api.types.is_numeric_dtype(values):
+        values = values.astype("float64")
+    elif pd.api.types.is_datetime64_any_dtype(values):
+        values = values.astype("int64")
+    else:
+        values = values.astype(str).str.strip()
+    return pd.util.hash_pandas_object(values, index=False).to_numpy(dtype="uint64")
+
+
+def hll_registers(hashes: np.ndarray, precision: int = HLL_PRECISION) -> np.ndarray:
+    """HyperLogLog registers: per bucket, the maximum position of the first set bit."""
+    registers = np.zeros(2 ** precision, dtype="uint8")
+    if hashes.size == 0:
+        return registers
+    width = _HASH_BITS - precision
+    buckets = (hashes >> np.uint64(width)).astype("int64")
+    rest = hashes & np.uint64((1 << width) - 1)
+    # rest < 2**52, so float64 log2 gives the exact bit length.
+    bit_length = np.where(rest > 0, np.floor(np.log2(np.maximum(rest, 1).astype("float64"))) + 1, 0)
+    ranks = (width - bit_length + 1).astype("uint8")
+    np.maximum.at(registers, buckets, ranks)
+    return registers
+
+
+def hll_estimate(registers: np.ndarray) -> float:
+    m = registers.size
+    alpha = 0.7213 / (1 + 1.079 / m)
+    estimate = alpha * m * m / np.sum(np.exp2(-registers.astype("float64")))
+    zeros = int(np.count_nonzero(registers == 0))
+    if estimate <= 2.5 * m and zeros:
+        # Small-range correction (linear counting).
+        estimate = m * np.log(m / zeros)
+    return float(estimate)
+
+
+def bottom_k(hashes: np.ndarray, distinct_estimate: float, k: int = MINHASH_SIZE) -> dict:
+    """
+    Bottom-k MinHash sample: the k smallest distinct hashes with their row counts.
+
+    Only hashes under a threshold are considered, starting from the one expected to
+    admit about 2k distinct values, so the work is one vectorized pass over the column.
+    """
+    if hashes.size == 0:
+        return {"hashes": np.empty(0, dtype="uint64"), "counts": np.empty(0, dtype="int64")}
+    fraction = min(2.0 * k / max(distinct_estimate, 1.0), 1.0)
+    while True:
+        candidates = hashes if fraction >= 1.0 else hashes[hashes < np.uint64(min(int(fraction * _MAX_HASH), _MAX_HASH - 1))]
+        sample, counts = np.unique(candidates, return_counts=True)
+        if sample.size >= k or fraction >= 1.0:
+            break
+        fraction = min(fraction * 4, 1.0)
+    return {"hashes": sample[:k], "counts": counts[:k].astype("int64")}
+
+
+def build_column_sketch(series: pd.Series) -> dict:
+    hashes = hash_values(series)
+    registers = hll_registers(hashes)
+    distinct = min(hll_estimate(registers), float(hashes.size))
+    sample = bottom_k(hashes, distinct)
+    if sample["hashes"].size < MINHASH_SIZE:
+        # The sample holds every distinct value: the count is exact.
+        distinct = float(sample["hashes"].size)
+    if pd.api.types.is_numeric_dtype(series):
+        kind = "numeric"
+    elif pd.api.types.is_datetime64_any_dtype(series):
+        kind = "datetime"
+    else:
+        kind = "text"
+    return {
+        "rows": int(hashes.size),
+        "distinct": distinct,
+        "registers": registers,
+        "minhash": sample,
+        "kind": kind,
+    }
+
+
+def is_candidate_key_column(series: pd.Series) -> bool:
+    """Columns that can plausibly be join keys: not boolean and not fractional floats."""
+    if pd.api.types.is_bool_dtype(series):
+        return False
+    if pd.api.types.is_float_dtype(series):
+        values = series.dropna()
+        return not values.empty and bool((values == np.floor(values)).all())
+    return True
+
+
+def build_table_sketches(df: pd.DataFrame) -> dict:
+    return {
+        # Compared with `is`: id() of a replaced table can be reused by its successor.
+        "table": weakref.ref(df),
+        "row_count": len(df),
+        "columns": {col: build_column_sketch(df[col]) for col in df.columns if is_candidate_key_column(df[col])},
+    }
+
+
+def refresh_join_sketches(table_names: list, sketches: dict) -> None:
+    """Sketch each table once; tables whose DataFrame changed are sketched again."""
+    current = dict(table_schemas(table_names))
+    for name in list(sketches):
+        if name not in current:
+            del sketches[name]
+    for name, table in current.items():
+        cached = sketches.get(name)
+        if cached is None or cached["table"]() is not table or cached["row_count"] != len(table):
+            sketches[name] = build_table_sketches(as_frame(table))
+            sketches[name]["table"] = weakref.ref(table)
+
+
+def estimate_overlap(a: dict, b: dict) -> dict:
+    """
+    Estimate |A ∩ B| of two columns' distinct values and the containment of each in
+    the other, from the MinHash samples (Jaccard) and the merged HLL (union size).
+    """
+    union_registers = np.maximum(a["registers"], b["registers"])
+    union = max(hll_estimate(union_registers), a["distinct"], b["distinct"])
+    ha, hb = a["minhash"]["hashes"], b["minhash"]["hashes"]
+    k = min(MINHASH_SIZE, ha.size + hb.size)
+    union_sample = np.union1d(ha, hb)[:k]
+    if union_sample.size == 0:
+        return {"intersection": 0.0, "containment_a": 0.0, "containment_b": 0.0, "shared_sample": union_sample}
+    in_a = np.isin(union_sample, ha)
+    in_b = np.isin(union_sample, hb)
+    jaccard = float(np.mean(in_a & in_b))
+    intersection = min(jaccard * union, a["distinct"], b["distinct"])
+    return {
+        "intersection": intersection,
+        "containment_a": intersection / a["distinct"] if a["distinct"] else 0.0,
+        "containment_b": intersection / b["distinct"] if b["distinct"] else 0.0,
+        "shared_sample": union_sample[in_a & in_b],
+    }
+
+
+def predict_join_rows(a: dict, b: dict, overlap: dict) -> int:
+    """
+    Predicted INNER JOIN size: the shared distinct keys times the average product of
+    their row counts, measured on the shared keys in the MinHash samples (which are a
+    uniform sample of the distinct values). Falls back to average multiplicities.
+    """
+    shared = overlap["shared_sample"]
+    if overlap["intersection"] <= 0:
+        return 0
+    if shared.size:
+        count_a = a["minhash"]["counts"][np.searchsorted(a["minhash"]["hashes"], shared)]
+        count_b = b["minhash"]["counts"][np.searchsorted(b["minhash"]["hashes"], shared)]
+        per_key = float(np.mean(count_a * count_b))
+    else:
+        per_key = (a["rows"] / max(a["distinct"], 1.0)) * (b["rows"] / max(b["distinct"], 1.0))
+    return int(round(overlap["intersection"] * per_key))
+
+
+def relationship(a: dict, b: dict) -> str:
+    a_unique = a["distinct"] >= KEY_UNIQUENESS * max(a["rows"], 1)
+    b_unique = b["distinct"] >= KEY_UNIQUENESS * max(b["rows"], 1)
+    if a_unique and b_unique:
+        return "one-to-one"
+    if a_unique:
+        return "one-to-many"
+    if b_unique:
+        return "many-to-one"
+    return "many-to-many"
+
+
+def _name_match(table1: str, col1: str, table2: str, col2: str) -> bool:
+    c1, c2 = col1.lower(), col2.lower()
+    t1, t2 = table1.lower().rstrip("s"), table2.lower().rstrip("s")
+    return c1 == c2 or c1 in (f"{t2}_id", f"{t2}id") or c2 in (f"{t1}_id", f"{t1}id")
+
+
+def suggest_join_keys(sketches: dict, tables: list = None, min_containment: float = 0.5, top: int = 10) -> list:
+    """
+    Rank likely join key pairs across the sketched tables (only pairs that include
+    all of `tables` when given).
+
+    A pair qualifies when most distinct values of one column appear in the other
+    (containment >= min_containment). Pairs are ranked by containment, then by a key
+    (one-sided uniqueness) being involved, then by matching names.
+    """
+    suggestions = []
+    for table1, table2 in itertools.combinations(list(sketches), 2):
+        if tables and not set(tables) <= {table1, table2}:
+            continue
+        for (col1, a), (col2, b) in itertools.product(sketches[table1]["columns"].items(), sketches[table2]["columns"].items()):
+            if a["kind"] != b["kind"] or not a["rows"] or not b["rows"]:
+                continue
+            overlap = estimate_overlap(a, b)
+            containment = max(overlap["containment_a"], overlap["containment_b"])
+            if containment < min_containment:
+                continue
+            kind = relationship(a, b)
+            suggestions.append({
+                "table1": table1,
+                "join_column1": col1,
+                "table2": table2,
+                "join_column2": col2,
+                "containment": round(containment, 3),
+                # Fraction of column1's distinct values found in column2, and vice versa.
+                "containment1": round(overlap["containment_a"], 3),
+                "containment2": round(overlap["containment_b"], 3),
+                "distinct_values1": int(round(a["distinct"])),
+                "distinct_values2": int(round(b["distinct"])),
+                "shared_values": int(round(overlap["intersection"])),
+                "relationship": kind,
+                "predicted_inner_rows": predict_join_rows(a, b, overlap),
+                "name_match": _name_match(table1, col1, table2, col2),
+            })
+    suggestions.sort(
+        key=lambda s: (s["containment"] >= 0.9, s["relationship"] != "many-to-many", s["name_match"], s["containment"]),
+        reverse=True,
+    )
+    return suggestions[:top]
@@ -0,0 +1,302 @@
+# app/utils/llm_backends.py
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+logger = logging.getLogger("llm_backends")
+logger.setLevel(logging.INFO)
+
+
+class ReplayMissError(LookupError):
+    """Raised by ReplayBackend when no response was recorded for a prompt."""
+
+
+# Exception class names (google.api_core, httpx, requests, grpc) of failures that may
+# succeed when retried: timeouts, dropped connections, rate limits and server errors.
+TRANSIENT_ERROR_NAMES = {
+    "DeadlineExceeded", "ServiceUnavailable", "InternalServerError", "BadGateway", "GatewayTimeout",
+    "ResourceExhausted", "TooManyRequests",
+    "TimeoutException", "ConnectError", "ReadError", "RemoteProtocolError", "ReadTimeout", "ConnectTimeout",
+    "ConnectionError", "Timeout",
+}
+
+
+def is_transient_error(error: BaseException) -> bool:
+    """
+    Whether an LLM call that raised error is worth retrying: timeouts, connection
+    errors, HTTP 408/429 and 5xx. Authentication, invalid arguments and safety
+    blocks fail the same way every time. Wrapped errors (__cause__) are checked too.
+    """
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if isinstance(error, (TimeoutError, ConnectionError)):
+            return True
+        if any(cls.__name__ in TRANSIENT_ERROR_NAMES for cls in type(error).__mro__):
+            return True
+        status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+        if status is None and isinstance(getattr(error, "code", None), int):
+            status = error.code
+        if isinstance(status, int):
+            return status in (408, 429) or status >= 500
+        error = error.__cause__
+    return False
+
+
+def prompt_key(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+
+class LLMBackend:
+    """
+    Interface of a text completion backend behind the LLM gateway.
+    Implementations return the full completion from invoke(); astream() defaults
+    to yielding it in one chunk.
+    """
+    name = "base"
+
+    def invoke(self, prompt: str) -> str:
+        raise NotImplementedError
+
+    async def astream(self, prompt: str):
+        yield await asyncio.to_thread(self.invoke, prompt)
+
+
+class GeminiBackend(LLMBackend):
+    """The live Google Gemini model via langchain."""
+    name = "gemini"
+
+    def __init__(self, model: str, api_key: str):
+        from langchain_google_genai import GoogleGenerativeAI
+        self.client = GoogleGenerativeAI(model=model, api_key=api_key)
+
+    def invoke(self, prompt: str) -> str:
+        return self.client.invoke(prompt)
+
+    async def astream(self, prompt: str):
+        stream = self.client.astream(prompt)
+        try:
+            async for chunk in stream:
+                yield chunk
+        finally:
+            await stream.aclose()
+
+
+class ReplayBackend(LLMBackend):
+    """
+    Serves stored responses keyed by the SHA-256 of the prompt.
+
+    In record mode every miss is forwarded to the live backend and the answer is
+    written to the recordings file, so a session against Gemini can later be replayed
+    offline. In replay mode a miss goes to `fallback` if given, otherwise it raises
+    ReplayMissError.
+    """
+    name = "replay"
+
+    def __init__(self, path: str, live: LLMBackend = None, fallback: LLMBackend = None):
+        self.path = path
+        self.live = live
+        self.fallback = fallback
+        self._lock = threading.Lock()
+        self._responses = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self._responses = json.load(f)
+        logger.info(f"Loaded {len(self._responses)} recorded LLM responses from {path}.")
+
+    def _save(self) -> None:
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._responses, f, indent=1, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def invoke(self, prompt: str) -> str:
+        key = prompt_key(prompt)
+        with self._lock:
+            entry = self._responses.get(key)
+        if entry is not None:
+            return entry["response"]
+        if self.live is not None:
+            response = self.live.invoke(prompt)
+            with self._lock:
+                self._responses[key] = {"prompt": prompt[:200], "response": response}
+                self._save()
+            return response
+        if self.fallback is not None:
+            return self.fallback.invoke(prompt)
+        raise ReplayMissError(f"No recorded LLM response for prompt {key[:12]}.")
+
+
+class RuleBasedBackend(LLMBackend):
+    """
+    Deterministic stand-in for the model. It recognises the prompts built in
+    llm_helpers, sql_helpers and the routes, and answers with output of the expected
+    shape: classifications, "Final SQL Query:" blocks with valid SQL for the schema
+    in the prompt, and short canned texts for summaries. `latency` (seconds) is added
+    to every call, so load tests see model-like response times.
+    """
+    name = "stub"
+
+    AGGREGATES = [
+        (r"\b(average|avg|mean)\b", "AVG"),
+        (r"\b(total|sum)\b", "SUM"),
+        (r"\b(highest|maximum|max|largest)\b", "MAX"),
+        (r"\b(lowest|minimum|min|smallest)\b", "MIN"),
+    ]
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+
+    def invoke(self, prompt: str) -> str:
+        if self.latency:
+            time.sleep(self.latency)
+        return self._respond(prompt)
+
+    def _respond(self, prompt: str) -> str:
+        if "Respond with one of these words only" in prompt:
+            return self._classify(self._quoted_query(prompt))
+        if "Final Answer: <SQL or SUMMARY or ANALYSIS>" in prompt:
+            return f"Final Answer: {self._classify(self._field(prompt, 'User Query'))}"
+        if "**User Commands**:" in prompt:
+            commands = re.findall(r"^\d+\. ", prompt.split("**User Commands**:", 1)[1], flags=re.MULTILINE)
+            statement = self._noop_update(prompt)
+            return "\n".join(f"Final SQL Query {i}: {statement}" for i in range(1, len(commands) + 1))
+        if "data modification (INSERT, UPDATE, DELETE)" in prompt:
+            return f"Final SQL Query: {self._noop_update(prompt)}"
+        if "**Available Tables and Schema**" in prompt:
+            return f"Final SQL Query: {self._select(prompt)}"
+        if "You are a data quality expert" in prompt:
+            issues = [line.strip() for line in prompt.splitlines() if line.strip().startswith(("•", "- ", "Column:"))]
+            return "Data quality summary (offline stub):\n" + "\n".join(issues[:20])
+        match = re.search(r'for the column "([^"]+)" is (.+)\.\n', prompt)
+        if match:
+            return f"The {match.group(1).replace('_', ' ')} is {match.group(2)}."
+        if "Data Overview:" in prompt:
+            overview = prompt.split("Data Overview:", 1)[1].strip().splitlines()
+            return "Overview (offline stub):\n" + "\n".join(overview[:10])
+        return "OK"
+
+    async def astream(self, prompt: str):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        response = self._respond(prompt)
+        for chunk in re.findall(r"\S+\s*", response):
+            yield chunk
+
+    @staticmethod
+    def _classify(query: str) -> str:
+        query = query.lower()
+        if "summar" in query or "overview" in query:
+            return "SUMMARY"
+        if re.search(r"\b(analy[sz]e|analysis|insights?|trends?|recommend)", query):
+            return "ANALYSIS"
+        return "SQL"
+
+    @staticmethod
+    def _quoted_query(prompt: str) -> str:
+        match = re.search(r'"([^"]*)"', prompt)
+        return match.group(1) if match else ""
+
+    @staticmethod
+    def _field(prompt: str, label: str) -> str:
+        match = re.search(rf"\*?\*?{label}\*?\*?:\s*\"?(.*?)\"?\s*$", prompt, flags=re.MULTILINE)
+        return match.group(1) if match else ""
+
+    @staticmethod
+    def _schema(prompt: str) -> list:
+        """[(table, [columns])] parsed from the "Table: x, Columns: a, b" lines of the prompt."""
+        schema = []
+        for match in re.finditer(r"^Table: (.+?), Columns: (.*)$", prompt, flags=re.MULTILINE):
+            columns = [col.strip() for col in match.group(2).split(",") if col.strip()]
+            schema.append((match.group(1).strip(), columns))
+        return schema
+
+    @staticmethod
+    def _numeric_columns(table: str) -> set:
+        # Look up dtypes of the loaded frames when available, so SUM/AVG target numeric columns.
+        try:
+            from app.state import state
+            from app.utils.memory_governor import table_schemas
+            frames = dict(table_schemas(state.get("table_names", [])))
+        except Exception:
+            return set()
+        df = frames.get(table)
+        if df is None:
+            return set()
+        return {col for col, dtype in df.dtypes.items() if str(dtype).startswith(("int", "float", "Int", "Float"))}
+
+    def _noop_update(self, prompt: str) -> str:
+        # A valid modification that touches no rows, so benchmarks never change the data.
+        schema = self._schema(prompt)
+        if not schema or not schema[0][1]:
+            return "SELECT 1"
+        table, columns = schema[0]
+        return f"UPDATE `{table}` SET `{columns[0]}` = `{columns[0]}` WHERE 1 = 0"
+
+    def _select(self, prompt: str) -> str:
+        schema = self._schema(prompt)
+        if not schema:
+            return "SELECT 1"
+        query = self._field(prompt, "User Query").lower()
+
+        def mentioned(columns):
+            return [col for col in columns if col.lower() in query or col.lower().replace("_", " ") in query]
+
+        table, columns = max(schema, key=lambda item: (item[0].lower() in query, len(mentioned(item[1]))))
+        hits = mentioned(columns)
+        numeric = self._numeric_columns(table)
+        group_match = re.search(r"\b(?:by|per|each|for every)\s+([\w ]+)", query)
+        group_col = None
+        if group_match:
+            group_col = next((col for col in columns if group_match.group(1).startswith(col.lower().replace("_", " "))
+                              or group_match.group(1).startswith(col.lower())), None)
+        candidates = [col for col in hits if col != group_col]
+        measure = next((col for col in candidates if col in numeric), None) or (candidates[0] if candidates else None)
+
+        func = next((name for pattern, name in self.AGGREGATES if re.search(pattern, query)), None)
+        if re.search(r"\b(count|how many|number of)\b", query):
+            select = "COUNT(*) AS `count`"
+        elif func and measure and (not numeric or measure in numeric):
+            select = f"{func}(`{measure}`) AS `{func.lower()}_{measure}`"
+        else:
+            select = None
+
+        top_match = re.search(r"\btop\s+(\d+)", query)
+        if select and group_col and group_col != measure:
+            sql = f"SELECT `{group_col}`, {select} FROM `{table}` GROUP BY `{group_col}`"
+            if top_match:
+                sql += f" ORDER BY 2 DESC LIMIT {top_match.group(1)}"
+            return sql
+        if select:
+            return f"SELECT {select} FROM `{table}`"
+        projection = ", ".join(f"`{col}`" for col in hits) if hits else "*"
+        if top_match and measure:
+            return f"SELECT {projection} FROM `{table}` ORDER BY `{measure}` DESC LIMIT {top_match.group(1)}"
+        return f"SELECT {projection} FROM `{table}` LIMIT 100"
+
+
+def create_llm_backend(backend: str, model: str, api_key: str, replay_path: str, replay_fallback: str = "",
+                       stub_latency: float = 0.0) -> LLMBackend:
+    """
+    Build the configured backend:
+      - "gemini": the live model (default),
+      - "record": Gemini, with every response saved to replay_path,
+      - "replay": responses from replay_path only (offline),
+      - "stub": the rule-based RuleBasedBackend (offline), taking stub_latency seconds per call.
+    """
+    backend = (backend or "gemini").lower()
+    if backend == "stub":
+        return RuleBasedBackend(latency=stub_latency)
+    if backend == "replay":
+        fallback = RuleBasedBackend() if replay_fallback == "stub" else None
+        return ReplayBackend(replay_path, fallback=fallback)
+    if backend == "record":
+        return ReplayBackend(replay_path, live=GeminiBackend(model, api_key))
+    if backend == "gemini":
+        return GeminiBackend(model, api_key)
+    raise ValueError(f"Unknown LLM_BACKEND '{backend}'. Use gemini, record, replay or stub.")
@@ -0,0 +1,253 @@
+# app/utils/llm_gateway.py
+import asyncio
+import contextlib
+import contextvars
+import hashlib
+import logging
+import random
+import threading
+import time
+from concurrent.futures import Future
+from app.config import (
+    GOOGLE_API_KEY,
+    MODEL_NAME,
+    LLM_BACKEND,
+    LLM_REPLAY_PATH,
+    LLM_REPLAY_FALLBACK,
+    LLM_STUB_LATENCY_MS,
+    LLM_MAX_CONCURRENCY,
+    LLM_MAX_CONCURRENCY_PER_USER,
+    LLM_MAX_RETRIES,
+    LLM_BACKOFF_BASE,
+    LLM_BACKOFF_MAX,
+)
+from app.utils.llm_backends import create_llm_backend, is_transient_error
+from app.utils.metrics import LLM_SECONDS
+
+logger = logging.getLogger("llm_gateway")
+logger.setLevel(logging.INFO)
+
+# User on whose behalf LLM calls are made; set by endpoints that know the current user.
+_current_user = contextvars.ContextVar("llm_user", default=None)
+
+
+@contextlib.contextmanager
+def llm_user(user_id):
+    """Attribute the LLM calls made inside this block to user_id for per-user limiting."""
+    token = _current_user.set(user_id)
+    try:
+        yield
+    finally:
+        _current_user.reset(token)
+
+
+def estimate_tokens(text: str) -> int:
+    # Roughly four characters per token; counting exactly would cost an API call.
+    return max(len(text or "") // 4, 1)
+
+
+class LLMGateway:
+    """
+    Single entry point for all LLM calls in the app.
+
+    Wraps one shared backend (see llm_backends.py) and adds:
+      - a global and a per-user concurrency limit,
+      - single-flight coalescing: identical prompts already in flight share one call,
+      - retries with exponential backoff and full jitter,
+      - per-call latency and (estimated) token metrics.
+
+    It is a drop-in replacement for the langchain client: llm(prompt), llm.invoke(prompt)
+    and llm.astream(prompt) all work. The backend is built by client_factory on the
+    first call (or by warm_up()), so creating the gateway at import time is free.
+    """
+    def __init__(self, client_factory, max_concurrency: int, per_user_concurrency: int, max_retries: int,
+                 backoff_base: float, backoff_max: float):
+        self._client_factory = client_factory
+        self._client = None
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.per_user_concurrency = per_user_concurrency
+        self._global_slots = threading.BoundedSemaphore(max_concurrency)
+        self._user_slots = {}  # user_id -> [semaphore, calls holding or waiting for it]
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            "calls": 0,
+            "errors": 0,
+            "retries": 0,
+            "coalesced": 0,
+            "latency_seconds_total": 0.0,
+            "prompt_tokens_total": 0,
+            "completion_tokens_total": 0,
+        }
+
+    def __call__(self, prompt: str, user_id=None) -> str:
+        return self.invoke(prompt, user_id=user_id)
+ 
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._client_factory()
+                    logger.info(f"Using LLM backend '{self._client.name}'.")
+        return self._client
+ 
+    def warm_up(self) -> None:
+        """Build the backend ahead of the first request."""
+        self.client
+
+    @contextlib.contextmanager
+    def _slots_for(self, user_id):
+        """
+        The user's semaphore (None without a user) for the duration of one call. The
+        entry is dropped when no call holds or waits for it any more, so only users
+        with calls in progress are kept.
+        """
+        if user_id is None:
+            yield None
+            return
+        with self._lock:
+            entry = self._user_slots.get(user_id)
+            if entry is None:
+                entry = self._user_slots[user_id] = [threading.BoundedSemaphore(self.per_user_concurrency), 0]
+            entry[1] += 1
+        try:
+            yield entry[0]
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._user_slots[user_id]
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _record(self, prompt: str, response: str, elapsed: float, retries: int, failed: bool = False) -> None:
+        prompt_tokens = estimate_tokens(prompt)
+        completion_tokens = estimate_tokens(response) if response else 0
+        with self._lock:
+            self._stats["calls"] += 1
+            self._stats["retries"] += retries
+            self._stats["latency_seconds_total"] += elapsed
+            self._stats["prompt_tokens_total"] += prompt_tokens
+            self._stats["completion_tokens_total"] += completion_tokens
+            if failed:
+                self._stats["errors"] += 1
+        LLM_SECONDS.observe(elapsed, outcome="error" if failed else "ok")
+        logger.info(
+            f"LLM call {'failed' if failed else 'ok'} in {elapsed * 1000:.0f} ms "
+            f"(retries={retries}, ~{prompt_tokens} prompt tokens, ~{completion_tokens} completion tokens)"
+        )
+
+    def _call_with_limits(self, prompt: str, user_id) -> str:
+        with self._slots_for(user_id) as user_slots:
+            return self._call_with_retries(prompt, user_slots)
+
+    def _call_with_retries(self, prompt: str, user_slots) -> str:
+        start = time.perf_counter()
+        attempt = 0
+        while True:
+            try:
+                # Take the user's slot first so one user cannot hold global slots while waiting.
+                with (user_slots or contextlib.nullcontext()), self._global_slots:
+                    response = self.client.invoke(prompt)
+                self._record(prompt, response, time.perf_counter() - start, attempt)
+                return response
+            except Exception as e:
+                # Auth errors, invalid requests, safety blocks and missing recordings fail the same way again.
+                if attempt >= self.max_retries or not is_transient_error(e):
+                    self._record(prompt, None, time.perf_counter() - start, attempt, failed=True)
+                    raise
+                delay = self._backoff(attempt)
+                logger.warning(f"LLM call failed ({e}); retrying in {delay:.2f}s")
+                time.sleep(delay)
+                attempt += 1
+
+    def invoke(self, prompt: str, user_id=None) -> str:
+        if user_id is None:
+            user_id = _current_user.get()
+        key = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+            else:
+                self._stats["coalesced"] += 1
+        if not leader:
+            return future.result()
+        try:
+            response = self._call_with_limits(prompt, user_id)
+            future.set_result(response)
+            return response
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    async def astream(self, prompt: str, user_id=None):
+        """
+        Stream the completion chunk by chunk. Streams are not coalesced or retried
+        once tokens have been sent, but they do count against the concurrency limits.
+        """
+        if user_id is None:
+            user_id = _current_user.get()
+        with self._slots_for(user_id) as user_slots:
+            slots = [s for s in (user_slots, self._global_slots) if s is not None]
+            acquired = []
+            start = time.perf_counter()
+            chunks = []
+            failed = True
+            stream = None
+            try:
+                for slot in slots:
+                    # Poll instead of blocking a thread, so a cancelled request never grabs a slot late.
+                    while not slot.acquire(blocking=False):
+                        await asyncio.sleep(0.05)
+                    acquired.append(slot)
+                stream = self.client.astream(prompt)
+                async for chunk in stream:
+                    chunks.append(chunk)
+                    yield chunk
+                failed = False
+            finally:
+                if stream is not None:
+                    # Closing the client stream aborts the upstream request when the caller stops early.
+                    await stream.aclose()
+                for slot in reversed(acquired):
+                    slot.release()
+                self._record(prompt, "".join(chunks), time.perf_counter() - start, 0, failed=failed)
+
+    def stats(self) -> dict:
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["in_flight"] = len(self._inflight)
+        return snapshot
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_llm() -> LLMGateway:
+    """Return the process-wide LLM gateway; the configured backend is created on first use."""
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            _gateway = LLMGateway(
+                lambda: create_llm_backend(
+                    LLM_BACKEND, MODEL_NAME, GOOGLE_API_KEY, LLM_REPLAY_PATH, LLM_REPLAY_FALLBACK,
+                    stub_latency=LLM_STUB_LATENCY_MS / 1000,
+                ),
+                max_concurrency=LLM_MAX_CONCURRENCY,
+                per_user_concurrency=LLM_MAX_CONCURRENCY_PER_USER,
+                max_retries=LLM_MAX_RETRIES,
+                backoff_base=LLM_BACKOFF_BASE,
+                backoff_max=LLM_BACKOFF_MAX,
+            )
+        return _gateway
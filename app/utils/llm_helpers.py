@@ -1,13 +1,17 @@
 # app/utils/llm_helpers.py
-from langchain_google_genai import GoogleGenerativeAI
-from langchain_core.prompts import ChatPromptTemplate
+from typing import TYPE_CHECKING
 import logging
+import re
+ 
+if TYPE_CHECKING:
+    # Only needed for annotations; every helper receives the shared LLM gateway.
+    from app.utils.llm_gateway import LLMGateway
  
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
  
  
-def generate_data_issue_summary(errors: list, file_name: str, llm: GoogleGenerativeAI) -> str:
+def generate_data_issue_summary(errors: list, file_name: str, llm: "LLMGateway") -> str:
     prompt = f"""
 You are a data quality expert reviewing a file named "{file_name}". The analysis has detected several issues in the data, which are summarized below:
 {chr(10).join(errors)}
@@ -31,7 +35,7 @@ Now, generate the complete summary using the structure above.
     response = llm.invoke(prompt)
     return response
  
-def translate_natural_language_to_sql(user_query: str, schema_info: str, llm: GoogleGenerativeAI) -> str:
+def translate_natural_language_to_sql(user_query: str, schema_info: str, llm: "LLMGateway") -> str:
     template = f"""\
 You are an expert data assistant. Translate the user's natural language command into a valid SQL query for data modification (INSERT, UPDATE, DELETE).
  
@@ -57,13 +61,47 @@ Chain-of-thought explanation:
     sql_query = sql_query.strip()
     return sql_query
  
-def classify_user_query_llm(user_query: str, llm: GoogleGenerativeAI) -> str:
+def translate_commands_to_sql_batch(commands: list, schema_info: str, llm: "LLMGateway") -> list:
+    """
+    Translate several natural language modification commands with a single LLM call.
+ 
+    Returns:
+        list: One SQL statement per command, in the same order.
+    """
+    numbered = "\n".join(f"{i}. {command}" for i, command in enumerate(commands, start=1))
+    template = f"""\
+You are an expert data assistant. Translate each of the user's numbered natural language commands into one valid SQL statement for data modifications (INSERT, UPDATE, DELETE).
+ 
+Follow these steps:
+1. Interpret each command on its own and determine the intended modification.
+2. Validate the available schema and select the correct table and columns.
+3. Generate exactly one syntactically correct SQL statement per command.
+4. Finally, for every command output "Final SQL Query <number>:" on a new line followed by its query, in the order of the commands.
+ 
+**Available Tables and Schema**:
+{schema_info}
+ 
+**User Commands**:
+{numbered}
+ 
+Chain-of-thought explanation:
+"""
+    response = llm(template)
+    matches = re.findall(r"Final SQL Query (\d+):\s*(.*?)(?=\n\s*Final SQL Query \d+:|\Z)", response, flags=re.DOTALL)
+    queries = {int(number): query for number, query in matches}
+    missing = [i for i in range(1, len(commands) + 1) if not queries.get(i, "").strip()]
+    if missing:
+        raise ValueError(f"The model returned no SQL for command(s) {missing}.")
+    from app.utils.sql_helpers import clean_sql_query
+    return [clean_sql_query(queries[i]).strip() for i in range(1, len(commands) + 1)]
+ 
+def classify_user_query_llm(user_query: str, llm: "LLMGateway") -> str:
     """
     Classify the user's query using an LLM to determine if it is for SQL, SUMMARY, or ANALYSIS.
    
     Args:
         user_query (str): The original user query.
-        llm (GoogleGenerativeAI): The language model client.
+        llm (LLMGateway): The shared LLM gateway.
    
     Returns:
         str: The final classification ("SQL", "SUMMARY", or "ANALYSIS").
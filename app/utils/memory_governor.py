@@ -0,0 +1,279 @@
+# app/utils/memory_governor.py
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+import weakref
+import pandas as pd
+from app.config import MEMORY_BUDGET_MB, SPILL_DIR
+
+logger = logging.getLogger("memory_governor")
+logger.setLevel(logging.INFO)
+
+
+def frame_nbytes(df: pd.DataFrame) -> int:
+    """Deep memory use of a DataFrame, including the Python objects of object columns."""
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+def _remove_file(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class TableRef:
+    """
+    Handle to one session table. The DataFrame is either resident or spilled to a
+    Parquet file; get() returns it either way, reading it back (memory-mapped) when
+    needed. columns, dtypes and len() stay available without loading, so schema
+    lookups never bring a spilled table back into memory.
+
+    A TableList entry keeps its TableRef until the entry is replaced, so caches tied to
+    the ref (profiles, duckdb views, join sketches) survive spilling and reloading.
+    They hold it by reference or weakref and compare with `is`: the id() of a replaced
+    ref can be reused by the next one.
+    """
+    def __init__(self, governor, df: pd.DataFrame = None, path: str = None, owned: bool = True):
+        self._governor = governor
+        self._df = df
+        self._lock = threading.Lock()
+        self._finalizer = None
+        self.path = None
+        self.last_access = time.monotonic()
+        if df is not None:
+            self.nbytes = frame_nbytes(df)
+            self._columns, self._dtypes, self._rows = df.columns, df.dtypes, len(df)
+        else:
+            import pyarrow.parquet as pq
+            empty = pq.read_schema(path).empty_table().to_pandas()
+            self._columns, self._dtypes = empty.columns, empty.dtypes
+            self._rows = pq.read_metadata(path).num_rows
+            self.nbytes = 0
+            self._set_path(path, owned)
+
+    def _set_path(self, path: str, owned: bool) -> None:
+        # Spill files belong to this table and are deleted with it (or when replaced).
+        if self._finalizer is not None:
+            self._finalizer()
+        self.path = path
+        self._finalizer = weakref.finalize(self, _remove_file, path) if owned else None
+
+    @property
+    def spilled(self) -> bool:
+        return self._df is None
+
+    @property
+    def resident_bytes(self) -> int:
+        return 0 if self._df is None else self.nbytes
+
+    def __len__(self):
+        df = self._df
+        return len(df) if df is not None else self._rows
+
+    @property
+    def columns(self):
+        df = self._df
+        return df.columns if df is not None else self._columns
+
+    @property
+    def dtypes(self):
+        df = self._df
+        return df.dtypes if df is not None else self._dtypes
+
+    def get(self) -> pd.DataFrame:
+        self.last_access = time.monotonic()
+        df = self._df
+        if df is not None:
+            return df
+        with self._lock:
+            if self._df is None:
+                self._df = pd.read_parquet(self.path, memory_map=True)
+                self.nbytes = frame_nbytes(self._df)
+                logger.info(f"Reloaded spilled table from {self.path} ({self.nbytes / 2**20:.1f} MB).")
+            df = self._df
+        self._governor.enforce(keep=self)
+        return df
+
+    def spill(self, directory: str) -> int:
+        """Write the table to Parquet (once) and drop it from memory; returns the bytes freed."""
+        with self._lock:
+            df = self._df
+            if df is None:
+                return 0
+            # Always rewritten: the frame may have been changed in place since it was loaded.
+            path = os.path.join(directory, f"{uuid.uuid4().hex}.parquet")
+            try:
+                df.to_parquet(path, index=False)
+            except Exception:
+                _remove_file(path)
+                raise
+            self._set_path(path, owned=True)
+            self._columns, self._dtypes, self._rows = df.columns, df.dtypes, len(df)
+            self._df = None
+            return self.nbytes
+
+    def write_parquet(self, path: str) -> None:
+        """Store the table at path, copying the spill file instead of loading the table."""
+        if self._df is None:
+            import shutil
+            shutil.copyfile(self.path, path)
+        else:
+            self._df.to_parquet(path, index=False)
+
+
+class MemoryGovernor:
+    """
+    Keeps the resident size of all session tables in this process under a budget.
+
+    Every frame stored in a TableList is tracked. When the tracked frames exceed
+    budget_bytes, the least recently used ones are spilled to Parquet files in
+    spill_dir until the total fits again. Frames that cannot be written as Parquet
+    (e.g. mixed-type object columns) stay in memory.
+    """
+    def __init__(self, budget_bytes: int, spill_dir: str):
+        self.budget_bytes = budget_bytes
+        self.spill_dir = spill_dir
+        self._refs = weakref.WeakSet()
+        self._lock = threading.Lock()
+        self._spills = 0
+
+    def track(self, df: pd.DataFrame) -> TableRef:
+        ref = TableRef(self, df)
+        with self._lock:
+            self._refs.add(ref)
+        self.enforce(keep=ref)
+        return ref
+
+    def track_file(self, path: str, owned: bool = False) -> TableRef:
+        """A table that starts out on disk, e.g. a Parquet file of the shared state store."""
+        ref = TableRef(self, path=path, owned=owned)
+        with self._lock:
+            self._refs.add(ref)
+        return ref
+
+    def resident_bytes(self) -> int:
+        with self._lock:
+            return sum(ref.resident_bytes for ref in self._refs)
+
+    def enforce(self, keep: TableRef = None) -> None:
+        if not self.budget_bytes:
+            return
+        with self._lock:
+            resident = [ref for ref in self._refs if not ref.spilled]
+        total = sum(ref.nbytes for ref in resident)
+        if total <= self.budget_bytes:
+            return
+        os.makedirs(self.spill_dir, exist_ok=True)
+        for ref in sorted(resident, key=lambda r: r.last_access):
+            if total <= self.budget_bytes:
+                break
+            if ref is keep:
+                continue
+            try:
+                freed = ref.spill(self.spill_dir)
+            except Exception as e:
+                logger.warning(f"Could not spill a table to disk, keeping it in memory: {e}")
+                continue
+            total -= freed
+            self._spills += 1
+            logger.info(f"Spilled a table of {freed / 2**20:.1f} MB; {total / 2**20:.1f} MB resident.")
+
+    def stats(self) -> dict:
+        with self._lock:
+            refs = list(self._refs)
+        return {
+            "budget_bytes": self.budget_bytes,
+            "resident_bytes": sum(ref.resident_bytes for ref in refs),
+            "tables": len(refs),
+            "spilled_tables": sum(1 for ref in refs if ref.spilled),
+            "spills": self._spills,
+        }
+
+
+_governor = None
+_governor_lock = threading.Lock()
+
+
+def get_governor() -> MemoryGovernor:
+    global _governor
+    with _governor_lock:
+        if _governor is None:
+            spill_dir = SPILL_DIR or os.path.join(tempfile.gettempdir(), f"table-spill-{os.getpid()}")
+            _governor = MemoryGovernor(MEMORY_BUDGET_MB * 2**20, spill_dir)
+        return _governor
+
+
+class TableList(list):
+    """
+    The list of (table_name, DataFrame) tuples kept in the session state.
+
+    It behaves like the plain list it replaces (append, index assignment, iteration,
+    dict(...)), but stores TableRefs so the memory governor can spill frames; they
+    are loaded again when an entry is read. Use refs() where only the schema is needed.
+    """
+    def __init__(self, items=()):
+        super().__init__(self._wrap(item) for item in items)
+
+    @staticmethod
+    def _wrap(item):
+        name, df = item
+        return (name, df if isinstance(df, TableRef) else get_governor().track(df))
+
+    @staticmethod
+    def _unwrap(item):
+        name, ref = item
+        return (name, ref.get())
+
+    def refs(self) -> list:
+        """[(table_name, TableRef)] without loading any spilled table."""
+        return list(super().__iter__())
+
+    def __iter__(self):
+        for item in super().__iter__():
+            yield self._unwrap(item)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._unwrap(item) for item in super().__getitem__(index)]
+        return self._unwrap(super().__getitem__(index))
+
+    def __setitem__(self, index, item):
+        if isinstance(index, slice):
+            super().__setitem__(index, [self._wrap(i) for i in item])
+        else:
+            super().__setitem__(index, self._wrap(item))
+
+    def append(self, item):
+        super().append(self._wrap(item))
+
+    def extend(self, items):
+        super().extend(self._wrap(item) for item in items)
+
+    def insert(self, index, item):
+        super().insert(index, self._wrap(item))
+
+    def pop(self, index=-1):
+        return self._unwrap(super().pop(index))
+
+    def copy(self):
+        return TableList(self.refs())
+
+    def __repr__(self):
+        return f"TableList({[name for name, _ in self.refs()]})"
+
+
+def as_frame(table) -> pd.DataFrame:
+    """The DataFrame behind a table_schemas() entry (loading it if it was spilled)."""
+    return table.get() if isinstance(table, TableRef) else table
+
+
+def table_schemas(table_names: list) -> list:
+    """
+    (table_name, table) pairs for code that only reads .columns/.dtypes: the entries of
+    a TableList are returned as TableRefs, so spilled tables stay on disk.
+    """
+    return table_names.refs() if isinstance(table_names, TableList) else list(table_names)
@@ -0,0 +1,265 @@
+# app/utils/metrics.py
+import bisect
+import contextlib
+import contextvars
+import logging
+import math
+import threading
+import time
+
+logger = logging.getLogger("metrics")
+logger.setLevel(logging.INFO)
+
+# Content type of the Prometheus text exposition format served on /metrics.
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+ROW_BUCKETS = (0, 1, 10, 100, 1000, 10_000, 100_000, 1_000_000)
+BYTE_BUCKETS = (256, 1024, 4096, 16_384, 65_536, 262_144, 1_048_576, 4_194_304, 16_777_216, 67_108_864)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter, optionally split by labels: errors.inc(stage="execute")."""
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}  # label values -> count
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            return self._values.get(key, 0)
+
+    def snapshot(self) -> dict:
+        """{label values: count} of every label set counted so far."""
+        with self._lock:
+            return dict(self._values)
+
+    def render(self) -> list:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.labelnames, key)} {_number(value)}" for key, value in values]
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram in the Prometheus sense, optionally split by labels.
+    Observations cost a bisect and a lock; nothing is kept per observation.
+    """
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: tuple = LATENCY_BUCKETS, labelnames: tuple = ()):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self.labelnames = tuple(labelnames)
+        self._series = {}  # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        """Observe the duration of the with block (also when it raises)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def snapshot(self, **labels) -> dict:
+        """{"count", "sum", "buckets": {upper bound: cumulative count}} of one label set."""
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            series = list(self._series.get(key) or [0] * (len(self.buckets) + 1) + [0.0])
+        cumulative, buckets = 0, {}
+        for bound, count in zip(self.buckets + (math.inf,), series[:-1]):
+            cumulative += count
+            buckets[bound] = cumulative
+        return {"count": cumulative, "sum": series[-1], "buckets": buckets}
+
+    def render(self) -> list:
+        with self._lock:
+            series = sorted((key, list(values)) for key, values in self._series.items())
+        lines = []
+        for key, values in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), values[:-1]):
+                cumulative += count
+                bucket_label = _labels(self.labelnames, key, f'le="{_number(bound)}"')
+                lines.append(f"{self.name}_bucket{bucket_label} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(values[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """A value read at scrape time, e.g. resident table bytes from the memory governor."""
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, read):
+        self.name = name
+        self.help = help
+        self._read = read
+
+    def render(self) -> list:
+        try:
+            value = self._read()
+        except Exception as e:
+            logger.warning(f"Could not read gauge {self.name}: {e}")
+            return []
+        return [] if value is None else [f"{self.name} {_number(value)}"]
+
+
+class MetricsRegistry:
+    """The metrics of this worker, rendered together by /metrics."""
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if existing.kind != metric.kind:
+                    raise ValueError(f"Metric '{metric.name}' is already registered as a {existing.kind}.")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, help: str, labelnames: tuple = ()) -> Counter:
+        return self._register(Counter(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, buckets: tuple = LATENCY_BUCKETS, labelnames: tuple = ()) -> Histogram:
+        return self._register(Histogram(name, help, buckets, labelnames))
+
+    def gauge(self, name: str, help: str, read) -> Gauge:
+        """Register (or replace) a gauge whose value is read with read() at scrape time."""
+        gauge = Gauge(name, help, read)
+        with self._lock:
+            self._metrics[name] = gauge
+        return gauge
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+STAGE_SECONDS = registry.histogram(
+    "app_stage_duration_seconds", "Duration of request pipeline stages.", labelnames=("stage",)
+)
+STAGE_ERRORS = registry.counter(
+    "app_stage_errors_total", "Pipeline stages that raised.", labelnames=("stage",)
+)
+LLM_SECONDS = registry.histogram(
+    "app_llm_request_duration_seconds", "LLM call latency, including retries.", labelnames=("outcome",)
+)
+DB_SECONDS = registry.histogram(
+    "app_db_query_duration_seconds", "Database query latency by engine.", labelnames=("engine",)
+)
+RESULT_ROWS = registry.histogram(
+    "app_result_rows", "Rows returned per result.", buckets=ROW_BUCKETS, labelnames=("endpoint",)
+)
+PAYLOAD_BYTES = registry.histogram(
+    "app_response_payload_bytes", "Size of result payloads.", buckets=BYTE_BUCKETS, labelnames=("format",)
+)
+
+# (stage, seconds) of the spans finished in the current trace; None outside a trace.
+_trace_spans = contextvars.ContextVar("trace_spans", default=None)
+
+
+@contextlib.contextmanager
+def span(stage: str):
+    """
+    Time one pipeline stage: the duration goes into app_stage_duration_seconds{stage=...}
+    (and app_stage_errors_total when the block raises) and, inside trace(), into the
+    request's timing breakdown.
+
+        with span("query.generate_sql"):
+            sql_query, optimizations = generate_sql_query(...)
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        spans = _trace_spans.get()
+        if spans is not None:
+            spans.append((stage, elapsed))
+
+
+@contextlib.contextmanager
+def trace(name: str):
+    """
+    Span around a whole request that also logs the stages timed inside it, e.g.
+    "execute_query took 812 ms: query.classify=240 ms query.generate_sql=410 ms ...".
+    Spans in threads started with run_in_threadpool or run_io are included (they copy
+    the context); work in the process pool is not.
+    """
+    spans = []
+    token = _trace_spans.set(spans)
+    start = time.perf_counter()
+    try:
+        yield spans
+    except BaseException:
+        STAGE_ERRORS.inc(stage=name)
+        raise
+    finally:
+        _trace_spans.reset(token)
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=name)
+        stages = " ".join(f"{stage}={seconds * 1000:.0f} ms" for stage, seconds in spans)
+        logger.info(f"{name} took {elapsed * 1000:.0f} ms" + (f": {stages}" if stages else ""))
+
+
+def render_metrics() -> str:
+    return registry.render()
@@ -0,0 +1,254 @@
+# app/utils/profiling.py
+import copy
+import math
+import weakref
+import pandas as pd
+from app.config import PROFILE_TOP_K
+from app.utils.memory_governor import as_frame, table_schemas
+
+# If more than this fraction of rows changed, rebuilding is cheaper than applying a delta.
+REBUILD_FRACTION = 0.5
+
+
+def _is_numeric(series: pd.Series) -> bool:
+    return pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series)
+
+
+def _is_categorical(series: pd.Series) -> bool:
+    return series.dtype == object or isinstance(series.dtype, (pd.CategoricalDtype, pd.StringDtype))
+
+
+def _moments(values: pd.Series) -> dict:
+    """Count, mean, sum of squared deviations (M2), min and max of the non-null values."""
+    arr = values.dropna().to_numpy(dtype="float64")
+    count = int(arr.size)
+    if count == 0:
+        return {"count": 0, "mean": 0.0, "m2": 0.0, "min": math.nan, "max": math.nan}
+    mean = float(arr.mean())
+    return {
+        "count": count,
+        "mean": mean,
+        "m2": float(((arr - mean) ** 2).sum()),
+        "min": float(arr.min()),
+        "max": float(arr.max()),
+    }
+
+
+def _merge_moments(stats: dict, delta: dict, sign: int) -> None:
+    """Add (sign=1) or remove (sign=-1) a batch of values using Chan's parallel variance formulas."""
+    if delta["count"] == 0:
+        return
+    n_a, n_b = stats["count"], delta["count"]
+    if sign > 0:
+        n = n_a + n_b
+        diff = delta["mean"] - stats["mean"]
+        stats["mean"] = stats["mean"] + diff * n_b / n
+        stats["m2"] = stats["m2"] + delta["m2"] + diff * diff * n_a * n_b / n
+        stats["count"] = n
+        return
+    n = n_a - n_b
+    if n <= 0:
+        stats.update({"count": 0, "mean": 0.0, "m2": 0.0})
+        return
+    mean = (n_a * stats["mean"] - n_b * delta["mean"]) / n
+    diff = delta["mean"] - mean
+    stats["m2"] = max(stats["m2"] - delta["m2"] - diff * diff * n * n_b / n_a, 0.0)
+    stats["mean"] = mean
+    stats["count"] = n
+
+
+def _top_k(values: pd.Series, capacity: int) -> tuple:
+    counts = values.value_counts(dropna=True)
+    top = {key: int(count) for key, count in counts.head(capacity).items()}
+    # Any value that is not tracked occurs at most this often.
+    error = int(counts.iloc[capacity]) if len(counts) > capacity else 0
+    return top, error
+
+
+def _merge_top_k(col_profile: dict, values: pd.Series, sign: int) -> None:
+    """
+    Space-Saving update of the approximate top-k counters. New values evict the
+    smallest counter (inheriting its count as error); removed values are decremented.
+    """
+    top = col_profile["top_k"]
+    capacity = col_profile["capacity"]
+    for value, count in values.value_counts(dropna=True).items():
+        count = int(count)
+        if sign < 0:
+            if value in top:
+                top[value] = max(top[value] - count, 0)
+            continue
+        if value in top:
+            top[value] += count
+        elif len(top) < capacity:
+            top[value] = count
+        else:
+            smallest = min(top, key=top.get)
+            floor = top.pop(smallest)
+            top[value] = floor + count
+            col_profile["error"] = max(col_profile["error"], floor)
+
+
+def build_column_profile(series: pd.Series, capacity: int = PROFILE_TOP_K) -> dict:
+    profile = {"nulls": int(series.isna().sum())}
+    if _is_numeric(series):
+        profile["kind"] = "numeric"
+        profile.update(_moments(series))
+    elif _is_categorical(series):
+        profile["kind"] = "categorical"
+        profile["capacity"] = capacity
+        profile["top_k"], profile["error"] = _top_k(series, capacity)
+    else:
+        profile["kind"] = "other"
+    return profile
+
+
+def build_table_profile(df: pd.DataFrame) -> dict:
+    """
+    Compute the column statistics profile of a table with one pass per column:
+    null counts, min/max/mean/std for numeric columns and approximate top-k
+    values for categorical columns.
+    """
+    return {
+        # Weak reference to the profiled table; compared with `is`, since id() of a
+        # replaced table can be reused by its successor.
+        "table": weakref.ref(df),
+        "row_count": len(df),
+        "column_names": list(df.columns),
+        "columns": {col: build_column_profile(df[col]) for col in df.columns},
+    }
+
+
+def _row_delta(old_df: pd.DataFrame, new_df: pd.DataFrame) -> tuple:
+    """
+    Return (added rows, removed rows) between two versions of a table, treating rows
+    as a multiset. Rows are matched by hash, so an UPDATE shows up as one removal and one addition.
+    """
+    old_hash = pd.util.hash_pandas_object(old_df, index=False)
+    new_hash = pd.util.hash_pandas_object(new_df, index=False)
+    old_counts = old_hash.value_counts()
+    new_counts = new_hash.value_counts()
+    added_mask = new_hash.groupby(new_hash).cumcount() >= new_hash.map(old_counts).fillna(0)
+    removed_mask = old_hash.groupby(old_hash).cumcount() >= old_hash.map(new_counts).fillna(0)
+    return new_df[added_mask.to_numpy()], old_df[removed_mask.to_numpy()]
+
+
+def update_table_profile(profile: dict, old_df: pd.DataFrame, new_df: pd.DataFrame) -> dict:
+    """
+    Incrementally update a profile after a table changed (e.g. by /modify_data).
+
+    Only the rows that were added or removed are scanned. Min/max are recomputed for
+    a column only when a removed value was its current extreme. Falls back to a full
+    rebuild when the schema changed or most of the table was rewritten.
+    """
+    if list(old_df.columns) != list(new_df.columns) or not old_df.dtypes.equals(new_df.dtypes):
+        return build_table_profile(new_df)
+    try:
+        added, removed = _row_delta(old_df, new_df)
+    except TypeError:
+        # Unhashable cell values (lists, dicts): no cheap delta available.
+        return build_table_profile(new_df)
+    if len(added) + len(removed) > REBUILD_FRACTION * max(len(new_df), 1):
+        return build_table_profile(new_df)
+
+    profile = copy.deepcopy(profile)
+    for col, col_profile in profile["columns"].items():
+        added_values, removed_values = added[col], removed[col]
+        col_profile["nulls"] += int(added_values.isna().sum()) - int(removed_values.isna().sum())
+        if col_profile["kind"] == "numeric":
+            removed_stats = _moments(removed_values)
+            added_stats = _moments(added_values)
+            _merge_moments(col_profile, removed_stats, -1)
+            _merge_moments(col_profile, added_stats, 1)
+            if removed_stats["count"] and (
+                removed_stats["min"] <= col_profile["min"] or removed_stats["max"] >= col_profile["max"]
+            ):
+                extremes = _moments(new_df[col])
+                col_profile["min"], col_profile["max"] = extremes["min"], extremes["max"]
+            elif added_stats["count"]:
+                col_profile["min"] = min(col_profile["min"], added_stats["min"]) if col_profile["count"] > added_stats["count"] else added_stats["min"]
+                col_profile["max"] = max(col_profile["max"], added_stats["max"]) if col_profile["count"] > added_stats["count"] else added_stats["max"]
+        elif col_profile["kind"] == "categorical":
+            _merge_top_k(col_profile, removed_values, -1)
+            _merge_top_k(col_profile, added_values, 1)
+    profile.update({"table": weakref.ref(new_df), "row_count": len(new_df)})
+    return profile
+
+
+def is_profile_current(profile: dict, df: pd.DataFrame) -> bool:
+    return (
+        profile is not None
+        and profile["table"]() is df
+        and profile["row_count"] == len(df)
+        and profile["column_names"] == list(df.columns)
+    )
+
+
+def refresh_table_profiles(table_names: list, profiles: dict, previous_frames: dict = None) -> None:
+    """
+    Bring the profile store in line with the loaded tables.
+
+    Tables whose DataFrame is unchanged keep their profile, tables listed in
+    previous_frames get an incremental update, new tables are profiled once and
+    profiles of tables that are gone are dropped. Spilled tables are only loaded
+    when their profile has to be (re)built.
+    """
+    current = dict(table_schemas(table_names))
+    for name in list(profiles):
+        if name not in current:
+            del profiles[name]
+    for name, table in current.items():
+        profile = profiles.get(name)
+        if is_profile_current(profile, table):
+            continue
+        old_table = (previous_frames or {}).get(name)
+        if profile is not None and old_table is not None and old_table is not table:
+            profiles[name] = update_table_profile(profile, as_frame(old_table), as_frame(table))
+        else:
+            profiles[name] = build_table_profile(as_frame(table))
+        # Keyed by the TableRef, which outlives the frame when the table is spilled and reloaded.
+        profiles[name]["table"] = weakref.ref(table)
+
+
+def render_table_overview(tname: str, profile: dict) -> str:
+    numeric_info = []
+    categorical_info = []
+    for col, col_profile in profile["columns"].items():
+        if col_profile["kind"] == "numeric":
+            count = col_profile["count"]
+            mean = col_profile["mean"] if count else math.nan
+            std = math.sqrt(col_profile["m2"] / (count - 1)) if count > 1 else math.nan
+            numeric_info.append(
+                f"- {col}: min={col_profile['min']:.2f}, max={col_profile['max']:.2f}, mean={mean:.2f}, std={std:.2f}"
+            )
+        elif col_profile["kind"] == "categorical":
+            candidates = [(value, count) for value, count in col_profile["top_k"].items() if count > 0]
+            if col_profile["nulls"]:
+                candidates.append((math.nan, col_profile["nulls"]))
+            candidates.sort(key=lambda item: item[1], reverse=True)
+            top_vals = ", ".join([f"{value} ({count})" for value, count in candidates[:3]])
+            categorical_info.append(f"- {col}: top values → {top_vals}")
+    if numeric_info:
+        numeric_stats_text = "Numeric columns summary:\n" + "\n".join(numeric_info)
+    else:
+        numeric_stats_text = "(No numeric columns found.)"
+    if categorical_info:
+        categorical_stats_text = "Categorical columns summary:\n" + "\n".join(categorical_info)
+    else:
+        categorical_stats_text = "(No categorical columns found.)"
+    return (
+        f"Table: {tname}\n"
+        f"Row Count: {profile['row_count']}\n"
+        f"{numeric_stats_text}\n"
+        f"{categorical_stats_text}\n"
+        "----\n"
+    )
+
+
+def generate_profile_overview(table_names: list, profiles: dict) -> str:
+    """
+    Same text as generate_detailed_overview_in_memory, rendered from the profile store
+    instead of rescanning the data. Missing or stale profiles are (re)built first.
+    """
+    refresh_table_profiles(table_names, profiles)
+    return "\n".join(render_table_overview(tname, profiles[tname]) for tname, _ in table_schemas(table_names))
@@ -0,0 +1,143 @@
+# app/utils/provisioning.py
+import logging
+import os
+import re
+import threading
+import sqlalchemy
+from sqlalchemy import text
+from app.config import DYNAMIC_DATABASE_URL
+from app.models import User
+from app.utils.user_cache import user_cache
+
+logger = logging.getLogger("provisioning")
+logger.setLevel(logging.INFO)
+
+
+def dynamic_db_name(user: User) -> str:
+    """
+    Name of a user's dynamic database: the username plus "_db" (e.g. "deepak_db"),
+    limited to characters that are safe in a database name.
+    """
+    return re.sub(r"\W", "_", user.username.strip().lower()) + "_db"
+
+
+def set_user_dynamic_db(db, user: User, db_name: str) -> None:
+    """
+    Record the user's dynamic database in the central DB. The user may come from the
+    user cache (not attached to db), so the row is updated explicitly and the cached
+    copy is dropped.
+    """
+    user.dynamic_db = db_name
+    db.query(User).filter(User.id == user.id).update({User.dynamic_db: db_name}, synchronize_session=False)
+    db.commit()
+    user_cache.invalidate(user.id)
+
+
+class ProvisioningService:
+    """
+    Creates users' dynamic databases exactly once per process and hands out one
+    shared engine per database.
+
+    Concurrent first requests of a user (clean_file, cancel_clean and execute_query
+    in parallel) serialize on a per-user lock: the first one creates the database and
+    records it on the user row, the others find it done. Databases known to exist are
+    remembered, so later calls cost a set lookup. DDL runs on one shared server-level
+    engine instead of a new engine per call.
+    """
+    def __init__(self, url_template: str = DYNAMIC_DATABASE_URL):
+        self.url_template = url_template
+        self._lock = threading.Lock()
+        self._user_locks = {}   # user_id -> Lock
+        self._provisioned = set()
+        self._engines = {}      # database name -> Engine
+        self._admin_engine = None
+
+    def _database_url(self, db_name: str) -> str:
+        return self.url_template.format(database=db_name)
+
+    def _is_sqlite(self) -> bool:
+        return self.url_template.startswith("sqlite")
+
+    def _user_lock(self, user_id) -> threading.Lock:
+        with self._lock:
+            return self._user_locks.setdefault(user_id, threading.Lock())
+
+    def _get_admin_engine(self):
+        with self._lock:
+            if self._admin_engine is None:
+                server_url = sqlalchemy.engine.make_url(self._database_url("admin")).set(database=None)
+                self._admin_engine = sqlalchemy.create_engine(server_url, pool_size=2, max_overflow=2, pool_recycle=1800)
+            return self._admin_engine
+
+    def provision_database(self, db_name: str) -> None:
+        """Create the database if it does not exist (idempotent)."""
+        if db_name in self._provisioned:
+            return
+        if self._is_sqlite():
+            # SQLite creates the file on first connect; only its directory must exist.
+            path = sqlalchemy.engine.make_url(self._database_url(db_name)).database
+            if path and os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+        else:
+            with self._get_admin_engine().begin() as connection:
+                connection.execute(text(f"CREATE DATABASE IF NOT EXISTS `{db_name}`"))
+            logger.info(f"Dynamic database '{db_name}' provisioned.")
+        with self._lock:
+            self._provisioned.add(db_name)
+
+    def ensure_user_database(self, db, user: User) -> str:
+        """Return the user's dynamic database name, creating and recording it on first use."""
+        if user.dynamic_db and user.dynamic_db in self._provisioned:
+            return user.dynamic_db
+        with self._user_lock(user.id):
+            db_name = user.dynamic_db
+            if not db_name:
+                # Another request may have provisioned it since this user object was loaded.
+                db_name = db.query(User.dynamic_db).filter(User.id == user.id).scalar() or ""
+            self.provision_database(db_name or dynamic_db_name(user))
+            if not db_name:
+                set_user_dynamic_db(db, user, dynamic_db_name(user))
+            elif user.dynamic_db != db_name:
+                user.dynamic_db = db_name
+                user_cache.invalidate(user.id)
+            return user.dynamic_db
+
+    def get_engine(self, db_name: str):
+        """The shared engine of a dynamic database (created on first use)."""
+        with self._lock:
+            engine = self._engines.get(db_name)
+            if engine is None:
+                options = {} if self._is_sqlite() else {"pool_size": 10, "max_overflow": 20, "pool_recycle": 1800}
+                engine = sqlalchemy.create_engine(self._database_url(db_name), **options)
+                self._engines[db_name] = engine
+            return engine
+
+    def get_user_engine(self, db, user: User):
+        """Engine of the user's dynamic database, provisioning it if needed."""
+        return self.get_engine(self.ensure_user_database(db, user))
+
+    def preprovision(self, user_id) -> None:
+        """Provision a new user's database outside the request (e.g. right after signup)."""
+        from app.database import SessionLocal, get_engine
+        get_engine()
+        db = SessionLocal()
+        try:
+            user = db.query(User).filter(User.id == user_id).first()
+            if user is not None:
+                self.ensure_user_database(db, user)
+        except Exception as e:
+            # The first save provisions it instead.
+            logger.warning(f"Pre-provisioning the dynamic database of user {user_id} failed: {e}")
+        finally:
+            db.close()
+
+    def dispose(self) -> None:
+        with self._lock:
+            engines = list(self._engines.values()) + ([self._admin_engine] if self._admin_engine is not None else [])
+            self._engines.clear()
+            self._admin_engine = None
+        for engine in engines:
+            engine.dispose()
+
+
+provisioning = ProvisioningService()
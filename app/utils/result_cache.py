@@ -0,0 +1,156 @@
+# app/utils/result_cache.py
+import hashlib
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from fastapi import Response
+from app.config import RESULT_CACHE_SIZE, RESULT_CACHE_TTL, RESULT_CACHE_MAX_ROWS
+from app.utils.memory_governor import table_schemas
+
+
+def bump_table_versions(session_state, names: list = None) -> None:
+    """
+    Give the named tables (default: every loaded table) a new version. Call this
+    whenever table data changes (upload, clean, modify, load). Versions are random
+    tokens rather than counters, so a session that is cleared and reloaded never
+    reuses one. Versions of tables that are no longer loaded are dropped.
+    """
+    versions = session_state.get("table_versions")
+    if versions is None:
+        versions = session_state["table_versions"] = {}
+    loaded = [name for name, _ in table_schemas(session_state.get("table_names", []))]
+    retired = {version for name, version in versions.items() if name not in loaded or names is None or name in names}
+    for name in list(versions):
+        if name not in loaded:
+            del versions[name]
+    for name in loaded:
+        if names is None or name in names or name not in versions:
+            versions[name] = uuid.uuid4().hex[:16]
+    get_result_cache().discard_versions(retired)
+
+
+def table_versions(session_state) -> dict:
+    """table_name -> version of the loaded tables (tables never bumped get a version now)."""
+    versions = session_state.get("table_versions") or {}
+    loaded = [name for name, _ in table_schemas(session_state.get("table_names", []))]
+    if any(name not in versions for name in loaded):
+        bump_table_versions(session_state, names=[])
+        versions = session_state["table_versions"]
+    return {name: versions[name] for name in loaded}
+
+
+def data_source(session_state) -> tuple:
+    """
+    What a result depends on besides the table versions: the source and, for a
+    personal database, which one (without the password). Part of cache keys and
+    ETags, so connecting to another database never serves the previous one's results.
+    """
+    params = session_state.get("personal_db") or {}
+    return session_state.get("source"), {key: value for key, value in params.items() if key != "password"}
+
+
+def etag_nonce(session_state) -> str:
+    """
+    Extra ETag part for one computed result. Personal databases change outside this
+    app, so their results get a fresh ETag each time they are computed: clients
+    revalidate against the cached entry until it expires (RESULT_CACHE_TTL), not
+    forever. Uploaded tables only change through version bumps and get "".
+    """
+    return uuid.uuid4().hex if session_state.get("personal_db") else ""
+
+
+def _digest(parts) -> str:
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:32]
+
+
+def make_etag(*parts) -> str:
+    """Strong ETag of a result, e.g. make_etag("query", sql_query, versions, result_format)."""
+    return f'"{_digest(parts)}"'
+
+
+def request_key(*parts) -> str:
+    """Cache key of a request: endpoint, request body, user and table versions."""
+    return _digest(parts)
+
+
+def etag_matches(request, etag: str) -> bool:
+    """True when the request's If-None-Match lists etag (weak comparison, as for GET)."""
+    header = request.headers.get("if-none-match") if request is not None else None
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    tags = [tag.strip() for tag in header.split(",")]
+    return etag in tags or f"W/{etag}" in tags
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "private, no-cache"})
+
+
+def with_etag(response: Response, etag: str) -> Response:
+    response.headers["ETag"] = etag
+    # Clients may keep the result but must revalidate it, which costs a 304 at most.
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
+class ResultCache:
+    """
+    Bounded LRU of computed results (the response payload and its ETag), keyed by
+    request_key(). Keys contain the table versions, so a version bump makes old
+    entries unreachable; discard_versions() also frees them right away. Entries
+    expire after `ttl` seconds, which bounds staleness for personal databases that
+    can change outside this app.
+    """
+    def __init__(self, max_entries: int = RESULT_CACHE_SIZE, ttl: float = RESULT_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, versions, entry)
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            if item[0] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return item[2]
+
+    def put(self, key: str, entry: dict, versions: dict, rows: int = 0) -> None:
+        if not self.max_entries or rows > RESULT_CACHE_MAX_ROWS:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, set(versions.values()), entry)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard_versions(self, versions: set) -> None:
+        if not versions:
+            return
+        with self._lock:
+            stale = [key for key, (_, used, _) in self._entries.items() if used & versions]
+            for key in stale:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> ResultCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResultCache()
+        return _cache
@@ -0,0 +1,207 @@
+# app/utils/serialization.py
+import datetime
+import decimal
+import io
+import json
+import numpy as np
+import pandas as pd
+from fastapi.responses import JSONResponse, StreamingResponse
+from app.config import ARROW_BATCH_ROWS
+from app.utils.metrics import PAYLOAD_BYTES
+
+try:
+    import orjson
+except ImportError:  # Falls back to the standard library encoder.
+    orjson = None
+
+# Shapes a tabular result can be returned in:
+#   "records":  [{"col": value, ...}, ...] (default, as before)
+#   "columnar": {"columns": [...], "data": [[row values], ...]}, without repeating column names per row.
+RESULT_FORMATS = ("records", "columnar")
+# Content type clients send in Accept to receive results as an Arrow IPC stream.
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+
+_TICKS_PER_SECOND = {"s": 1, "ms": 10**3, "us": 10**6, "ns": 10**9}
+
+
+def _utc_offset(seconds: float) -> str:
+    sign = "-" if seconds < 0 else "+"
+    minutes = int(abs(seconds)) // 60
+    return f"{sign}{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def _datetime_strings(series: pd.Series) -> pd.Series:
+    """
+    ISO 8601 strings for a datetime64 column, formatted like Timestamp.isoformat():
+    seconds are always shown, fractions only when the column has sub-second values
+    (microseconds, or nanoseconds where present) and tz-aware values keep their
+    local time and UTC offset. Computed with numpy calls instead of per value.
+    """
+    tz = getattr(series.dt, "tz", None)
+    local = series.dt.tz_localize(None) if tz is not None else series
+    values = local.to_numpy()
+    ticks_per_second = _TICKS_PER_SECOND.get(np.datetime_data(values.dtype)[0], 1)
+    ticks = values.view("int64")[~np.isnat(values)]
+    fraction = ticks % ticks_per_second
+    if not fraction.any():
+        unit = "s"
+    elif ticks_per_second == 10**9 and (fraction % 1000).any():
+        unit = "ns"
+    else:
+        unit = "us"
+    strings = np.datetime_as_string(values, unit=unit)
+    if tz is not None:
+        offsets = (local - series.dt.tz_convert("UTC").dt.tz_localize(None)).dt.total_seconds().fillna(0)
+        suffixes = offsets.map({seconds: _utc_offset(seconds) for seconds in offsets.unique()})
+        strings = np.char.add(strings, suffixes.to_numpy(dtype=str))
+    return pd.Series(strings, index=series.index, dtype=object)
+
+
+def json_ready_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Object-dtype copy of df holding only JSON-native Python values: NaN, NaT, pd.NA
+    and infinities become None, numpy scalars become int/float/bool and timestamps
+    ISO strings. Works column by column, without visiting Python objects one by one.
+    """
+    columns = {}
+    for position in range(df.shape[1]):
+        series = df.iloc[:, position]
+        missing = series.isna()
+        if pd.api.types.is_datetime64_any_dtype(series):
+            values = _datetime_strings(series)
+        elif pd.api.types.is_timedelta64_dtype(series):
+            values = series.astype(str).astype(object)
+        else:
+            if pd.api.types.is_float_dtype(series):
+                missing = missing | np.isinf(series.to_numpy(dtype="float64", na_value=np.nan))
+            # astype(object) boxes numpy scalars into the matching Python types.
+            values = series.astype(object)
+        columns[position] = values.where(~missing, None)
+    ready = pd.DataFrame(columns, index=df.index)
+    ready.columns = [str(col) for col in df.columns]
+    return ready
+
+
+def frame_to_records(df: pd.DataFrame) -> list:
+    ready = json_ready_frame(df)
+    names = list(ready.columns)
+    return [dict(zip(names, row)) for row in ready.to_numpy(dtype=object).tolist()]
+
+
+def frame_to_columnar(df: pd.DataFrame) -> dict:
+    ready = json_ready_frame(df)
+    return {"columns": list(ready.columns), "data": ready.to_numpy(dtype=object).tolist()}
+
+
+def serialize_frame(df: pd.DataFrame, result_format: str = "records"):
+    """A DataFrame in one of RESULT_FORMATS, ready to be encoded as JSON."""
+    if result_format == "columnar":
+        return frame_to_columnar(df)
+    if result_format != "records":
+        raise ValueError(f"Unknown result format '{result_format}'. Use one of: {', '.join(RESULT_FORMATS)}.")
+    return frame_to_records(df)
+
+
+def _default(obj):
+    # Values that slipped past json_ready_frame, e.g. numpy scalars in single-value answers.
+    # NaT is a datetime subclass, so it is checked before datetimes.
+    if obj is pd.NaT or obj is pd.NA:
+        return None
+    if isinstance(obj, np.generic):
+        value = obj.item()
+        return None if isinstance(value, float) and not np.isfinite(value) else value
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, bytes):
+        return obj.decode("utf-8", errors="replace")
+    return str(obj)
+
+
+def dumps(content) -> bytes:
+    """Encode content as JSON, with orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse encoded with dumps(). Return it from an endpoint to skip FastAPI's
+    recursive jsonable_encoder pass; content must already be JSON-ready (see
+    serialize_frame).
+    """
+    def render(self, content) -> bytes:
+        body = dumps(content)
+        PAYLOAD_BYTES.observe(len(body), format="json")
+        return body
+
+
+
+def wants_arrow(request) -> bool:
+    """True when the client's Accept header asks for an Arrow IPC stream."""
+    accept = request.headers.get("accept", "") if request is not None else ""
+    return ARROW_STREAM_MEDIA_TYPE in accept.lower()
+
+
+def is_arrow_table(obj) -> bool:
+    return type(obj).__module__.startswith("pyarrow") and hasattr(obj, "to_batches")
+
+
+def frame_to_arrow(df: pd.DataFrame):
+    """
+    Arrow table of a DataFrame. Numeric columns are converted without copying;
+    object columns holding mixed types, which Arrow cannot type, are sent as strings.
+    """
+    import pyarrow as pa  # Imported on first use to keep app startup fast.
+    if not all(isinstance(col, str) for col in df.columns):
+        df = df.set_axis([str(col) for col in df.columns], axis=1)
+    try:
+        return pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        df = df.copy()
+        for position in range(df.shape[1]):
+            series = df.iloc[:, position]
+            if series.dtype == object:
+                df.isetitem(position, series.where(series.isna(), series.astype(str)))
+        return pa.Table.from_pandas(df, preserve_index=False)
+
+
+def _arrow_stream(table, batch_rows: int):
+    import pyarrow as pa
+    sink = io.BytesIO()
+    sent = 0
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        # The schema goes out first, then every record batch as soon as it is written.
+        sent += sink.tell()
+        yield sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+        for batch in table.to_batches(max_chunksize=batch_rows):
+            writer.write_batch(batch)
+            sent += sink.tell()
+            yield sink.getvalue()
+            sink.seek(0)
+            sink.truncate()
+    sent += sink.tell()
+    PAYLOAD_BYTES.observe(sent, format="arrow")
+    yield sink.getvalue()  # End-of-stream marker
+
+
+def arrow_stream_response(result, metadata: dict = None, batch_rows: int = ARROW_BATCH_ROWS) -> StreamingResponse:
+    """
+    Stream a DataFrame (or an Arrow table, e.g. from duckdb) as an Arrow IPC stream.
+    metadata (SQL, paging, chart settings) is stored as JSON in the schema metadata,
+    where Arrow clients read it with schema.metadata.
+    """
+    table = result if is_arrow_table(result) else frame_to_arrow(result)
+    if metadata:
+        encoded = {key: dumps(value) for key, value in metadata.items()}
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), **encoded})
+    return StreamingResponse(_arrow_stream(table, batch_rows), media_type=ARROW_STREAM_MEDIA_TYPE)
@@ -3,6 +3,19 @@ import re
 import pandas as pd
 import sqlalchemy
 from sqlalchemy import text
+from app.config import QUERY_HINTS_MODE
+from app.utils.metrics import DB_SECONDS
+ 
+# Keyword sets that trigger each optimization hint in suggest_query_optimizations.
+QUERY_HINTS = [
+    ({"average", "sum", "count", "max", "min"}, "Consider using aggregation functions like AVG, SUM, COUNT, MAX, MIN for summary statistics."),
+    ({"join", "combine", "merge"}, "Consider using JOIN operations to combine data from multiple tables."),
+    ({"date", "time", "period"}, "Consider filtering data by date or time periods using WHERE clauses."),
+    ({"sort", "order", "arrange"}, "Consider ordering the results using ORDER BY clauses."),
+]
+ 
+# Word characters only, so "total_sales" stays one token as it does in spaCy.
+TOKEN_PATTERN = re.compile(r"\w+")
  
 def clean_sql_query(raw_query: str, dialect: str = None) -> str:
     cleaned_query = raw_query.strip()
@@ -36,17 +49,24 @@ def enhance_user_query(user_query: str, table_names: list) -> str:
             enhanced_query = re.sub(pattern, actual_column, enhanced_query, flags=re.IGNORECASE)
     return enhanced_query
  
-def suggest_query_optimizations(sql_query: str, user_query: str, schema_info: str, nlp_model) -> tuple:
+def tokenize_query(user_query: str, mode: str = "fast", nlp_model=None) -> set:
+    """
+    Lowercase tokens of the user query for keyword hints.
+      - "fast": regex word split, no spaCy at all (default).
+      - "tokenizer": spaCy tokenizer only (nlp_model.make_doc), skipping tagger/parser/NER.
+      - "rich": the full spaCy pipeline, as before.
+    """
+    if mode == "fast" or nlp_model is None:
+        return set(TOKEN_PATTERN.findall(user_query.lower()))
+    doc = nlp_model.make_doc(user_query) if mode == "tokenizer" else nlp_model(user_query)
+    return {token.text.lower() for token in doc}
+ 
+def suggest_query_optimizations(sql_query: str, user_query: str, schema_info: str, nlp_model=None, mode: str = "fast") -> tuple:
     optimizations = []
-    doc = nlp_model(user_query)
-    if any(token.text.lower() in ["average", "sum", "count", "max", "min"] for token in doc):
-        optimizations.append("Consider using aggregation functions like AVG, SUM, COUNT, MAX, MIN for summary statistics.")
-    if any(token.text.lower() in ["join", "combine", "merge"] for token in doc):
-        optimizations.append("Consider using JOIN operations to combine data from multiple tables.")
-    if any(token.text.lower() in ["date", "time", "period"] for token in doc):
-        optimizations.append("Consider filtering data by date or time periods using WHERE clauses.")
-    if any(token.text.lower() in ["sort", "order", "arrange"] for token in doc):
-        optimizations.append("Consider ordering the results using ORDER BY clauses.")
+    tokens = tokenize_query(user_query, mode=mode, nlp_model=nlp_model)
+    for keywords, hint in QUERY_HINTS:
+        if tokens & keywords:
+            optimizations.append(hint)
     if "SELECT *" in sql_query.upper():
         optimizations.append("Select only the necessary columns instead of using SELECT * for efficiency.")
     return (sql_query, optimizations)
@@ -96,48 +116,183 @@ Chain-of-thought explanation:
             sql_query = clean_sql_query(fallback_response, dialect=dialect)
         sql_query = clean_sql_query(sql_query, dialect=dialect)
         attempts += 1
-    from app.utils.cleaning import NLP_MODEL
-    optimized_query, optimizations = suggest_query_optimizations(sql_query, user_query, schema_info, NLP_MODEL)
+    nlp_model = None
+    if QUERY_HINTS_MODE in ("tokenizer", "rich"):
+        from app.utils.cleaning import get_nlp_model
+        nlp_model = get_nlp_model()
+    optimized_query, optimizations = suggest_query_optimizations(
+        sql_query, user_query, schema_info, nlp_model, mode=QUERY_HINTS_MODE
+    )
     return optimized_query, optimizations
  
+def repair_sql_query(sql_query: str, errors: list, user_query: str, schema_info: str, llm, dialect: str = None) -> str:
+    """
+    Ask the LLM for one targeted fix of a query that failed local validation.
+    Only the failing query and the validation errors are sent back, not the whole conversation.
+    """
+    target = dialect or "MySQL"
+    template = f"""\
+You are an expert SQL generator. The SQL query below was generated for the user's request but failed validation against the schema.
+Fix only the reported problems and keep the intent of the query unchanged. Use only the tables and columns listed in the schema.
+The query must be valid for {target}.
+**Available Tables and Schema**:
+{schema_info}
+**User Query**: {user_query}
+**Invalid SQL Query**:
+{sql_query}
+**Validation Errors**:
+{chr(10).join(f"- {error}" for error in errors)}
+On a new line, output "Final SQL Query:" followed by the corrected query.
+"""
+    response = llm(template)
+    if "Final SQL Query:" in response:
+        repaired = response.split("Final SQL Query:")[-1].strip()
+    else:
+        repaired = response
+    return clean_sql_query(repaired, dialect=dialect)
  
-def execute_sql_query(sql_query: str, user_query: str, connection) -> pd.DataFrame:
-    sql_query = sql_query.strip().rstrip(';') + ';'
-    dialect = ""
+def validate_and_repair_sql(sql_query: str, user_query: str, schema_info: str, llm, table_names: list, dialect: str = None) -> str:
+    """
+    Validate generated SQL locally before any database call. If validation fails the
+    LLM gets exactly one repair attempt; a query that is still invalid raises SQLValidationError.
+    """
+    from app.utils.sql_validation import validate_sql_query, SQLValidationError
+    validated, errors = validate_sql_query(sql_query, table_names, dialect=dialect)
+    if not errors:
+        return validated
+    repaired = repair_sql_query(sql_query, errors, user_query, schema_info, llm, dialect=dialect)
+    validated, repair_errors = validate_sql_query(repaired, table_names, dialect=dialect)
+    if repair_errors:
+        raise SQLValidationError(repaired, repair_errors)
+    return validated
+ 
+def paginate_sql(sql_query: str, limit: int, offset: int = 0, dialect: str = None) -> str:
+    """
+    Limit a query to one page of its result. LIMIT/OFFSET go on the top-level
+    statement, so its ORDER BY decides the page (MySQL may ignore an ORDER BY inside
+    a derived table). A LIMIT/OFFSET the query already has is combined with the
+    page's. Queries sqlglot cannot parse are wrapped in a derived table instead.
+    """
+    import sqlglot
+    from sqlglot import exp
+    from sqlglot.errors import SqlglotError
+    from app.utils.sql_validation import to_sqlglot_dialect
+    inner = sql_query.strip().rstrip(";")
+    limit, offset = int(limit), int(offset)
+    read = to_sqlglot_dialect(dialect)
+    try:
+        tree = sqlglot.parse_one(inner, read=read)
+    except SqlglotError:
+        tree = None
+    if not isinstance(tree, (exp.Select, exp.SetOperation)):
+        return f"SELECT * FROM ({inner}) AS paged_result LIMIT {limit} OFFSET {offset};"
+    own_limit, own_offset = _literal_int(tree.args.get("limit")), _literal_int(tree.args.get("offset"))
+    if own_limit is False or own_offset is False:
+        return f"SELECT * FROM ({inner}) AS paged_result LIMIT {limit} OFFSET {offset};"
+    start = (own_offset or 0) + offset
+    if own_limit is not None:
+        limit = max(0, min(limit, own_limit - offset))
+    tree.set("limit", exp.Limit(expression=exp.Literal.number(limit)))
+    tree.set("offset", exp.Offset(expression=exp.Literal.number(start)) if start else None)
+    return tree.sql(dialect=read) + ";"
+ 
+def _literal_int(node):
+    """Value of a LIMIT/OFFSET clause: None without one, False when it is not a plain number."""
+    from sqlglot import exp
+    if node is None:
+        return None
+    value = node.expression
+    if isinstance(value, exp.Literal) and value.is_int:
+        return int(value.this)
+    return False
+ 
+def get_connection_dialect(connection) -> str:
+    """Return the lowercase SQLAlchemy dialect name of a connection or engine ("" if unknown)."""
     if hasattr(connection, "engine"):
-        dialect = connection.engine.dialect.name.lower()
+        return connection.engine.dialect.name.lower()
     elif hasattr(connection, "dialect"):
-        dialect = connection.dialect.name.lower()
+        return connection.dialect.name.lower()
+    return ""
+ 
+def execute_sql_query(sql_query: str, user_query: str, connection) -> pd.DataFrame:
+    sql_query = sql_query.strip().rstrip(';') + ';'
+    dialect = get_connection_dialect(connection)
     if dialect == "vertica":
         sql_query = sql_query.replace("`", "")
     try:
-        if isinstance(connection, sqlalchemy.engine.Engine):
-            with connection.connect() as conn:
-                if sql_query.strip().upper().startswith("SELECT"):
-                    result = pd.read_sql_query(sql_query, conn)
-                else:
-                    conn.execute(text(sql_query))
-                    result = pd.DataFrame()
-        elif hasattr(connection, "cursor"):
-            cursor = connection.cursor(buffered=True)
-            try:
-                cursor.execute(sql_query)
+        # Timed per engine (mysql, vertica, ...) for app_db_query_duration_seconds on /metrics.
+        with DB_SECONDS.time(engine=dialect or "unknown"):
+            if isinstance(connection, sqlalchemy.engine.Engine):
+                with connection.connect() as conn:
+                    if sql_query.strip().upper().startswith("SELECT"):
+                        result = pd.read_sql_query(sql_query, conn)
+                    else:
+                        conn.execute(text(sql_query))
+                        result = pd.DataFrame()
+            elif hasattr(connection, "cursor"):
+                cursor = connection.cursor(buffered=True)
+                try:
+                    cursor.execute(sql_query)
+                    if sql_query.strip().upper().startswith("SELECT"):
+                        rows = cursor.fetchall()
+                        columns = [desc[0] for desc in cursor.description] if cursor.description else []
+                        result = pd.DataFrame(rows, columns=columns)
+                    else:
+                        connection.commit()
+                        result = pd.DataFrame()
+                finally:
+                    cursor.close()
+            else:
                 if sql_query.strip().upper().startswith("SELECT"):
-                    rows = cursor.fetchall()
-                    columns = [desc[0] for desc in cursor.description] if cursor.description else []
-                    result = pd.DataFrame(rows, columns=columns)
+                    result = pd.read_sql_query(sql_query, connection)
                 else:
-                    connection.commit()
+                    connection.execute(text(sql_query))
                     result = pd.DataFrame()
-            finally:
-                cursor.close()
-        else:
-            if sql_query.strip().upper().startswith("SELECT"):
-                result = pd.read_sql_query(sql_query, connection)
-            else:
-                connection.execute(text(sql_query))
-                result = pd.DataFrame()
         return result
     except Exception as e:
         raise e
- 
\ No newline at end of file
+ 
+
+def execute_statements_in_transaction(statements: list, connection) -> list:
+    """
+    Run data modification statements in one transaction: either all of them are
+    committed or, if any fails, none are.
+
+    Returns:
+        list: Rows affected by each statement (-1 where the driver does not report it).
+
+    Raises:
+        ValueError: A statement failed; the message names it. The transaction was rolled back.
+    """
+    rowcounts = []
+    if hasattr(connection, "cursor"):
+        cursor = connection.cursor(buffered=True)
+        try:
+            for index, sql_query in enumerate(statements, start=1):
+                try:
+                    cursor.execute(sql_query.strip().rstrip(";"))
+                except Exception as e:
+                    connection.rollback()
+                    raise ValueError(f"Statement {index} failed and the batch was rolled back: {e} (SQL: {sql_query})") from e
+                rowcounts.append(cursor.rowcount)
+            connection.commit()
+        finally:
+            cursor.close()
+        return rowcounts
+
+    def run_all(conn):
+        for index, sql_query in enumerate(statements, start=1):
+            try:
+                result = conn.execute(text(sql_query.strip().rstrip(";")))
+            except Exception as e:
+                raise ValueError(f"Statement {index} failed and the batch was rolled back: {e} (SQL: {sql_query})") from e
+            rowcounts.append(result.rowcount)
+
+    # The begin() block rolls back when run_all raises.
+    if isinstance(connection, sqlalchemy.engine.Engine):
+        with connection.begin() as conn:
+            run_all(conn)
+    else:
+        with connection.begin():
+            run_all(connection)
+    return rowcounts
@@ -0,0 +1,152 @@
+# app/utils/sql_validation.py
+import logging
+
+logger = logging.getLogger("sql_validation")
+logger.setLevel(logging.INFO)
+
+# SQLAlchemy dialect names mapped to the closest sqlglot dialect.
+# Vertica is PostgreSQL-derived, so its quoting and functions follow "postgres".
+SQLGLOT_DIALECTS = {
+    "mysql": "mysql",
+    "vertica": "postgres",
+    "postgres": "postgres",
+    "postgresql": "postgres",
+    "duckdb": "duckdb",
+    "sqlite": "sqlite",
+}
+
+# The LLM is prompted with MySQL examples and tends to answer with backticks, so
+# SQL with backticks (or that the target dialect cannot parse) is read as MySQL.
+SOURCE_DIALECT = "mysql"
+
+
+# sqlglot is imported inside the functions below so importing this module (for
+# SQLValidationError) does not pull the parser into app startup.
+
+
+class SQLValidationError(ValueError):
+    """
+    Raised when generated SQL fails local validation, even after repair.
+    The individual problems are kept in `errors`.
+    """
+    def __init__(self, sql_query: str, errors: list):
+        self.sql_query = sql_query
+        self.errors = errors
+        super().__init__("; ".join(errors))
+
+
+def to_sqlglot_dialect(dialect: str = None) -> str:
+    if not dialect:
+        return SOURCE_DIALECT
+    return SQLGLOT_DIALECTS.get(dialect.lower(), SOURCE_DIALECT)
+
+
+def _parse(sql: str, dialect: str = None) -> list:
+    """
+    Parse with the target dialect so double-quoted identifiers stay identifiers on
+    duckdb/postgres/vertica (MySQL would read them as string literals). SQL with
+    backticks, or that the target dialect rejects, is read as MySQL instead.
+    """
+    import sqlglot
+    from sqlglot.errors import SqlglotError
+    read = to_sqlglot_dialect(dialect)
+    if read != SOURCE_DIALECT and "`" not in sql:
+        try:
+            return sqlglot.parse(sql, read=read)
+        except SqlglotError:
+            pass
+    return sqlglot.parse(sql, read=SOURCE_DIALECT)
+
+
+def build_schema_map(table_names: list) -> dict:
+    """Return {lowercase table name: set of lowercase column names} for the loaded tables."""
+    schema = {}
+    for table_tuple in table_names:
+        if isinstance(table_tuple, tuple) and len(table_tuple) >= 2:
+            table_name, df = table_tuple[:2]
+            schema[str(table_name).lower()] = {str(col).lower() for col in df.columns}
+    return schema
+
+
+def _check_identifiers(tree, schema: dict) -> list:
+    from sqlglot import exp
+    errors = []
+    # Names introduced by the query itself: CTEs, aliases and derived-table columns.
+    cte_names = {cte.alias_or_name.lower() for cte in tree.find_all(exp.CTE)}
+    local_columns = {alias.alias.lower() for alias in tree.find_all(exp.Alias) if alias.alias}
+    for table_alias in tree.find_all(exp.TableAlias):
+        local_columns.update(col.name.lower() for col in table_alias.columns)
+    for node in list(tree.find_all(exp.Subquery)) + list(tree.find_all(exp.CTE)):
+        inner = node.this
+        if isinstance(inner, exp.Select):
+            local_columns.update(name.lower() for name in inner.named_selects)
+
+    # Map every table alias (and bare table name) to the schema table it refers to.
+    table_refs = {}
+    for table in tree.find_all(exp.Table):
+        name = table.name.lower()
+        if not name or name in cte_names:
+            continue
+        if name not in schema:
+            errors.append(
+                f"Unknown table '{table.name}'. Available tables: {', '.join(sorted(schema))}."
+            )
+            continue
+        table_refs[name] = name
+        if table.alias:
+            table_refs[table.alias.lower()] = name
+
+    all_columns = set().union(*schema.values()) if schema else set()
+    for column in tree.find_all(exp.Column):
+        col_name = column.name.lower()
+        if not col_name or col_name == "*" or col_name in local_columns:
+            continue
+        qualifier = column.table.lower() if column.table else ""
+        if qualifier and qualifier in table_refs:
+            table_name = table_refs[qualifier]
+            if col_name not in schema[table_name]:
+                errors.append(f"Column '{column.name}' does not exist in table '{table_name}'.")
+        elif col_name not in all_columns:
+            errors.append(f"Unknown column '{column.name}'.")
+    # Keep the order stable but report each problem once.
+    return list(dict.fromkeys(errors))
+
+
+def validate_sql_query(sql_query: str, table_names: list, dialect: str = None, read_only: bool = True) -> tuple:
+    """
+    Parse generated SQL locally, check table and column names against the loaded
+    schema and transpile it to the dialect of the target database.
+
+    Args:
+        sql_query (str): SQL produced by the LLM.
+        table_names (list): List of (table_name, DataFrame) tuples describing the schema.
+        dialect (str): SQLAlchemy dialect name of the target ("mysql", "vertica", "duckdb", ...).
+        read_only (bool): Only accept a single SELECT-style statement.
+
+    Returns:
+        tuple: (transpiled SQL ending with ";" or None if it could not be parsed, list of errors).
+    """
+    from sqlglot import exp
+    from sqlglot.errors import SqlglotError
+    cleaned = (sql_query or "").strip().rstrip(";").strip()
+    if not cleaned:
+        return None, ["The generated SQL query is empty."]
+    try:
+        statements = [stmt for stmt in _parse(cleaned, dialect) if stmt is not None]
+    except SqlglotError as e:
+        # Unbalanced backticks and quotes surface here as tokenizer errors.
+        return None, [f"SQL syntax error: {e}"]
+    if len(statements) != 1:
+        return None, [f"Expected exactly one SQL statement, found {len(statements)}."]
+    tree = statements[0]
+    if read_only and not isinstance(tree, (exp.Select, exp.Union, exp.Intersect, exp.Except)):
+        return None, [f"Only SELECT queries are allowed here, got {tree.key.upper()}."]
+
+    errors = _check_identifiers(tree, build_schema_map(table_names))
+    try:
+        transpiled = tree.sql(dialect=to_sqlglot_dialect(dialect))
+    except SqlglotError as e:
+        return None, errors + [f"Could not translate the query to {dialect}: {e}"]
+    if errors:
+        logger.info(f"SQL validation failed: {errors}")
+    return transpiled + ";", errors
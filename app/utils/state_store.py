@@ -0,0 +1,364 @@
+# app/utils/state_store.py
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import weakref
+import anyio
+import pandas as pd
+from app.config import STATE_BACKEND, STATE_DIR, STATE_SESSION_TTL, SECRET_KEY, ALGORITHM
+from app.state import GlobalState, TRANSIENT_KEYS, CACHE_KEYS, new_state, use_state
+from app.utils.memory_governor import as_frame, get_governor, table_schemas
+
+logger = logging.getLogger("state_store")
+logger.setLevel(logging.INFO)
+
+SESSION_HEADER = b"x-session-id"
+# Plain JSON values of the state that are persisted as they are. personal_db never
+# holds the password: it only lives in this worker's engine (see routes/db.py).
+_META_KEYS = ["source", "personal_db", "chat_history", "table_versions"]
+_TABLE_LISTS = ["table_names", "original_table_names"]
+# Endpoints that never touch session state; they skip loading and saving it.
+_STATELESS_PATHS = ("/metrics",)
+
+
+def session_key(user_id, session_id: str = None) -> str:
+    return f"{user_id if user_id is not None else 'anonymous'}:{session_id or 'default'}"
+
+
+def _table_entries(session_state: GlobalState) -> list:
+    """(list kind, table name, weakref to the table) of every table in the state."""
+    return [
+        (kind, name, weakref.ref(table))
+        for kind in _TABLE_LISTS for name, table in table_schemas(session_state.get(kind, []))
+    ]
+
+
+def _path_of(files: list, table):
+    """
+    Path stored for table in a [(weakref, path)] list. Tables are matched with `is`:
+    a replaced table's id() can be reused by the next one, which must not inherit
+    its file.
+    """
+    for ref, path in files:
+        if ref() is table:
+            return path
+    return None
+
+
+def _close_transient(session_state: GlobalState) -> None:
+    duckdb_session = session_state.get("duckdb_session")
+    if duckdb_session is not None:
+        duckdb_session.close()
+
+
+class StateBackend:
+    """
+    Where session states live. load() returns the GlobalState of a session (a fresh
+    one for a new session); save() is called after every request that used it.
+    """
+    name = "base"
+
+    def load(self, key: str) -> GlobalState:
+        raise NotImplementedError
+
+    def save(self, key: str, session_state: GlobalState) -> None:
+        raise NotImplementedError
+
+    def evict_idle(self) -> None:
+        """Drop in-memory states of sessions idle for longer than the TTL."""
+
+
+class InProcessStateBackend(StateBackend):
+    """Sessions kept in this process's memory. Only correct with a single worker."""
+    name = "memory"
+
+    def __init__(self, ttl: float = STATE_SESSION_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._sessions = {}  # key -> (GlobalState, last used)
+
+    def load(self, key: str) -> GlobalState:
+        with self._lock:
+            entry = self._sessions.get(key)
+            session_state = entry[0] if entry else new_state()
+            self._sessions[key] = (session_state, time.monotonic())
+            return session_state
+
+    def save(self, key: str, session_state: GlobalState) -> None:
+        with self._lock:
+            self._sessions[key] = (session_state, time.monotonic())
+
+    def evict_idle(self) -> None:
+        cutoff = time.monotonic() - self.ttl
+        with self._lock:
+            idle = [key for key, (_, used) in self._sessions.items() if used < cutoff]
+            evicted = [self._sessions.pop(key)[0] for key in idle]
+        for session_state in evicted:
+            _close_transient(session_state)
+
+
+class SQLiteParquetStateBackend(StateBackend):
+    """
+    Sessions shared by all worker processes on one host.
+
+    A SQLite database holds each session's JSON metadata and a version number; every
+    table is a Parquet file under `root`. Workers keep the states they loaded in
+    memory and only re-read the files when another worker bumped the version, so
+    tables (and the duckdb views and profiles built on them) are reused between
+    requests. A table is rewritten only when its entry was replaced. Parquet files
+    are opened lazily through the memory governor: a table is only read when used.
+    """
+    name = "sqlite"
+
+    def __init__(self, root: str, ttl: float = STATE_SESSION_TTL):
+        self.root = root
+        self.ttl = ttl
+        os.makedirs(root, exist_ok=True)
+        self._db_path = os.path.join(root, "sessions.db")
+        self._lock = threading.Lock()
+        self._local = {}  # key -> dict(state, version, files: [(weakref to table, path)], fingerprint, used)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "session_key TEXT PRIMARY KEY, version INTEGER NOT NULL, meta TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self._db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _session_dir(self, key: str) -> str:
+        return os.path.join(self.root, hashlib.sha256(key.encode("utf-8")).hexdigest()[:32])
+
+    @staticmethod
+    def _fingerprint(session_state: GlobalState) -> tuple:
+        """(table entries, metadata JSON) of a state, to skip saving an unchanged session."""
+        meta = {k: session_state.get(k) for k in _META_KEYS}
+        return _table_entries(session_state), json.dumps(meta, default=str, sort_keys=True)
+
+    @staticmethod
+    def _same_fingerprint(a: tuple, b: tuple) -> bool:
+        if a is None or b is None or a[1] != b[1] or len(a[0]) != len(b[0]):
+            return False
+        return all(
+            (kind_a, name_a) == (kind_b, name_b) and ref_a() is not None and ref_a() is ref_b()
+            for (kind_a, name_a, ref_a), (kind_b, name_b, ref_b) in zip(a[0], b[0])
+        )
+
+    def _read_frame(self, path: str):
+        if path.endswith(".pkl"):
+            return get_governor().track(pd.read_pickle(path))
+        # Read on first use; the file stays owned by the store.
+        return get_governor().track_file(path, owned=False)
+
+    def _write_frame(self, table, directory: str) -> str:
+        path = os.path.join(directory, f"{uuid.uuid4().hex}.parquet")
+        try:
+            if hasattr(table, "write_parquet"):
+                table.write_parquet(path)
+            else:
+                table.to_parquet(path, index=False)
+        except Exception as e:
+            # Mixed-type object columns cannot be stored as Parquet; keep them as pickle.
+            logger.info(f"Storing table as pickle instead of Parquet: {e}")
+            if os.path.exists(path):
+                os.remove(path)
+            path = path[:-len(".parquet")] + ".pkl"
+            as_frame(table).to_pickle(path)
+        return path
+
+    def load(self, key: str) -> GlobalState:
+        with self._connect() as conn:
+            row = conn.execute("SELECT version, meta FROM sessions WHERE session_key = ?", (key,)).fetchone()
+        with self._lock:
+            local = self._local.get(key)
+            if local is not None and row is not None and local["version"] == row[0]:
+                local["used"] = time.monotonic()
+                return local["state"]
+            if local is not None and row is None:
+                local["used"] = time.monotonic()
+                return local["state"]
+
+        session_state = new_state()
+        files = []
+        version = 0
+        if row is not None:
+            version, meta = row[0], json.loads(row[1])
+            # Tables another worker did not replace keep their file, and their TableRef here.
+            known = {}
+            if local is not None:
+                for _, _, ref in _table_entries(local["state"]):
+                    path = _path_of(local["files"], ref())
+                    if path is not None:
+                        known[path] = ref()
+            for k in _META_KEYS:
+                if k in meta:
+                    session_state[k] = meta[k]
+            if session_state.get("personal_db"):
+                # Sessions saved before passwords were kept out of the store; the next save drops it.
+                session_state["personal_db"] = {k: v for k, v in session_state["personal_db"].items() if k != "password"}
+            for kind in _TABLE_LISTS:
+                for name, path in meta.get(kind, []):
+                    table = known[path] if path in known else self._read_frame(path)
+                    session_state[kind].append((name, table))
+                    files.append((weakref.ref(table), path))
+            if local is not None:
+                # Keep this worker's live objects and caches; both check which frames they were built on.
+                previous = local["state"]
+                for k in TRANSIENT_KEYS | CACHE_KEYS:
+                    if k in ("personal_engine", "mysql_connection") and previous.get("personal_db") != session_state.get("personal_db"):
+                        continue
+                    if previous.get(k) is not None:
+                        session_state[k] = previous[k]
+            if session_state.get("personal_db") and session_state.get("personal_engine") is None:
+                logger.info(
+                    f"Session {key} connected its personal database in another worker; its loaded tables "
+                    "are used here until /connect_db is called again."
+                )
+        with self._lock:
+            self._local[key] = {
+                "state": session_state,
+                "version": version,
+                "files": files,
+                "fingerprint": self._fingerprint(session_state),
+                "used": time.monotonic(),
+            }
+        return session_state
+
+    def save(self, key: str, session_state: GlobalState) -> None:
+        fingerprint = self._fingerprint(session_state)
+        with self._lock:
+            local = self._local.get(key)
+            if local is None or local["state"] is not session_state:
+                local = {"state": session_state, "version": 0, "files": [], "fingerprint": None}
+                self._local[key] = local
+            local["used"] = time.monotonic()
+            if self._same_fingerprint(local["fingerprint"], fingerprint):
+                return
+            directory = self._session_dir(key)
+            os.makedirs(directory, exist_ok=True)
+            files = []
+            meta = {k: session_state.get(k) for k in _META_KEYS}
+            for kind in _TABLE_LISTS:
+                entries = []
+                for name, table in table_schemas(session_state.get(kind, [])):
+                    path = _path_of(local["files"], table) or _path_of(files, table) or self._write_frame(table, directory)
+                    files.append((weakref.ref(table), path))
+                    entries.append((name, path))
+                meta[kind] = entries
+            with self._connect() as conn:
+                cursor = conn.execute(
+                    "UPDATE sessions SET version = version + 1, meta = ?, updated_at = ? WHERE session_key = ?",
+                    (json.dumps(meta, default=str), time.time(), key),
+                )
+                if cursor.rowcount == 0:
+                    conn.execute(
+                        "INSERT INTO sessions (session_key, version, meta, updated_at) VALUES (?, 1, ?, ?)",
+                        (key, json.dumps(meta, default=str), time.time()),
+                    )
+                version = conn.execute("SELECT version FROM sessions WHERE session_key = ?", (key,)).fetchone()[0]
+            stale = {path for _, path in local["files"]} - {path for _, path in files}
+            local.update(version=version, files=files, fingerprint=fingerprint)
+        for path in stale:
+            # Other workers still holding the old version re-read the new files on their next load.
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def evict_idle(self) -> None:
+        cutoff = time.monotonic() - self.ttl
+        with self._lock:
+            idle = [key for key, local in self._local.items() if local["used"] < cutoff]
+            evicted = [self._local.pop(key)["state"] for key in idle]
+        for session_state in evicted:
+            _close_transient(session_state)
+
+
+def create_state_backend(backend: str = STATE_BACKEND, root: str = STATE_DIR) -> StateBackend:
+    backend = (backend or "memory").lower()
+    if backend == "memory":
+        return InProcessStateBackend()
+    if backend == "sqlite":
+        return SQLiteParquetStateBackend(root)
+    raise ValueError(f"Unknown STATE_BACKEND '{backend}'. Use memory or sqlite.")
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_state_backend() -> StateBackend:
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = create_state_backend()
+            logger.info(f"Using '{_backend.name}' session state backend.")
+        return _backend
+
+
+def _user_id_from_headers(headers: dict):
+    authorization = headers.get(b"authorization", b"").decode("latin-1")
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    from jose import JWTError, jwt
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        # Rejected later by get_current_user where the endpoint requires a login.
+        return None
+    return payload.get("user_id") or payload.get("sub")
+
+
+class SessionStateMiddleware:
+    """
+    Pure ASGI middleware that binds `app.state.state` to the caller's session for the
+    duration of a request. Sessions are keyed by the user id in the bearer token and
+    the optional X-Session-ID header, so one user can keep several independent
+    sessions (e.g. browser tabs). Anonymous callers without the header get a new
+    random session id in the X-Session-ID response header and keep their session by
+    sending it back; they never share one. The state is saved when the response
+    starts, before the client can send its next request, and once more when the
+    request finishes.
+    """
+    def __init__(self, app, backend: StateBackend = None):
+        self.app = app
+        self.backend = backend
+        self._requests = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope.get("path") in _STATELESS_PATHS:
+            await self.app(scope, receive, send)
+            return
+        backend = self.backend or get_state_backend()
+        headers = dict(scope.get("headers") or [])
+        session_id = headers.get(SESSION_HEADER, b"").decode("latin-1").strip()[:128] or None
+        user_id = _user_id_from_headers(headers)
+        issued = user_id is None and session_id is None
+        if issued:
+            session_id = uuid.uuid4().hex
+        key = session_key(user_id, session_id)
+        session_state = await anyio.to_thread.run_sync(backend.load, key)
+
+        async def send_and_save(message):
+            if message["type"] == "http.response.start":
+                if issued:
+                    message = dict(message, headers=list(message.get("headers", [])) + [(SESSION_HEADER, session_id.encode("latin-1"))])
+                await anyio.to_thread.run_sync(backend.save, key, session_state)
+            await send(message)
+
+        with use_state(session_state):
+            try:
+                await self.app(scope, receive, send_and_save)
+            finally:
+                await anyio.to_thread.run_sync(backend.save, key, session_state)
+                self._requests += 1
+                if self._requests % 100 == 0:
+                    await anyio.to_thread.run_sync(backend.evict_idle)
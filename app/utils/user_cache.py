@@ -0,0 +1,59 @@
+# app/utils/user_cache.py
+import threading
+import time
+from collections import OrderedDict
+from app.config import USER_CACHE_SIZE, USER_CACHE_TTL
+from app.models import User
+
+# Columns copied into the cache; the User objects handed out are built from these.
+# The password hash is left out: only /login needs it, and it reads the user from the database.
+_USER_COLUMNS = ("id", "email", "username", "dynamic_db", "created_at")
+
+
+class UserCache:
+    """
+    In-process cache of authenticated users keyed by user_id, so get_current_user
+    does not query the central database on every request.
+
+    Entries are plain column values and every get() returns a new, session-less User,
+    so requests never share (or accidentally persist) one ORM object. Changes to a
+    user must go through the database and invalidate() the entry.
+    """
+    def __init__(self, ttl: float = USER_CACHE_TTL, max_entries: int = USER_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # user_id -> (expires_at, column values)
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            item = self._entries.get(user_id)
+            if item is None:
+                return None
+            if item[0] < time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            values = item[1]
+        return User(**values)
+
+    def put(self, user: User) -> None:
+        if not self.ttl or not self.max_entries:
+            return
+        values = {column: getattr(user, column) for column in _USER_COLUMNS}
+        with self._lock:
+            self._entries[user.id] = (time.monotonic() + self.ttl, values)
+            self._entries.move_to_end(user.id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id) -> None:
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+user_cache = UserCache()
@@ -0,0 +1,68 @@
+# app/utils/warmup.py
+import logging
+import threading
+import time
+from app.config import QUERY_HINTS_MODE
+
+logger = logging.getLogger("warmup")
+logger.setLevel(logging.INFO)
+
+
+def _load_duckdb():
+    import duckdb
+    duckdb.connect(database=":memory:").close()
+
+
+def _load_sqlglot():
+    import sqlglot
+    sqlglot.parse_one("SELECT 1", read="mysql")
+
+
+def _load_llm_backend():
+    from app.utils.llm_gateway import get_llm
+    get_llm().warm_up()
+
+
+def _load_database_engine():
+    from app.database import get_engine
+    get_engine()
+
+
+def _load_spacy():
+    from app.utils.cleaning import get_nlp_model
+    get_nlp_model()
+
+
+def warm_up() -> dict:
+    """
+    Preload the heavy modules and clients that are otherwise created on first use.
+    A failing step is only logged: warm-up must never take the server down.
+
+    Returns:
+        dict: Seconds spent per step.
+    """
+    steps = [
+        ("llm_backend", _load_llm_backend),
+        ("duckdb", _load_duckdb),
+        ("sqlglot", _load_sqlglot),
+        ("database_engine", _load_database_engine),
+    ]
+    if QUERY_HINTS_MODE != "fast":
+        steps.append(("spacy", _load_spacy))
+    timings = {}
+    for name, step in steps:
+        start = time.perf_counter()
+        try:
+            step()
+        except Exception as e:
+            logger.warning(f"Warm-up step '{name}' failed: {e}")
+        timings[name] = round(time.perf_counter() - start, 3)
+    logger.info(f"Warm-up finished: {timings}")
+    return timings
+
+
+def start_background_warm_up() -> threading.Thread:
+    """Run warm_up() in a daemon thread so requests are served while it runs."""
+    thread = threading.Thread(target=warm_up, name="warm-up", daemon=True)
+    thread.start()
+    return thread
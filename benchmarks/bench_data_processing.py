@@ -0,0 +1,156 @@
+# benchmarks/bench_data_processing.py
+"""
+Time and peak memory of the data-processing hot paths on synthetic uploads.
+
+Each function runs on seeded tables from benchmarks/synthetic_data.py (tall and wide,
+10k/100k/1M rows). Timings are the median of --repeat calls; peak memory comes from
+one extra call under tracemalloc, which is not timed because tracing slows Python code
+down. Pandas and numpy report their buffers to tracemalloc, so the peak includes them.
+Use --save to store a baseline and --baseline to compare against it; the run exits
+with status 1 when a function got slower (or hungrier) than the tolerance allows.
+
+Run from the repository root:
+    python -m benchmarks.bench_data_processing --sizes 10k,100k --save benchmarks/data_processing_baseline.json
+    python -m benchmarks.bench_data_processing --sizes 10k,100k --baseline benchmarks/data_processing_baseline.json
+The 1M-row tables take minutes per function; add them with --sizes 10k,100k,1m.
+"""
+import argparse
+import gc
+import importlib
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+from benchmarks.synthetic_data import SHAPES, make_table, parse_size, split_sheets
+
+# name: (module, function, input built from the table)
+FUNCTIONS = {
+    "validate_data": ("app.utils.cleaning", "validate_data", "frame_and_name"),
+    "clean_data": ("app.utils.cleaning", "clean_data", "frame"),
+    "rename_case_conflict_columns": ("app.utils.cleaning", "rename_case_conflict_columns", "frame_copy"),
+    "are_sheets_related": ("app.utils.data_processing", "are_sheets_related", "sheets"),
+    "get_data_preview": ("app.utils.data_processing", "get_data_preview", "frame"),
+    "generate_detailed_overview_in_memory": ("app.utils.data_processing", "generate_detailed_overview_in_memory", "table_list"),
+}
+
+
+def load_function(name: str):
+    module, attribute, _ = FUNCTIONS[name]
+    return getattr(importlib.import_module(module), attribute)
+
+
+def make_args(name: str, df) -> tuple:
+    """Arguments of one call; built outside the timed section."""
+    kind = FUNCTIONS[name][2]
+    if kind == "frame_copy":
+        # rename_case_conflict_columns assigns df.columns; a shallow copy keeps the table intact.
+        return (df.copy(deep=False),)
+    if kind == "sheets":
+        return (split_sheets(df),)
+    if kind == "table_list":
+        return ([("orders", df)],)
+    if kind == "frame_and_name":
+        return (df, "orders.csv")
+    return (df,)
+
+
+def measure(fn, args_factory, repeat: int, memory: bool = True) -> dict:
+    timings = []
+    for _ in range(repeat):
+        args = args_factory()
+        gc.collect()
+        start = time.perf_counter()
+        fn(*args)
+        timings.append(time.perf_counter() - start)
+    result = {"seconds": statistics.median(timings), "min_seconds": min(timings)}
+    if memory:
+        args = args_factory()
+        gc.collect()
+        tracemalloc.start()
+        try:
+            fn(*args)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        result["peak_mb"] = peak / 2**20
+    return result
+
+
+def change(value: float, base: float) -> str:
+    return f"{(value / base - 1) * 100:+.0f}%" if base else "-"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10k,100k", help="comma-separated row counts: 10k, 100k, 1m or numbers")
+    parser.add_argument("--shapes", default=",".join(SHAPES), help="comma-separated shapes: tall, wide")
+    parser.add_argument("--functions", default=",".join(FUNCTIONS), help="comma-separated functions to measure")
+    parser.add_argument("--repeat", type=int, default=3, help="timed calls per function and table")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc run")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare against results saved with --save")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown per function (0.2 = 20%%)")
+    parser.add_argument("--memory-tolerance", type=float, default=0.1, help="allowed growth of peak memory (0.1 = 10%%)")
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.functions.split(",") if name.strip()]
+    unknown = [name for name in names if name not in FUNCTIONS]
+    if unknown:
+        parser.error(f"unknown functions: {', '.join(unknown)} (choose from {', '.join(FUNCTIONS)})")
+    shapes = [shape.strip() for shape in args.shapes.split(",") if shape.strip()]
+    sizes = [size.strip().lower() for size in args.sizes.split(",") if size.strip()]
+    functions = {name: load_function(name) for name in names}
+
+    baseline = {}
+    if args.baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    results = {}
+    regressions = []
+    print(f"{'function':<38} {'shape':<5} {'rows':>8} {'median ms':>10} {'peak MB':>8} {'baseline':>9} {'change':>7}")
+    for shape in shapes:
+        for size in sizes:
+            start = time.perf_counter()
+            df = make_table(parse_size(size), shape=shape, seed=args.seed)
+            print(f"# {shape} {size}: {df.shape[0]} rows x {df.shape[1]} columns, built in {time.perf_counter() - start:.1f} s")
+            for name, fn in functions.items():
+                key = f"{name}/{shape}/{size}"
+                result = measure(fn, lambda name=name, df=df: make_args(name, df), args.repeat, memory=not args.no_memory)
+                results[key] = result
+                base = baseline.get(key, {})
+                peak = f"{result['peak_mb']:.1f}" if "peak_mb" in result else "-"
+                base_ms = f"{base['seconds'] * 1000:.0f}" if "seconds" in base else "-"
+                print(
+                    f"{name:<38} {shape:<5} {df.shape[0]:>8} {result['seconds'] * 1000:>10.1f} {peak:>8} "
+                    f"{base_ms:>9} {change(result['seconds'], base.get('seconds', 0)):>7}"
+                )
+                if "seconds" in base and result["seconds"] > base["seconds"] * (1 + args.tolerance):
+                    regressions.append(f"{key}: {result['seconds'] * 1000:.0f} ms vs {base['seconds'] * 1000:.0f} ms")
+                if "peak_mb" in base and "peak_mb" in result and result["peak_mb"] > base["peak_mb"] * (1 + args.memory_tolerance):
+                    regressions.append(f"{key}: peak {result['peak_mb']:.1f} MB vs {base['peak_mb']:.1f} MB")
+            del df
+            gc.collect()
+
+    if args.save:
+        # Entries of other sizes/shapes already in the file are kept.
+        saved = {}
+        if os.path.exists(args.save):
+            with open(args.save) as f:
+                saved = json.load(f)
+        saved.update(results)
+        with open(args.save, "w") as f:
+            json.dump(saved, f, indent=1, sort_keys=True)
+    if regressions:
+        print(f"Regressions against {args.baseline}:")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
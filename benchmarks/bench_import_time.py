@@ -0,0 +1,86 @@
+# benchmarks/bench_import_time.py
+"""
+Startup cost of importing the app (what every worker pays before serving).
+
+Runs `python -X importtime -c "import app.main"` in fresh interpreters and reports
+the total import time plus the top-level packages (pandas, sqlalchemy, fastapi, app,
+...) that take the most time themselves, i.e. summed over all of their modules. Use --save to store a
+baseline and --baseline to compare against it.
+
+Run from the repository root:
+    python -m benchmarks.bench_import_time --runs 5 --baseline benchmarks/import_baseline.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+
+def measure_once(module: str) -> dict:
+    """
+    Return {top-level package: microseconds spent in its own modules} plus "<total>"
+    (the cumulative time of the top-level imports) for one cold import. Self times
+    are used per package because everything nests under `app`: cumulative times
+    would put every dependency's cost on `app`.
+    """
+    env = dict(os.environ, WARMUP_ENABLED="false")
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, env=env,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{proc.stderr[-2000:]}")
+    packages = defaultdict(int)
+    total = 0
+    for line in proc.stderr.splitlines():
+        # Format: "import time:   self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative, raw_name = line[len("import time:"):].split("|")
+        packages[raw_name.strip().split(".")[0]] += int(self_us)
+        # Nested imports are indented by two spaces per level after the single space
+        # that follows "|"; only top-level entries add up to the total.
+        if len(raw_name) - len(raw_name.lstrip()) <= 1:
+            total += int(cumulative)
+    packages["<total>"] = total
+    return dict(packages)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--save", help="write the median timings to this JSON file")
+    parser.add_argument("--baseline", help="compare against timings saved with --save")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown of the total (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    runs = [measure_once(args.module) for _ in range(args.runs)]
+    names = set().union(*runs)
+    median = {name: statistics.median(run.get(name, 0) for run in runs) for name in names}
+
+    baseline = {}
+    if args.baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    print(f"import {args.module}: {median['<total>'] / 1000:.0f} ms (median of {args.runs})")
+    print(f"{'package':<28} {'ms':>8} {'baseline':>9}")
+    for name, value in sorted(median.items(), key=lambda item: item[1], reverse=True)[:args.top + 1]:
+        base = f"{baseline[name] / 1000:.0f}" if name in baseline else "-"
+        print(f"{name:<28} {value / 1000:>8.0f} {base:>9}")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(median, f, indent=1, sort_keys=True)
+    if baseline and median["<total>"] > baseline["<total>"] * (1 + args.tolerance):
+        print(f"Import time regressed by more than {args.tolerance:.0%} against {args.baseline}.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
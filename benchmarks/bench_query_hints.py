@@ -0,0 +1,68 @@
+# benchmarks/bench_query_hints.py
+"""
+Per-request cost of the optimization hints in suggest_query_optimizations.
+
+"rich" is the previous behaviour (full en_core_web_sm pipeline per query),
+"tokenizer" runs only the spaCy tokenizer and "fast" is the regex keyword path.
+
+Run from the repository root:
+    python -m benchmarks.bench_query_hints --repeat 2000
+"""
+import argparse
+import statistics
+import time
+
+from app.utils.sql_helpers import suggest_query_optimizations
+
+QUERIES = [
+    "What is the average sales by region for the last period?",
+    "Show total admission of Bhopal district",
+    "Combine orders and customers and sort by order date",
+    "List the top 10 products by revenue",
+    "How many customers joined each month in 2024?",
+]
+SQL = "SELECT * FROM sales;"
+
+
+def time_mode(mode: str, nlp_model, repeat: int) -> list:
+    timings = []
+    for i in range(repeat):
+        query = QUERIES[i % len(QUERIES)]
+        start = time.perf_counter()
+        suggest_query_optimizations(SQL, query, "", nlp_model, mode=mode)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=1000, help="calls per mode")
+    parser.add_argument("--modes", default="fast,tokenizer,rich", help="comma-separated modes to measure")
+    args = parser.parse_args()
+
+    nlp_model = None
+    modes = args.modes.split(",")
+    if any(mode != "fast" for mode in modes):
+        start = time.perf_counter()
+        from app.utils.cleaning import NLP_MODEL as nlp_model
+        print(f"spaCy model load: {(time.perf_counter() - start) * 1000:.0f} ms (paid once, not per request)")
+
+    # The hints must not change between modes.
+    for query in QUERIES:
+        expected = suggest_query_optimizations(SQL, query, "", nlp_model, mode="rich")[1] if nlp_model else None
+        actual = suggest_query_optimizations(SQL, query, "", nlp_model, mode="fast")[1]
+        if expected is not None and expected != actual:
+            print(f"WARNING: hints differ for {query!r}: rich={expected} fast={actual}")
+
+    print(f"{'mode':<10} {'mean (us)':>10} {'p50 (us)':>10} {'p95 (us)':>10}")
+    for mode in modes:
+        timings = sorted(time_mode(mode, nlp_model, args.repeat))
+        p95 = timings[int(len(timings) * 0.95) - 1]
+        print(
+            f"{mode:<10} {statistics.mean(timings) * 1e6:>10.1f} "
+            f"{statistics.median(timings) * 1e6:>10.1f} {p95 * 1e6:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,378 @@
+# benchmarks/load_test.py
+"""
+How many concurrent /upload, /execute_query and /chart/chart users one worker sustains.
+
+Boots app.main:app in this process and drives it through httpx's ASGI transport, so
+no port, network or external service is involved (it runs on an offline CI box):
+  - the central database and every user's dynamic database are SQLite files in a
+    temporary directory (DATABASE_URI, DYNAMIC_DATABASE_URL),
+  - the LLM is the rule-based stub backend, optionally with a simulated latency,
+  - uploaded files are seeded synthetic tables from benchmarks/synthetic_data.py.
+
+Every virtual user signs up, uploads a CSV and saves it once before measuring. Each
+phase then replays a request mix for --duration seconds: by default one phase per
+endpoint on its own (which isolates its memory growth) and one with the whole mix.
+The report has throughput, p50/p95/p99 latency and errors per endpoint and the
+worker's resident memory (RSS) growth per phase. Uploads are followed by clean_file
+or cancel_clean, as in the UI. Memory of CPU pool processes is not included; set
+CPU_POOL_WORKERS=0 to keep that work in the measured process.
+
+Some failures do not show in the status codes: an upload whose validation or
+cleaning summary raises still answers 200 and only logs the error. The report also
+counts these stage errors (the growth of app_stage_errors_total per stage during the
+phase), and they count towards --max-error-rate like failed requests.
+
+Needs httpx (python -m pip install -r benchmarks/requirements.txt). Run from the
+repository root:
+    python -m benchmarks.load_test --users 20 --duration 30
+    python -m benchmarks.load_test --users 50 --mix read-heavy --llm-latency-ms 800 --save benchmarks/load_baseline.json
+    python -m benchmarks.load_test --users 50 --mix read-heavy --llm-latency-ms 800 --baseline benchmarks/load_baseline.json
+"""
+import argparse
+import asyncio
+import gc
+import json
+import math
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter
+
+# Relative weights of the operations in each preset mix.
+MIXES = {
+    "read-heavy": {"execute_query": 60, "chart": 35, "upload": 5},
+    "balanced": {"execute_query": 45, "chart": 35, "upload": 20},
+    "upload-heavy": {"execute_query": 25, "chart": 15, "upload": 60},
+}
+OPERATIONS = ("upload", "execute_query", "chart")
+
+# Questions about the synthetic orders table; the last two go through SUMMARY/ANALYSIS.
+QUERIES = [
+    "What is the total amount by country?",
+    "Average quantity per category",
+    "Show the top 5 city by amount",
+    "What is the highest amount?",
+    "How many orders per city?",
+    "Give me a summary of the orders",
+    "Analyze trends in the amount",
+]
+CHART_QUERIES = [
+    "total amount by category",
+    "average amount by country",
+    "total quantity by city",
+]
+
+
+def parse_mix(mix: str) -> dict:
+    """A preset name or "operation=weight,..." (e.g. "execute_query=5,chart=3,upload=1")."""
+    if mix in MIXES:
+        return dict(MIXES[mix])
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise ValueError(f"Unknown operation '{name}' in mix. Use: {', '.join(OPERATIONS)}.")
+        weights[name] = float(weight or 1)
+    return {name: weight for name, weight in weights.items() if weight > 0}
+
+
+def configure_environment(workdir: str, args) -> None:
+    """Point the app at the local stand-ins; must run before anything from app is imported."""
+    os.makedirs(os.path.join(workdir, "dynamic"), exist_ok=True)
+    os.environ.update({
+        "DATABASE_URI": "sqlite:///" + os.path.join(workdir, "central.sqlite"),
+        "DYNAMIC_DATABASE_URL": "sqlite:///" + os.path.join(workdir, "dynamic", "{database}.sqlite"),
+        "LLM_BACKEND": "stub",
+        "LLM_STUB_LATENCY_MS": str(args.llm_latency_ms),
+        # "mysql" makes /execute_query read the copy saved in the dynamic (here SQLite) database.
+        "FILE_QUERY_ENGINE": "duckdb" if args.query_engine == "duckdb" else "mysql",
+        "STATE_BACKEND": "memory",
+        "SPILL_DIR": os.path.join(workdir, "spill"),
+        "WARMUP_ENABLED": "false",
+    })
+    if args.no_result_cache:
+        os.environ["RESULT_CACHE_SIZE"] = "0"
+
+
+def rss_bytes() -> int:
+    """Resident memory of this process (0 where it cannot be read)."""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(0, math.ceil(q * len(sorted_values)) - 1)]
+
+
+def is_error(status) -> bool:
+    # 304 is a successful revalidation; non-integer statuses are client-side exceptions.
+    return not isinstance(status, int) or status >= 400
+
+
+class Recorder:
+    """Latencies and statuses per endpoint during one phase."""
+    def __init__(self):
+        self.latencies = {}
+        self.statuses = {}
+
+    def record(self, endpoint: str, seconds: float, status) -> None:
+        self.latencies.setdefault(endpoint, []).append(seconds)
+        self.statuses.setdefault(endpoint, Counter())[status] += 1
+
+
+class VirtualUser:
+    """One signed-up user with its own session, dynamic database and uploaded table."""
+    def __init__(self, client, index: int, csv_bytes: bytes, seed: int):
+        self.client = client
+        self.index = index
+        self.csv_bytes = csv_bytes
+        self.rng = random.Random(seed)
+        self.headers = {}
+
+    async def sign_up(self) -> None:
+        response = await self.client.post("/api/auth/signup", json={
+            "email": f"loaduser{self.index}@example.com",
+            "username": f"loaduser{self.index}",
+            "password": "load-test-password",
+        })
+        response.raise_for_status()
+        self.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    async def request(self, recorder, endpoint: str, method: str, url: str, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, headers=self.headers, **kwargs)
+            status = response.status_code
+        except Exception as e:
+            status = type(e).__name__
+        if recorder is not None:
+            recorder.record(endpoint, time.perf_counter() - start, status)
+        return status
+
+    async def upload(self, recorder) -> None:
+        files = {"files": ("orders.csv", self.csv_bytes, "text/csv")}
+        if await self.request(recorder, "upload", "POST", "/api/upload", files=files) != 200:
+            return
+        # The UI confirms or cancels cleaning after every upload; both save the table.
+        endpoint = "clean_file" if self.rng.random() < 0.5 else "cancel_clean"
+        await self.request(recorder, endpoint, "POST", f"/api/{endpoint}", params={"table_name": "orders"})
+
+    async def execute_query(self, recorder) -> None:
+        await self.request(recorder, "execute_query", "POST", "/api/execute_query", json={"query": self.rng.choice(QUERIES)})
+
+    async def chart(self, recorder) -> None:
+        body = {"query": self.rng.choice(CHART_QUERIES), "chart_type": "bar"}
+        await self.request(recorder, "chart", "POST", "/chart/chart", json=body)
+
+
+def stage_error_counts() -> dict:
+    """stage -> app_stage_errors_total of this process."""
+    from app.utils.metrics import STAGE_ERRORS
+    return {labels[0]: count for labels, count in STAGE_ERRORS.snapshot().items()}
+
+
+async def run_phase(users: list, weights: dict, duration: float, max_requests: int, think: float) -> dict:
+    recorder = Recorder()
+    operations = list(weights)
+    cumulative = [weights[name] for name in operations]
+    gc.collect()
+    rss_start = rss_bytes()
+    errors_start = stage_error_counts()
+    start = time.perf_counter()
+    deadline = start + duration
+
+    async def drive(user):
+        done = 0
+        while time.perf_counter() < deadline and (not max_requests or done < max_requests):
+            operation = user.rng.choices(operations, weights=cumulative)[0]
+            await getattr(user, operation)(recorder)
+            done += 1
+            if think:
+                await asyncio.sleep(think)
+
+    await asyncio.gather(*(drive(user) for user in users))
+    elapsed = time.perf_counter() - start
+    stage_errors = {
+        stage: int(count - errors_start.get(stage, 0))
+        for stage, count in sorted(stage_error_counts().items()) if count > errors_start.get(stage, 0)
+    }
+    gc.collect()
+    return {"elapsed": elapsed, "rss_start": rss_start, "rss_end": rss_bytes(), "recorder": recorder, "stage_errors": stage_errors}
+
+
+def summarize(phase: dict) -> dict:
+    """{endpoint: stats} plus "<all>" for the whole phase; latencies in milliseconds."""
+    recorder, elapsed = phase["recorder"], phase["elapsed"]
+    summary = {}
+    everything, all_statuses = [], Counter()
+    for endpoint, latencies in sorted(recorder.latencies.items()):
+        statuses = recorder.statuses[endpoint]
+        everything.extend(latencies)
+        all_statuses.update(statuses)
+        summary[endpoint] = _stats(sorted(latencies), statuses, elapsed)
+    summary["<all>"] = _stats(sorted(everything), all_statuses, elapsed)
+    summary["<all>"]["rss_start_mb"] = phase["rss_start"] / 2**20
+    summary["<all>"]["rss_growth_mb"] = (phase["rss_end"] - phase["rss_start"]) / 2**20
+    summary["<all>"]["stage_errors"] = phase["stage_errors"]
+    return summary
+
+
+def _stats(latencies: list, statuses: Counter, elapsed: float) -> dict:
+    return {
+        "requests": len(latencies),
+        "errors": sum(count for status, count in statuses.items() if is_error(status)),
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "max_ms": (latencies[-1] if latencies else 0.0) * 1000,
+        "statuses": {str(status): count for status, count in sorted(statuses.items(), key=lambda item: str(item[0]))},
+    }
+
+
+async def run(args, weights: dict) -> dict:
+    import httpx
+    from app.database import get_engine
+    from app.main import app
+    from app.models import Base
+    from benchmarks.synthetic_data import make_table
+
+    Base.metadata.create_all(get_engine())
+    summaries = {}
+    # Runs the app's startup and shutdown handlers, as uvicorn would.
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://load-test", timeout=None) as client:
+            users = []
+            start = time.perf_counter()
+            for index in range(args.users):
+                csv_bytes = make_table(args.rows, seed=args.seed + index).to_csv(index=False).encode("utf-8")
+                user = VirtualUser(client, index, csv_bytes, seed=args.seed + index)
+                await user.sign_up()
+                await user.upload(None)
+                users.append(user)
+            print(f"Set up {len(users)} users with {args.rows}-row tables in {time.perf_counter() - start:.1f} s")
+
+            think = args.think_ms / 1000
+            if args.warmup:
+                await run_phase(users, weights, args.warmup, 0, think)
+            phases = []
+            if "isolated" in args.phases:
+                phases.extend((operation, {operation: 1}) for operation in weights)
+            if "mixed" in args.phases:
+                phases.append(("mixed", weights))
+            for name, phase_weights in phases:
+                phase = await run_phase(users, phase_weights, args.duration, args.requests, think)
+                summaries[name] = summarize(phase)
+                print_phase(name, summaries[name], phase["elapsed"])
+    return summaries
+
+
+def print_phase(name: str, summary: dict, elapsed: float) -> None:
+    total = summary["<all>"]
+    print(
+        f"\n[{name}] {total['requests']} requests in {elapsed:.1f} s ({total['rps']:.1f} req/s), "
+        f"RSS {total['rss_start_mb']:.0f} MB, growth {total['rss_growth_mb']:+.1f} MB"
+    )
+    print(f"{'endpoint':<14} {'requests':>8} {'errors':>6} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}  statuses")
+    for endpoint, stats in summary.items():
+        if endpoint == "<all>":
+            continue
+        statuses = " ".join(f"{status}x{count}" for status, count in stats["statuses"].items())
+        print(
+            f"{endpoint:<14} {stats['requests']:>8} {stats['errors']:>6} {stats['rps']:>7.1f} {stats['p50_ms']:>8.0f} "
+            f"{stats['p95_ms']:>8.0f} {stats['p99_ms']:>8.0f} {stats['max_ms']:>8.0f}  {statuses}"
+        )
+    if total["stage_errors"]:
+        print("stage errors:  " + " ".join(f"{stage}={count}" for stage, count in total["stage_errors"].items()))
+
+
+def compare(summaries: dict, baseline: dict, tolerance: float) -> list:
+    """Endpoints whose p95 latency rose, or throughput fell, by more than tolerance."""
+    regressions = []
+    for phase, summary in summaries.items():
+        for endpoint, stats in summary.items():
+            base = baseline.get(phase, {}).get(endpoint)
+            if not base:
+                continue
+            if base["p95_ms"] and stats["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+                regressions.append(f"{phase}/{endpoint}: p95 {stats['p95_ms']:.0f} ms vs {base['p95_ms']:.0f} ms")
+            if base["rps"] and stats["rps"] < base["rps"] * (1 - tolerance):
+                regressions.append(f"{phase}/{endpoint}: {stats['rps']:.1f} req/s vs {base['rps']:.1f} req/s")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20, help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=30, help="seconds per phase")
+    parser.add_argument("--requests", type=int, default=0, help="stop each user after this many operations per phase (0: no limit)")
+    parser.add_argument("--warmup", type=float, default=5, help="seconds of unrecorded traffic before the first phase")
+    parser.add_argument("--mix", default="balanced", help=f"{', '.join(MIXES)} or weights like execute_query=5,chart=3,upload=1")
+    parser.add_argument("--phases", default="isolated,mixed", help="isolated (one per operation) and/or mixed")
+    parser.add_argument("--rows", type=int, default=2000, help="rows of each user's uploaded table")
+    parser.add_argument("--think-ms", type=float, default=0, help="pause between a user's requests")
+    parser.add_argument("--llm-latency-ms", type=float, default=0, help="simulated latency of every LLM call")
+    parser.add_argument("--query-engine", choices=("duckdb", "dynamic"), default="duckdb",
+                        help="run /execute_query on duckdb or on the SQLite stand-in of the dynamic database")
+    parser.add_argument("--no-result-cache", action="store_true", help="disable the query/chart result cache")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", help="keep the databases here instead of a temporary directory")
+    parser.add_argument("--save", help="write the per-phase results to this JSON file")
+    parser.add_argument("--baseline", help="compare against results saved with --save")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p95/throughput change (0.25 = 25%%)")
+    parser.add_argument("--max-error-rate", type=float, default=0.01, help="fail when more requests than this fraction error")
+    args = parser.parse_args()
+    try:
+        weights = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="load-test-")
+    configure_environment(workdir, args)
+    try:
+        summaries = asyncio.run(run(args, weights))
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(summaries, f, indent=1, sort_keys=True)
+    failures = []
+    baseline = {}
+    if args.baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    failures.extend(compare(summaries, baseline, args.tolerance))
+    for phase, summary in summaries.items():
+        total = summary["<all>"]
+        if total["requests"] and total["errors"] / total["requests"] > args.max_error_rate:
+            failures.append(f"{phase}: {total['errors']} of {total['requests']} requests failed")
+        stage_errors = sum(total.get("stage_errors", {}).values())
+        if total["requests"] and stage_errors / total["requests"] > args.max_error_rate:
+            failures.append(f"{phase}: {stage_errors} stage errors logged in {total['requests']} requests")
+    if failures:
+        print("\nFailed checks:")
+        for line in failures:
+            print(f"  {line}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
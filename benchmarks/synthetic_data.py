@@ -0,0 +1,171 @@
+# benchmarks/synthetic_data.py
+"""
+Seeded synthetic tables that look like the uploads the cleaning code sees: mixed
+dtypes, dirty phone/email/country/date columns, "None"/"null" strings, blank rows,
+duplicate rows and case-conflicting column names ("Notes" and "notes").
+
+The same (rows, shape, seed) always gives the same frame, so timings can be compared
+between runs and commits. Everything is generated with numpy/pandas vector
+operations, so even the 1M-row tables take seconds to build.
+
+    from benchmarks.synthetic_data import make_table
+    df = make_table(100_000, shape="wide", seed=0)
+"""
+import numpy as np
+import pandas as pd
+
+SIZES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+# "tall": ~15 columns; "wide": the same rows plus WIDE_GROUPS groups of extra columns.
+SHAPES = ("tall", "wide")
+WIDE_GROUPS = 10
+
+DUPLICATE_FRACTION = 0.02
+BLANK_FRACTION = 0.005
+
+COUNTRIES = np.array([
+    "India", "india", " INDIA ", "India.", "United States", "united states", "U.S.A.", "USA",
+    "Germany", "germany ", "DE", "Brazil", "brazil!", "None",
+], dtype=object)
+CITIES = np.array(["Bhopal", "bhopal", "Indore ", "Pune", "Berlin", "Austin", "São Paulo", "null"], dtype=object)
+CATEGORIES = np.array(["Electronics", "electronics ", "Grocery", "GROCERY", "Toys", "None", "null", ""], dtype=object)
+DOMAINS = np.array(["example.com", "mail.test", "corp.example.org"], dtype=object)
+NOTES = np.array(["", "call back", "Call back ", "VIP", "vip", "None", "paid in cash", "refund requested"], dtype=object)
+
+
+def parse_size(size: str) -> int:
+    """Row count of a size name from SIZES ("10k", "100k", "1m") or a plain number."""
+    key = size.strip().lower()
+    return SIZES[key] if key in SIZES else int(key)
+
+
+def _choice(rng, values: np.ndarray, rows: int) -> np.ndarray:
+    return values[rng.integers(0, len(values), rows)]
+
+
+def _with_missing(rng, values, fraction: float) -> np.ndarray:
+    values = np.asarray(values, dtype=object).copy()
+    values[rng.random(len(values)) < fraction] = None
+    return values
+
+
+def _emails(rng, rows: int) -> np.ndarray:
+    users = pd.Series(rng.integers(0, rows * 5, rows)).astype(str)
+    domains = pd.Series(_choice(rng, DOMAINS, rows))
+    emails = ("user" + users + "@" + domains).to_numpy(dtype=object)
+    kind = rng.random(rows)
+    # ~3% without "@", ~3% padded or upper-cased, ~2% missing.
+    broken = kind < 0.03
+    emails[broken] = pd.Series(emails[broken], dtype=object).str.replace("@", " at ", regex=False).to_numpy()
+    padded = (kind >= 0.03) & (kind < 0.06)
+    emails[padded] = (" " + pd.Series(emails[padded], dtype=object).str.upper() + " ").to_numpy()
+    emails[(kind >= 0.06) & (kind < 0.08)] = None
+    return emails
+
+
+def _phones(rng, rows: int) -> np.ndarray:
+    digits = pd.Series(rng.integers(6_000_000_000, 9_999_999_999, rows)).astype(str)
+    area, middle, last = digits.str[:3], digits.str[3:6], digits.str[6:]
+    formats = [
+        digits,                                          # 9876543210
+        "+91 " + digits.str[:5] + " " + digits.str[5:],  # +91 98765 43210
+        "(" + area + ") " + middle + "-" + last,         # (987) 654-3210
+        area + "." + middle + "." + last,                # 987.654.3210
+        area + "-" + middle + "-" + last,                # 987-654-3210
+        digits.str[:5],                                  # too short
+    ]
+    pick = rng.choice(len(formats), rows, p=[0.35, 0.15, 0.15, 0.15, 0.15, 0.05])
+    phones = np.empty(rows, dtype=object)
+    for index, values in enumerate(formats):
+        mask = pick == index
+        phones[mask] = values.to_numpy(dtype=object)[mask]
+    return _with_missing(rng, phones, 0.02)
+
+
+def _dates(rng, rows: int, start: str = "2020-01-01", days: int = 1800) -> np.ndarray:
+    moments = pd.Series(pd.Timestamp(start) + pd.to_timedelta(rng.integers(0, days * 24 * 60, rows), unit="min"))
+    formats = ["%Y-%m-%d", "%d/%m/%Y", "%B %d, %Y", "%Y/%m/%d %H:%M"]
+    pick = rng.choice(len(formats) + 1, rows, p=[0.6, 0.15, 0.1, 0.1, 0.05])
+    dates = np.empty(rows, dtype=object)
+    for index, fmt in enumerate(formats):
+        mask = pick == index
+        dates[mask] = moments[mask].dt.strftime(fmt).to_numpy(dtype=object)
+    dates[pick == len(formats)] = "not a date"
+    return _with_missing(rng, dates, 0.02)
+
+
+def _codes(rng, rows: int) -> np.ndarray:
+    """Mixed-type object column: ints, numeric strings and alphanumeric codes."""
+    numbers = rng.integers(0, 10_000, rows)
+    codes = numbers.astype(object)
+    kind = rng.random(rows)
+    as_text = kind < 0.3
+    codes[as_text] = pd.Series(numbers[as_text]).astype(str).to_numpy(dtype=object)
+    alpha = (kind >= 0.3) & (kind < 0.5)
+    codes[alpha] = ("A" + pd.Series(numbers[alpha]).astype(str)).to_numpy(dtype=object)
+    return codes
+
+
+def _amount_strings(rng, rows: int) -> np.ndarray:
+    """Mostly numeric text ("12.50") with a few "n/a" entries."""
+    values = pd.Series(np.round(rng.gamma(2.0, 20.0, rows), 2)).astype(str).to_numpy(dtype=object)
+    values[rng.random(rows) < 0.05] = "n/a"
+    return _with_missing(rng, values, 0.01)
+
+
+def make_table(rows: int, shape: str = "tall", seed: int = 0) -> pd.DataFrame:
+    """A dirty orders table with `rows` rows (duplicates and blank rows included)."""
+    if shape not in SHAPES:
+        raise ValueError(f"Unknown shape '{shape}'. Use one of: {', '.join(SHAPES)}.")
+    rng = np.random.default_rng(seed)
+    amount = np.round(rng.lognormal(3.5, 1.0, rows), 2)
+    amount[rng.random(rows) < 0.03] = np.nan
+    columns = {
+        "order_id": np.arange(1, rows + 1),
+        "code": _codes(rng, rows),
+        "Customer_Name": _with_missing(rng, pd.Series(rng.integers(0, rows // 3 + 1, rows)).map("customer {}".format), 0.01),
+        "email": _emails(rng, rows),
+        "phone": _phones(rng, rows),
+        "country": _with_missing(rng, _choice(rng, COUNTRIES, rows), 0.02),
+        "city": _choice(rng, CITIES, rows),
+        "category": _choice(rng, CATEGORIES, rows),
+        "order_date": _dates(rng, rows),
+        "ship_date": _dates(rng, rows, start="2020-01-03"),
+        "amount": amount,
+        "discount": _amount_strings(rng, rows),
+        "quantity": rng.integers(1, 50, rows),
+        "is_returned": rng.random(rows) < 0.07,
+        "Notes": _choice(rng, NOTES, rows),
+        "notes": _with_missing(rng, _choice(rng, NOTES, rows), 0.5),
+    }
+    if shape == "wide":
+        for group in range(WIDE_GROUPS):
+            metric = rng.normal(100.0, 15.0, rows)
+            metric[rng.random(rows) < 0.02] = np.nan
+            columns[f"metric_{group}"] = metric
+            columns[f"segment_{group}"] = _choice(rng, CATEGORIES, rows)
+            columns[f"updated_date_{group}"] = _dates(rng, rows, start="2022-01-01", days=700)
+    df = pd.DataFrame(columns)
+
+    # Exact duplicates of other rows and a few completely blank rows: reindexing with
+    # a missing label (-1) yields an all-NaN row and upcasts the columns as a CSV read would.
+    order = np.arange(rows)
+    duplicates = rng.choice(rows, int(rows * DUPLICATE_FRACTION), replace=False)
+    order[duplicates] = rng.integers(0, rows, len(duplicates))
+    order[rng.choice(rows, int(rows * BLANK_FRACTION), replace=False)] = -1
+    return df.reindex(order).reset_index(drop=True)
+
+
+def split_sheets(df: pd.DataFrame, sheets: int = 3) -> dict:
+    """
+    {sheet name: DataFrame} as read from a multi-sheet workbook: interleaved slices of
+    df that share the country/category/city columns (so are_sheets_related finds
+    overlapping values) and keep a few columns of their own.
+    """
+    shared = ["country", "category", "city"]
+    own = [col for col in df.columns if col not in shared]
+    per_sheet = max(1, len(own) // sheets)
+    result = {}
+    for index in range(sheets):
+        columns = shared + own[index * per_sheet:(index + 1) * per_sheet]
+        result[f"Sheet{index + 1}"] = df.iloc[index::sheets][columns].reset_index(drop=True)
+    return result
@@ -0,0 +1,67 @@
+# tests/test_answer_templates.py
+import math
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.utils.answer_templates import detect_aggregate, format_number, is_templatable, render_single_value_answer
+
+
+@pytest.mark.parametrize("value, locale, expected", [
+    (1234567.5, "en_US", "1,234,567.5"),
+    (1234567.5, "en_IN", "12,34,567.5"),
+    (1234567.5, "de_DE", "1.234.567,5"),
+    (1234567.5, "fr_CA", "1\u202f234\u202f567,5"),
+    (12, "en_US", "12"),
+    (-2.005, "en_US", "-2.01"),
+    (Decimal("10.10"), "en_US", "10.1"),
+    (0.1234, "en_US", "0.12"),
+    (0.001234, "en_US", "0.00123"),
+    (0.004, "en_US", "0.004"),
+    (0.0, "en_US", "0"),
+])
+def test_format_number(value, locale, expected):
+    assert format_number(value, locale) == expected
+
+
+@pytest.mark.parametrize("sql, column, expected", [
+    ("SELECT SUM(amount) FROM orders", "SUM(amount)", ("SUM", "amount")),
+    ("SELECT AVG(price) AS avg_price FROM orders", "avg_price", ("AVG", "price")),
+    ("SELECT ROUND(AVG(price), 2) AS p FROM orders", "p", ("AVG", "price")),
+    ("SELECT COUNT(DISTINCT city) FROM orders", "n", ("COUNT_DISTINCT", "city")),
+    ("SELECT SUM(a) / SUM(b) AS ratio FROM orders", "ratio", ("EXPRESSION", None)),
+    ("SELECT MAX(a) - MIN(a) AS total_spread FROM orders", "total_spread", ("EXPRESSION", None)),
+    ("SELECT total_sales FROM orders LIMIT 1", "total_sales", ("SUM", "sales")),
+    ("SELECT city FROM orders LIMIT 1", "city", (None, None)),
+])
+def test_detect_aggregate(sql, column, expected):
+    assert detect_aggregate(sql, column) == expected
+
+
+def test_render_sentence_with_filter_phrase():
+    answer = render_single_value_answer(
+        "What is the total admission of Bhopal district?",
+        "SELECT SUM(admission) FROM hospitals WHERE district = 'Bhopal'", "SUM(admission)", 12345,
+    )
+    assert answer == "The total admission of Bhopal district is 12,345."
+
+
+def test_render_count_uses_the_question_subject():
+    answer = render_single_value_answer("How many orders were returned?", "SELECT COUNT(*) FROM orders WHERE is_returned", "n", 42)
+    assert answer == "The number of orders is 42."
+
+
+def test_compound_expressions_are_not_templated():
+    assert render_single_value_answer("What is the ratio?", "SELECT SUM(a) / SUM(b) FROM t", "ratio", 0.1234) is None
+
+
+@pytest.mark.parametrize("value", [None, math.nan, math.inf, -math.inf, np.float64("nan"), pd.NA, pd.NaT, Decimal("Infinity"), Decimal("NaN")])
+def test_missing_and_infinite_values_are_not_templatable(value):
+    assert not is_templatable(value)
+
+
+@pytest.mark.parametrize("value", [0, 1.5, np.int64(3), Decimal("2.5"), True, "Bhopal", pd.Timestamp("2024-01-01")])
+def test_regular_values_are_templatable(value):
+    assert is_templatable(value)
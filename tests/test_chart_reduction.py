@@ -0,0 +1,72 @@
+# tests/test_chart_reduction.py
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.utils.chart_reduction import lttb_indices, reduce_chart_data, top_n_with_other
+
+
+def test_small_results_are_returned_unchanged():
+    df = pd.DataFrame({"city": ["a", "b"], "amount": [1, 2]})
+    reduced, metadata = reduce_chart_data(df, "bar", 10)
+    assert reduced is df
+    assert metadata["reduced"] is False and metadata["mode"] == "none"
+
+
+def test_lttb_keeps_endpoints_and_spikes():
+    x = np.arange(1000)
+    y = np.zeros(1000)
+    y[500] = 100.0
+    keep = lttb_indices(x, y, 20)
+    assert len(keep) == 20
+    assert keep[0] == 0 and keep[-1] == 999
+    assert 500 in keep
+    assert (np.diff(keep) > 0).all()
+
+
+def test_top_n_folds_the_rest_into_other():
+    df = pd.DataFrame({"category": list("abcdefgh"), "amount": [8, 7, 6, 5, 4, 3, 2, 1]})
+    reduced, folded = top_n_with_other(df, "category", ["amount"], 4)
+    assert list(reduced["category"]) == ["a", "b", "c", "Other"]
+    assert list(reduced["amount"]) == [8, 7, 6, 5 + 4 + 3 + 2 + 1]
+    assert folded == 5
+    assert reduced["amount"].sum() == df["amount"].sum()
+
+
+def test_auto_mode_buckets_dates_by_calendar():
+    dates = pd.date_range("2024-01-01", periods=24 * 60, freq="h")
+    df = pd.DataFrame({"day": dates, "orders": 1})
+    reduced, metadata = reduce_chart_data(df, "bar", 100)
+    assert metadata["mode"] == "time_bucket"
+    assert metadata["bucket"] == "1D"
+    assert len(reduced) == 60
+    assert reduced["orders"].sum() == len(df)
+
+
+def test_line_charts_use_lttb_within_the_budget():
+    df = pd.DataFrame({"x": np.arange(500), "y": np.sin(np.arange(500) / 10)})
+    reduced, metadata = reduce_chart_data(df, "line", 50)
+    assert metadata["mode"] == "lttb"
+    assert len(reduced) == metadata["returned_points"] == 50
+
+
+def test_decimal_measures_are_converted():
+    df = pd.DataFrame({"category": [f"c{i}" for i in range(20)], "amount": [Decimal(i) for i in range(20)]})
+    reduced, metadata = reduce_chart_data(df, "bar", 5)
+    assert metadata["mode"] == "top_n"
+    assert float(reduced["amount"].sum()) == sum(range(20))
+
+
+@pytest.mark.parametrize("mode", ["top_n", "lttb"])
+def test_text_measures_raise_value_error(mode):
+    df = pd.DataFrame({"category": [f"c{i}" for i in range(20)], "amount": ["n/a"] * 20})
+    with pytest.raises(ValueError, match="not numeric"):
+        reduce_chart_data(df, "bar", 5, mode=mode)
+
+
+def test_time_bucket_on_text_dimension_raises_value_error():
+    df = pd.DataFrame({"category": [f"c{i}" for i in range(20)], "amount": range(20)})
+    with pytest.raises(ValueError, match="not a date column"):
+        reduce_chart_data(df, "bar", 5, mode="time_bucket")
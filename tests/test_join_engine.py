@@ -0,0 +1,112 @@
+# tests/test_join_engine.py
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.utils.join_engine import JoinSizeError, build_join_sql, estimate_join_size, hash_join, resolve_columns
+from app.utils.sql_helpers import paginate_sql
+
+
+def make_tables(seed=0, n_left=300, n_right=200, keys=40):
+    rng = np.random.default_rng(seed)
+    left_keys = pd.Series(rng.integers(0, keys, n_left), dtype="float64")
+    left_keys[rng.random(n_left) < 0.05] = np.nan
+    right_keys = pd.Series(rng.integers(keys // 2, keys + keys // 2, n_right), dtype="float64")
+    right_keys[rng.random(n_right) < 0.05] = np.nan
+    orders = pd.DataFrame({"order_id": np.arange(n_left), "customer": left_keys})
+    customers = pd.DataFrame({"customer_id": right_keys, "region": [f"r{i}" for i in range(n_right)]})
+    return orders, customers
+
+
+def reference_join(orders, customers, how):
+    # SQL semantics: NULL keys never match, but unmatched rows are kept by outer joins.
+    left = orders.add_prefix("orders.")
+    right = customers.add_prefix("customers.")
+    merged = left[left["orders.customer"].notna()].merge(
+        right[right["customers.customer_id"].notna()], how="inner",
+        left_on="orders.customer", right_on="customers.customer_id")
+    parts = [merged]
+    if how in ("left", "outer"):
+        parts.append(left[~left["orders.customer"].isin(merged["orders.customer"]) | left["orders.customer"].isna()])
+    if how in ("right", "outer"):
+        parts.append(right[~right["customers.customer_id"].isin(merged["customers.customer_id"]) | right["customers.customer_id"].isna()])
+    result = pd.concat(parts, ignore_index=True)
+    result.columns = [col.split(".", 1)[1] for col in result.columns]
+    return result
+
+
+def canonical(df):
+    columns = sorted(df.columns)
+    return df[columns].astype(str).sort_values(columns).reset_index(drop=True)
+
+
+@pytest.mark.parametrize("join_type", ["INNER JOIN", "LEFT JOIN", "RIGHT JOIN", "FULL OUTER JOIN"])
+def test_pages_reassemble_the_reference_join(join_type):
+    orders, customers = make_tables()
+    how = {"INNER JOIN": "inner", "LEFT JOIN": "left", "RIGHT JOIN": "right", "FULL OUTER JOIN": "outer"}[join_type]
+    expected = reference_join(orders, customers, how)
+
+    pages, offset = [], 0
+    while True:
+        page, metadata = hash_join("orders", orders, "customers", customers, "customer", "customer_id",
+                                   join_type, limit=37, offset=offset)
+        assert metadata["total_rows"] == len(expected)
+        pages.append(page)
+        offset += 37
+        if not metadata["has_more"]:
+            break
+        assert len(page) == 37
+    assert canonical(pd.concat(pages, ignore_index=True)).equals(canonical(expected))
+
+
+def test_estimate_matches_the_reference_size():
+    orders, customers = make_tables(seed=3)
+    for how in ("inner", "left", "right", "outer"):
+        estimate = estimate_join_size(orders["customer"], customers["customer_id"], how)
+        assert estimate["estimated_rows"] == len(reference_join(orders, customers, how))
+
+
+def test_oversized_join_is_refused_or_sampled_within_the_limit():
+    orders, customers = make_tables(seed=1, n_left=2000, n_right=2000, keys=10)
+    with pytest.raises(JoinSizeError):
+        hash_join("orders", orders, "customers", customers, "customer", "customer_id", "FULL OUTER JOIN", max_rows=500)
+    for join_type in ("INNER JOIN", "LEFT JOIN", "RIGHT JOIN", "FULL OUTER JOIN"):
+        page, metadata = hash_join("orders", orders, "customers", customers, "customer", "customer_id",
+                                   join_type, max_rows=500, sample=True)
+        assert metadata["sampled"] is True
+        assert metadata["total_rows"] <= 500
+        assert len(page) == metadata["total_rows"]
+
+
+def test_projection_qualifies_only_colliding_names():
+    orders = pd.DataFrame({"id": [1, 2], "name": ["a", "b"]})
+    customers = pd.DataFrame({"id": [1, 2], "name": ["x", "y"]})
+    page, _ = hash_join("orders", orders, "customers", customers, "id", "id", columns=["orders.name", "customers.name", "orders.id"])
+    assert list(page.columns) == ["orders.name", "customers.name", "id"]
+    with pytest.raises(ValueError, match="both tables"):
+        resolve_columns(["name"], "orders", orders, "customers", customers)
+
+
+def test_sql_pages_are_ordered_and_reassemble_the_join():
+    orders, customers = make_tables(seed=2)
+    connection = sqlite3.connect(":memory:")
+    orders.to_sql("orders", connection, index=False)
+    customers.to_sql("customers", connection, index=False)
+    selected, _, _ = resolve_columns(None, "orders", orders, "customers", customers)
+    sql = build_join_sql("orders", "customers", "customer", "customer_id", "LEFT JOIN", selected, dialect="sqlite")
+    assert " ORDER BY " in sql
+
+    full = pd.read_sql_query(sql, connection)
+    pages = [pd.read_sql_query(paginate_sql(sql, 50, offset, dialect="sqlite"), connection)
+             for offset in range(0, len(full), 50)]
+    paged = pd.concat(pages, ignore_index=True).astype(full.dtypes.to_dict())
+    # Page boundaries follow the ORDER BY, so the pages are the full result in order.
+    pd.testing.assert_frame_equal(paged, full)
+    assert canonical(paged).equals(canonical(reference_join(orders, customers, "left")))
+
+
+def test_mysql_full_outer_join_is_rejected():
+    with pytest.raises(ValueError, match="FULL OUTER"):
+        build_join_sql("a", "b", "id", "id", "FULL OUTER JOIN", [("a", "id")], dialect="mysql")
@@ -0,0 +1,129 @@
+# tests/test_llm_gateway.py
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.utils.llm_backends import LLMBackend, ReplayMissError, is_transient_error
+from app.utils.llm_gateway import LLMGateway
+
+
+class FakeBackend(LLMBackend):
+    name = "fake"
+
+    def __init__(self, latency: float = 0.0, failures: list = ()):
+        self.latency = latency
+        self.failures = list(failures)
+        self.calls = 0
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def invoke(self, prompt: str) -> str:
+        with self._lock:
+            self.calls += 1
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            failure = self.failures.pop(0) if self.failures else None
+        try:
+            time.sleep(self.latency)
+            if failure is not None:
+                raise failure
+            return f"answer to {prompt}"
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+class HTTPError(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def make_gateway(backend, max_concurrency=8, per_user=2, max_retries=2):
+    return LLMGateway(lambda: backend, max_concurrency, per_user, max_retries, backoff_base=0.001, backoff_max=0.002)
+
+
+def run_threads(target, args_list):
+    threads = [threading.Thread(target=target, args=args) for args in args_list]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_identical_prompts_in_flight_are_coalesced():
+    backend = FakeBackend(latency=0.1)
+    gateway = make_gateway(backend)
+    results = []
+    run_threads(lambda: results.append(gateway.invoke("same prompt")), [()] * 5)
+    assert results == ["answer to same prompt"] * 5
+    assert backend.calls == 1
+    assert gateway.stats()["coalesced"] == 4
+    assert gateway.stats()["in_flight"] == 0
+
+
+def test_per_user_concurrency_is_limited_and_released():
+    backend = FakeBackend(latency=0.05)
+    gateway = make_gateway(backend, per_user=2)
+    run_threads(lambda i: gateway.invoke(f"prompt {i}", user_id="u1"), [(i,) for i in range(6)])
+    assert backend.calls == 6
+    assert backend.max_active == 2
+    assert gateway._user_slots == {}
+
+
+def test_global_concurrency_is_limited_across_users():
+    backend = FakeBackend(latency=0.05)
+    gateway = make_gateway(backend, max_concurrency=3, per_user=3)
+    run_threads(lambda i: gateway.invoke(f"prompt {i}", user_id=i % 4), [(i,) for i in range(8)])
+    assert backend.max_active <= 3
+
+
+def test_transient_errors_are_retried():
+    backend = FakeBackend(failures=[TimeoutError("slow"), HTTPError(503)])
+    gateway = make_gateway(backend, max_retries=2)
+    assert gateway.invoke("prompt") == "answer to prompt"
+    assert backend.calls == 3
+    assert gateway.stats()["retries"] == 2
+
+
+@pytest.mark.parametrize("error", [HTTPError(401), HTTPError(400), ValueError("blocked by safety settings"), ReplayMissError("no recording")])
+def test_permanent_errors_are_not_retried(error):
+    backend = FakeBackend(failures=[error])
+    gateway = make_gateway(backend, max_retries=3)
+    with pytest.raises(type(error)):
+        gateway.invoke("prompt")
+    assert backend.calls == 1
+    assert gateway.stats()["errors"] == 1
+
+
+def test_retries_stop_after_max_retries():
+    backend = FakeBackend(failures=[HTTPError(429)] * 5)
+    gateway = make_gateway(backend, max_retries=2)
+    with pytest.raises(HTTPError):
+        gateway.invoke("prompt")
+    assert backend.calls == 3
+
+
+def test_wrapped_transient_errors_are_recognised():
+    try:
+        try:
+            raise ConnectionResetError("reset")
+        except ConnectionResetError as cause:
+            raise RuntimeError("LLM request failed") from cause
+    except RuntimeError as error:
+        assert is_transient_error(error)
+    assert not is_transient_error(RuntimeError("invalid api key"))
+
+
+def test_stream_releases_its_slots():
+    backend = FakeBackend()
+    gateway = make_gateway(backend, per_user=1)
+
+    async def consume():
+        return [chunk async for chunk in gateway.astream("prompt", user_id="u1")]
+
+    assert asyncio.run(consume()) == ["answer to prompt"]
+    assert gateway._user_slots == {}
@@ -0,0 +1,96 @@
+# tests/test_memory_governor.py
+import gc
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.utils.memory_governor import MemoryGovernor, TableList, as_frame, frame_nbytes, table_schemas
+
+
+def make_frame(rows=20_000, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "id": np.arange(rows),
+        "amount": rng.random(rows),
+        "city": rng.choice(["Paris", "Lyon", "Nice"], rows),
+        "day": pd.date_range("2024-01-01", periods=rows, freq="min"),
+    })
+
+
+@pytest.fixture
+def governor(tmp_path):
+    # Room for one frame at a time.
+    return MemoryGovernor(int(frame_nbytes(make_frame()) * 1.5), str(tmp_path))
+
+
+def test_least_recently_used_frames_are_spilled_to_stay_under_budget(governor, tmp_path):
+    first = governor.track(make_frame(seed=1))
+    second = governor.track(make_frame(seed=2))
+    assert first.spilled and not second.spilled
+    assert os.path.dirname(first.path) == str(tmp_path)
+    assert governor.resident_bytes() <= governor.budget_bytes
+    stats = governor.stats()
+    assert stats["spilled_tables"] == 1 and stats["spills"] == 1
+
+
+def test_spilled_frames_reload_unchanged_and_evict_the_other(governor):
+    expected = make_frame(seed=1)
+    first = governor.track(expected.copy())
+    second = governor.track(make_frame(seed=2))
+    # The schema is available without reading the spill file.
+    assert list(first.columns) == list(expected.columns)
+    assert dict(first.dtypes) == dict(expected.dtypes)
+    assert len(first) == len(expected) and first.spilled
+
+    pd.testing.assert_frame_equal(first.get(), expected)
+    assert not first.spilled and second.spilled
+    assert governor.resident_bytes() <= governor.budget_bytes
+
+
+def test_in_place_changes_survive_a_second_spill(governor):
+    ref = governor.track(make_frame(seed=1))
+    frame = ref.get()
+    frame.loc[0, "amount"] = -1.0
+    governor.track(make_frame(seed=2))
+    assert ref.spilled
+    assert ref.get().loc[0, "amount"] == -1.0
+
+
+def test_spill_files_are_deleted_with_their_table(governor, tmp_path):
+    ref = governor.track(make_frame(seed=1))
+    governor.track(make_frame(seed=2))
+    path = ref.path
+    assert os.path.exists(path)
+    del ref
+    gc.collect()
+    assert not os.path.exists(path)
+
+
+def test_unwritable_frames_stay_in_memory(governor):
+    mixed = make_frame(seed=1)
+    mixed["city"] = [1 if i % 2 else "x" for i in range(len(mixed))]
+    ref = governor.track(mixed)
+    governor.track(make_frame(seed=2))
+    assert not ref.spilled
+
+
+def test_table_list_hides_spilling_from_callers(governor, monkeypatch):
+    monkeypatch.setattr("app.utils.memory_governor.get_governor", lambda: governor)
+    frames = {"orders": make_frame(seed=1), "events": make_frame(seed=2)}
+    tables = TableList(frames.items())
+    refs = dict(table_schemas(tables))
+    assert refs["orders"].spilled
+    # Schema lookups do not reload; reading an entry does, and keeps the same TableRef.
+    assert list(refs["orders"].columns) == list(frames["orders"].columns) and refs["orders"].spilled
+    for name, frame in tables:
+        pd.testing.assert_frame_equal(frame, frames[name])
+    assert dict(table_schemas(tables))["orders"] is refs["orders"]
+    pd.testing.assert_frame_equal(as_frame(refs["events"]), frames["events"])
+
+
+def test_no_budget_never_spills(tmp_path):
+    governor = MemoryGovernor(0, str(tmp_path))
+    refs = [governor.track(make_frame(seed=i)) for i in range(3)]
+    assert not any(ref.spilled for ref in refs)
@@ -0,0 +1,100 @@
+# tests/test_modify_batch.py
+import pandas as pd
+import pytest
+import sqlalchemy
+from fastapi import HTTPException
+
+from app.routes import modify
+from app.state import new_state, use_state
+from app.utils.llm_helpers import translate_commands_to_sql_batch
+from app.utils.sql_helpers import execute_statements_in_transaction
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = sqlalchemy.create_engine(f"sqlite:///{tmp_path / 'shop.db'}")
+    with engine.begin() as conn:
+        conn.execute(sqlalchemy.text("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT NOT NULL, qty INTEGER)"))
+        conn.execute(sqlalchemy.text("INSERT INTO items VALUES (1, 'pen', 5), (2, 'ink', 3)"))
+    yield engine
+    engine.dispose()
+
+
+def read_items(engine):
+    return pd.read_sql_query("SELECT * FROM items ORDER BY id", engine)
+
+
+class FakeLLM:
+    def __init__(self, response):
+        self.response = response
+        self.prompts = []
+
+    def __call__(self, prompt):
+        self.prompts.append(prompt)
+        return self.response
+
+
+def test_all_statements_are_committed_together(engine):
+    rowcounts = execute_statements_in_transaction(
+        ["UPDATE items SET qty = qty + 1;", "INSERT INTO items VALUES (3, 'cap', 1)", "DELETE FROM items WHERE id = 2"],
+        engine,
+    )
+    assert rowcounts == [2, 1, 1]
+    assert read_items(engine)[["id", "qty"]].values.tolist() == [[1, 6], [3, 1]]
+
+
+@pytest.mark.parametrize("use_connection", [False, True])
+def test_a_failing_statement_rolls_back_the_whole_batch(engine, use_connection):
+    before = read_items(engine)
+    statements = ["UPDATE items SET qty = 0", "INSERT INTO items VALUES (1, 'duplicate', 1)", "DELETE FROM items"]
+    if use_connection:
+        with engine.connect() as conn:
+            with pytest.raises(ValueError, match="Statement 2 failed and the batch was rolled back"):
+                execute_statements_in_transaction(statements, conn)
+    else:
+        with pytest.raises(ValueError, match="Statement 2 failed and the batch was rolled back"):
+            execute_statements_in_transaction(statements, engine)
+    pd.testing.assert_frame_equal(read_items(engine), before)
+
+
+def test_one_llm_call_translates_every_command_in_order():
+    llm = FakeLLM(
+        "Thinking...\nFinal SQL Query 2:\n```sql\nDELETE FROM items WHERE id = 2;\n```\n"
+        "Final SQL Query 1: UPDATE items SET qty = 1;\n"
+    )
+    statements = translate_commands_to_sql_batch(["set qty to 1", "remove ink"], "Table: items, Columns: id, qty", llm)
+    assert statements == ["UPDATE items SET qty = 1;", "DELETE FROM items WHERE id = 2;"]
+    assert len(llm.prompts) == 1
+
+
+def test_missing_translations_are_reported():
+    with pytest.raises(ValueError, match=r"\[2\]"):
+        translate_commands_to_sql_batch(["a", "b"], "", FakeLLM("Final SQL Query 1: DELETE FROM items"))
+
+
+def run_batch(engine, statements, monkeypatch):
+    monkeypatch.setattr(modify, "translate_commands_to_sql_batch", lambda commands, schema_info, llm: list(statements))
+    session = new_state()
+    session["personal_engine"] = engine
+    session["table_names"] = [("items", read_items(engine))]
+    with use_state(session):
+        return modify.modify_data_batch(modify.BatchModificationRequest(commands=[f"command {i}" for i in range(len(statements))]))
+
+
+def test_invalid_statements_stop_the_batch_before_anything_runs(engine, monkeypatch):
+    before = read_items(engine)
+    with pytest.raises(HTTPException) as error:
+        run_batch(engine, ["UPDATE items SET qty = 0", "SELECT * FROM items", "DELETE FROM missing_table"], monkeypatch)
+    assert error.value.status_code == 400
+    errors = error.value.detail["errors"]
+    assert [message.split(":")[0] for message in errors] == ["Command 2", "Command 3"]
+    pd.testing.assert_frame_equal(read_items(engine), before)
+
+
+def test_route_rolls_back_when_a_statement_fails(engine, monkeypatch):
+    before = read_items(engine)
+    with pytest.raises(HTTPException) as error:
+        run_batch(engine, ["UPDATE items SET qty = 0", "INSERT INTO items (id, name, qty) VALUES (2, 'dup', 1)"], monkeypatch)
+    assert error.value.status_code == 500
+    assert "rolled back" in error.value.detail
+    pd.testing.assert_frame_equal(read_items(engine), before)
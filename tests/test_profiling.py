@@ -0,0 +1,76 @@
+# tests/test_profiling.py
+import gc
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.utils.profiling import build_table_profile, is_profile_current, refresh_table_profiles, update_table_profile
+
+
+def make_table(rows: int = 400, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    amount = rng.normal(100, 20, rows)
+    amount[rng.random(rows) < 0.05] = np.nan
+    return pd.DataFrame({
+        "amount": amount,
+        "quantity": rng.integers(1, 10, rows),
+        "city": rng.choice(["Bhopal", "Pune", "Indore", None], rows),
+    })
+
+
+def assert_same_profile(incremental: dict, rebuilt: dict) -> None:
+    assert incremental["row_count"] == rebuilt["row_count"]
+    for col, expected in rebuilt["columns"].items():
+        actual = incremental["columns"][col]
+        assert actual["kind"] == expected["kind"]
+        assert actual["nulls"] == expected["nulls"]
+        if expected["kind"] == "numeric":
+            for key in ("count", "mean", "m2", "min", "max"):
+                assert actual[key] == pytest.approx(expected[key], rel=1e-9), (col, key)
+        elif expected["kind"] == "categorical":
+            assert {k: v for k, v in actual["top_k"].items() if v} == expected["top_k"]
+
+
+def test_incremental_update_matches_rebuild():
+    old = make_table()
+    new = old.drop(index=old.index[:30])
+    new.loc[new.index[:10], "amount"] = 1000.0
+    new = pd.concat([new, make_table(50, seed=1)], ignore_index=True)
+    profile = update_table_profile(build_table_profile(old), old, new)
+    assert_same_profile(profile, build_table_profile(new))
+
+
+def test_removing_the_extreme_recomputes_min_and_max():
+    old = pd.DataFrame({"amount": [1.0, 5.0, 9.0, 3.0], "city": ["a", "b", "c", "d"]})
+    new = old[old["amount"] != 9.0]
+    profile = update_table_profile(build_table_profile(old), old, new)
+    assert profile["columns"]["amount"]["max"] == 5.0
+    assert_same_profile(profile, build_table_profile(new))
+
+
+def test_schema_change_rebuilds():
+    old = make_table()
+    new = old.assign(extra=1)
+    profile = update_table_profile(build_table_profile(old), old, new)
+    assert "extra" in profile["columns"]
+
+
+def test_refresh_keeps_current_profiles_and_drops_removed_tables():
+    orders, cities = make_table(), make_table(seed=2)
+    profiles = {}
+    refresh_table_profiles([("orders", orders), ("cities", cities)], profiles)
+    kept = profiles["orders"]
+    refresh_table_profiles([("orders", orders)], profiles)
+    assert profiles["orders"] is kept
+    assert list(profiles) == ["orders"]
+
+
+def test_replaced_table_of_the_same_shape_is_profiled_again():
+    profiles = {}
+    refresh_table_profiles([("orders", make_table(seed=0))], profiles)
+    gc.collect()
+    replacement = make_table(seed=3)
+    assert not is_profile_current(profiles["orders"], replacement)
+    refresh_table_profiles([("orders", replacement)], profiles)
+    assert_same_profile(profiles["orders"], build_table_profile(replacement))
@@ -0,0 +1,126 @@
+# tests/test_result_cache.py
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+from app.state import new_state
+from app.utils import result_cache
+from app.utils.result_cache import (
+    ResultCache,
+    bump_table_versions,
+    data_source,
+    etag_matches,
+    etag_nonce,
+    make_etag,
+    request_key,
+    table_versions,
+)
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = ResultCache(max_entries=3, ttl=60)
+    monkeypatch.setattr(result_cache, "get_result_cache", lambda: cache)
+    return cache
+
+
+def session_with(*names):
+    session = new_state()
+    for name in names:
+        session["table_names"].append((name, pd.DataFrame({"x": [1]})))
+    return session
+
+
+def request(if_none_match=None):
+    return SimpleNamespace(headers={"if-none-match": if_none_match} if if_none_match else {})
+
+
+def test_versions_change_only_for_bumped_tables(cache):
+    session = session_with("orders", "customers")
+    first = table_versions(session)
+    assert set(first) == {"orders", "customers"}
+    assert table_versions(session) == first
+
+    bump_table_versions(session, names=["orders"])
+    second = table_versions(session)
+    assert second["orders"] != first["orders"] and second["customers"] == first["customers"]
+
+    session["table_names"].pop(0)
+    bump_table_versions(session)
+    assert set(session["table_versions"]) == {"customers"}
+    assert session["table_versions"]["customers"] != first["customers"]
+
+
+def test_reloaded_sessions_never_reuse_a_version(cache):
+    session = session_with("orders")
+    before = table_versions(session)["orders"]
+    session.safe_clear()
+    session["table_names"].append(("orders", pd.DataFrame({"x": [2]})))
+    assert table_versions(session)["orders"] != before
+
+
+def test_bumping_discards_entries_built_on_old_versions(cache):
+    session = session_with("orders", "customers")
+    versions = table_versions(session)
+    cache.put("orders-only", {"result": 1}, {"orders": versions["orders"]})
+    cache.put("customers-only", {"result": 2}, {"customers": versions["customers"]})
+    bump_table_versions(session, names=["orders"])
+    assert cache.get("orders-only") is None
+    assert cache.get("customers-only") == {"result": 2}
+
+
+def test_cache_is_a_bounded_lru_with_ttl(monkeypatch):
+    cache = ResultCache(max_entries=2, ttl=10)
+    now = [100.0]
+    monkeypatch.setattr(result_cache.time, "monotonic", lambda: now[0])
+    cache.put("a", {"v": "a"}, {})
+    cache.put("b", {"v": "b"}, {})
+    assert cache.get("a") == {"v": "a"}
+    cache.put("c", {"v": "c"}, {})
+    assert cache.get("b") is None and cache.get("a") == {"v": "a"}
+    now[0] += 11
+    assert cache.get("a") is None and cache.get("c") is None
+
+
+def test_large_results_are_not_cached(monkeypatch):
+    monkeypatch.setattr(result_cache, "RESULT_CACHE_MAX_ROWS", 10)
+    cache = ResultCache(max_entries=5, ttl=60)
+    cache.put("big", {"v": 1}, {}, rows=11)
+    cache.put("small", {"v": 2}, {}, rows=10)
+    assert cache.get("big") is None and cache.get("small") == {"v": 2}
+    assert ResultCache(max_entries=0).put("k", {}, {}) is None
+
+
+def test_keys_depend_on_every_part():
+    versions = {"orders": "v1"}
+    key = request_key("query", "SELECT 1", 7, versions)
+    assert key == request_key("query", "SELECT 1", 7, {"orders": "v1"})
+    assert key != request_key("query", "SELECT 1", 8, versions)
+    assert key != request_key("query", "SELECT 1", 7, {"orders": "v2"})
+    assert make_etag("chart", {"b": 1, "a": 2}) == make_etag("chart", {"a": 2, "b": 1})
+    assert make_etag("chart", 1).startswith('"') and make_etag("chart", 1).endswith('"')
+
+
+def test_data_source_tells_databases_apart_without_secrets():
+    session = new_state()
+    assert data_source(session) == ("file", {})
+    assert etag_nonce(session) == ""
+    session["source"] = "personal"
+    session["personal_db"] = {"db_type": "postgresql", "host": "a", "user": "me", "database": "shop", "port": 5432}
+    other = dict(session["personal_db"], database="crm")
+    first = data_source(session)
+    session["personal_db"] = other
+    assert data_source(session) != first
+    # Personal databases change outside the app, so each computed result gets its own ETag.
+    assert etag_nonce(session) and etag_nonce(session) != etag_nonce(session)
+
+
+def test_if_none_match_uses_weak_comparison():
+    etag = make_etag("preview", "orders")
+    assert etag_matches(request(etag), etag)
+    assert etag_matches(request(f'"other", W/{etag}'), etag)
+    assert etag_matches(request("*"), etag)
+    assert not etag_matches(request('"other"'), etag)
+    assert not etag_matches(request(), etag)
+    assert not etag_matches(None, etag)
@@ -0,0 +1,81 @@
+# tests/test_serialization.py
+import datetime
+import decimal
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.utils import serialization
+from app.utils.serialization import dumps, frame_to_columnar, frame_to_records, json_ready_frame, serialize_frame
+
+
+def timestamps(values, tz=None):
+    series = pd.Series(pd.to_datetime(values, format="ISO8601"))
+    return series.dt.tz_localize(tz) if tz else series
+
+
+def test_missing_values_and_infinities_become_none():
+    df = pd.DataFrame({
+        "float": [1.5, np.nan, np.inf, -np.inf],
+        "int": pd.array([1, None, 3, 4], dtype="Int64"),
+        "text": ["a", None, pd.NA, "d"],
+        "when": timestamps(["2024-01-01", None, "2024-01-02", "2024-01-03"]),
+        "delta": pd.to_timedelta([1, None, 2, 3], unit="h"),
+    })
+    records = frame_to_records(df)
+    assert records[0] == {"float": 1.5, "int": 1, "text": "a", "when": "2024-01-01T00:00:00", "delta": "0 days 01:00:00"}
+    assert records[1] == {"float": None, "int": None, "text": None, "when": None, "delta": None}
+    assert records[2]["float"] is None and records[3]["float"] is None
+    assert records[2]["text"] is None
+    json.loads(dumps(records))
+
+
+def test_numpy_scalars_become_python_values():
+    df = pd.DataFrame({"i": np.array([1], dtype="int32"), "f": np.array([0.5], dtype="float32"), "b": [True]})
+    row = frame_to_records(df)[0]
+    assert row == {"i": 1, "f": 0.5, "b": True}
+    assert [type(value) for value in row.values()] == [int, float, bool]
+
+
+@pytest.mark.parametrize("series, expected", [
+    (timestamps(["2024-01-01", None]), ["2024-01-01T00:00:00", None]),
+    (timestamps(["2024-01-01 10:00:00.5", "2024-01-01"]), ["2024-01-01T10:00:00.500000", "2024-01-01T00:00:00.000000"]),
+    (timestamps(["2024-01-01 10:00:00.000000001"]), ["2024-01-01T10:00:00.000000001"]),
+    (timestamps(["2024-01-01 04:30"], "UTC"), ["2024-01-01T04:30:00+00:00"]),
+    (timestamps(["2024-01-01 10:00", None, "2024-07-01 10:00"], "Europe/Paris"),
+     ["2024-01-01T10:00:00+01:00", None, "2024-07-01T10:00:00+02:00"]),
+    (timestamps(["2024-01-01 04:30"], "America/St_Johns"), ["2024-01-01T04:30:00-03:30"]),
+])
+def test_timestamps_are_formatted_like_isoformat(series, expected):
+    assert json_ready_frame(series.to_frame("when"))["when"].tolist() == expected
+
+
+def test_columnar_shape_and_string_column_names():
+    df = pd.DataFrame({0: [1, 2], "b": [np.nan, "x"]})
+    assert frame_to_columnar(df) == {"columns": ["0", "b"], "data": [[1, None], [2, "x"]]}
+    assert serialize_frame(df) == [{"0": 1, "b": None}, {"0": 2, "b": "x"}]
+    with pytest.raises(ValueError, match="Unknown result format"):
+        serialize_frame(df, "rows")
+
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_dumps_handles_values_outside_frames(monkeypatch, use_orjson):
+    if not use_orjson:
+        monkeypatch.setattr(serialization, "orjson", None)
+    content = {
+        "count": np.int64(3),
+        "when": datetime.date(2024, 1, 1),
+        "price": decimal.Decimal("1.25"),
+        "missing": pd.NaT,
+        "array": np.array([1, 2]),
+    }
+    assert json.loads(dumps(content)) == {
+        "count": 3, "when": "2024-01-01", "price": 1.25, "missing": None, "array": [1, 2],
+    }
+
+
+def test_orjson_writes_nan_scalars_as_null():
+    pytest.importorskip("orjson")
+    assert dumps({"nan": np.float64("nan"), "inf": np.float32("inf")}) == b'{"nan":null,"inf":null}'
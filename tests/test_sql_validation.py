@@ -0,0 +1,34 @@
+# tests/test_sql_validation.py
+import pandas as pd
+import pytest
+
+from app.utils.sql_validation import validate_sql_query
+
+TABLES = [("sales", pd.DataFrame({"Order Date": ["2024-01-01"], "amount": [1.0]}))]
+
+
+@pytest.mark.parametrize("dialect", ["duckdb", "postgres", "vertica", "sqlite"])
+def test_double_quoted_identifiers_stay_identifiers(dialect):
+    sql, errors = validate_sql_query('SELECT "Order Date", SUM(amount) FROM sales GROUP BY "Order Date"', TABLES, dialect)
+    assert errors == []
+    assert sql == 'SELECT "Order Date", SUM(amount) FROM sales GROUP BY "Order Date";'
+
+
+@pytest.mark.parametrize("dialect", ["duckdb", "postgres", "vertica", "sqlite"])
+def test_double_quoted_unknown_column_is_reported(dialect):
+    _, errors = validate_sql_query('SELECT "Ship Date" FROM sales', TABLES, dialect)
+    assert errors == ["Unknown column 'Ship Date'."]
+
+
+@pytest.mark.parametrize("dialect", ["mysql", "duckdb", "postgres", "vertica", "sqlite"])
+def test_backticks_are_read_as_mysql(dialect):
+    sql, errors = validate_sql_query("SELECT `Order Date`, SUM(amount) FROM sales GROUP BY `Order Date`", TABLES, dialect)
+    assert errors == []
+    quote = "`" if dialect == "mysql" else '"'
+    assert sql == f"SELECT {quote}Order Date{quote}, SUM(amount) FROM sales GROUP BY {quote}Order Date{quote};"
+
+
+def test_mysql_reads_double_quotes_as_strings():
+    sql, errors = validate_sql_query('SELECT "Order Date" FROM sales', TABLES, "mysql")
+    assert errors == []
+    assert sql == "SELECT 'Order Date' FROM sales;"
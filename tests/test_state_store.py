@@ -0,0 +1,152 @@
+# tests/test_state_store.py
+import gc
+import json
+import sqlite3
+
+import pandas as pd
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.state import state
+from app.utils.memory_governor import as_frame, table_schemas
+from app.utils.state_store import (
+    InProcessStateBackend,
+    SessionStateMiddleware,
+    SQLiteParquetStateBackend,
+    create_state_backend,
+    session_key,
+)
+
+
+def tables(session_state, kind="table_names"):
+    return {name: as_frame(table) for name, table in table_schemas(session_state[kind])}
+
+
+def stored_meta(root, key):
+    with sqlite3.connect(f"{root}/sessions.db") as conn:
+        version, meta = conn.execute("SELECT version, meta FROM sessions WHERE session_key = ?", (key,)).fetchone()
+    return version, json.loads(meta)
+
+
+def test_backends_are_created_by_name(tmp_path):
+    assert isinstance(create_state_backend("memory"), InProcessStateBackend)
+    assert isinstance(create_state_backend("SQLite", str(tmp_path)), SQLiteParquetStateBackend)
+    with pytest.raises(ValueError, match="Unknown STATE_BACKEND"):
+        create_state_backend("redis", str(tmp_path))
+
+
+def test_in_process_sessions_are_isolated_and_evicted():
+    backend = InProcessStateBackend(ttl=0)
+    first = backend.load("u1:default")
+    first["source"] = "personal"
+    assert backend.load("u1:default") is first
+    assert backend.load("u2:default")["source"] == "file"
+    backend.evict_idle()
+    assert backend.load("u1:default") is not first
+
+
+def test_sqlite_sessions_are_shared_between_workers(tmp_path):
+    worker_a, worker_b = SQLiteParquetStateBackend(str(tmp_path)), SQLiteParquetStateBackend(str(tmp_path))
+    session = worker_a.load("u1:default")
+    session["table_names"].append(("orders", pd.DataFrame({"id": [1, 2], "amount": [3.5, 4.5]})))
+    session["original_table_names"].append(("orders", pd.DataFrame({"id": [1, 2], "amount": [3.5, None]})))
+    session["chat_history"].append({"q": "hi"})
+    worker_a.save("u1:default", session)
+
+    loaded = worker_b.load("u1:default")
+    pd.testing.assert_frame_equal(tables(loaded)["orders"], tables(session)["orders"])
+    pd.testing.assert_frame_equal(tables(loaded, "original_table_names")["orders"], tables(session, "original_table_names")["orders"])
+    assert loaded["chat_history"] == [{"q": "hi"}]
+    # Without a newer version the worker keeps serving the state it already has.
+    assert worker_b.load("u1:default") is loaded
+
+
+def test_unchanged_sessions_are_not_rewritten(tmp_path):
+    backend = SQLiteParquetStateBackend(str(tmp_path))
+    session = backend.load("k")
+    session["table_names"].append(("t", pd.DataFrame({"x": [1]})))
+    backend.save("k", session)
+    version, meta = stored_meta(tmp_path, "k")
+    backend.save("k", session)
+    assert stored_meta(tmp_path, "k") == (version, meta)
+
+    # Replacing the table writes a new file and removes the old one.
+    old_path = meta["table_names"][0][1]
+    session["table_names"][0] = ("t", pd.DataFrame({"x": [2]}))
+    backend.save("k", session)
+    new_version, new_meta = stored_meta(tmp_path, "k")
+    assert new_version == version + 1
+    assert new_meta["table_names"][0][1] != old_path
+    assert not (tmp_path / old_path).exists()
+
+
+def test_replaced_tables_are_never_mistaken_for_the_previous_one(tmp_path):
+    # A freed table's id() is often reused by the next one; the fingerprint must not match it.
+    worker_a, worker_b = SQLiteParquetStateBackend(str(tmp_path)), SQLiteParquetStateBackend(str(tmp_path))
+    stale = 0
+    for i in range(20):
+        session = worker_a.load("k")
+        session["table_names"].clear()
+        gc.collect()
+        session["table_names"].append(("orders", pd.DataFrame({"x": [i, i]})))
+        worker_a.save("k", session)
+        stale += tables(worker_b.load("k"))["orders"]["x"].iloc[0] != i
+    assert stale == 0
+
+
+def test_personal_database_password_is_never_persisted(tmp_path):
+    backend = SQLiteParquetStateBackend(str(tmp_path))
+    session = backend.load("k")
+    engine = object()
+    session["personal_engine"] = engine
+    session["personal_db"] = {"db_type": "mysql", "host": "db", "user": "me", "database": "shop", "port": 3306}
+    backend.save("k", session)
+    assert "password" not in stored_meta(tmp_path, "k")[1]["personal_db"]
+
+    # A session stored with a password by an older version drops it on load and save.
+    with sqlite3.connect(f"{tmp_path}/sessions.db") as conn:
+        meta = dict(stored_meta(tmp_path, "k")[1], personal_db=dict(session["personal_db"], password="s3cret"))
+        conn.execute("UPDATE sessions SET version = version + 1, meta = ? WHERE session_key = 'k'", (json.dumps(meta),))
+    reloaded = backend.load("k")
+    assert "password" not in reloaded["personal_db"]
+    # The live engine of this worker is kept because the database did not change.
+    assert reloaded["personal_engine"] is engine
+    backend.save("k", reloaded)
+    assert "s3cret" not in (tmp_path / "sessions.db").read_bytes().decode("latin-1")
+
+    other_worker = SQLiteParquetStateBackend(str(tmp_path)).load("k")
+    assert other_worker["personal_db"]["database"] == "shop"
+    assert other_worker["personal_engine"] is None
+
+
+def test_session_keys():
+    assert session_key(7) == "7:default"
+    assert session_key(None, "tab-2") == "anonymous:tab-2"
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+
+    @app.post("/remember/{value}")
+    def remember(value: str):
+        state["chat_history"].append(value)
+        return {"history": state["chat_history"]}
+
+    app.add_middleware(SessionStateMiddleware, backend=InProcessStateBackend())
+    return TestClient(app)
+
+
+def test_anonymous_callers_get_their_own_session(client):
+    first = client.post("/remember/a")
+    second = client.post("/remember/b")
+    assert first.json() == {"history": ["a"]}
+    assert second.json() == {"history": ["b"]}
+    session_id = first.headers["x-session-id"]
+    assert session_id != second.headers["x-session-id"]
+
+    resumed = client.post("/remember/c", headers={"X-Session-ID": session_id})
+    assert resumed.json() == {"history": ["a", "c"]}
+    # Callers that send a session id are not issued a new one.
+    assert "x-session-id" not in resumed.headers
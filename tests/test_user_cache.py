@@ -0,0 +1,27 @@
+# tests/test_user_cache.py
+from app.models import User
+from app.utils.user_cache import UserCache
+
+
+def make_user():
+    return User(id=1, email="a@example.com", username="alice", hashed_password="$2b$12$hash", dynamic_db="db_1")
+
+
+def test_cached_users_are_fresh_objects_without_the_password_hash():
+    cache = UserCache(ttl=60, max_entries=10)
+    cache.put(make_user())
+    first, second = cache.get(1), cache.get(1)
+    assert first is not second
+    assert (first.username, first.email, first.dynamic_db) == ("alice", "a@example.com", "db_1")
+    assert first.hashed_password is None
+    assert "$2b$12$hash" not in repr(cache._entries)
+
+
+def test_invalidated_and_expired_users_are_reloaded():
+    cache = UserCache(ttl=60, max_entries=10)
+    cache.put(make_user())
+    cache.invalidate(1)
+    assert cache.get(1) is None
+    expired = UserCache(ttl=-1, max_entries=10)
+    expired.put(make_user())
+    assert expired.get(1) is None